@@ -0,0 +1,50 @@
+"""
+应用配置 - Web 进程和翻译工作进程共用
+"""
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# 存储目录
+UPLOAD_DIR = BASE_DIR / "uploads"
+OUTPUT_DIR = BASE_DIR / "outputs"
+CACHE_DIR = BASE_DIR / "cache"
+UPLOAD_DIR.mkdir(exist_ok=True)
+OUTPUT_DIR.mkdir(exist_ok=True)
+
+# 上传文件大小限制 (字节)
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(20 * 1024 * 1024)))
+
+# 翻译缓存限制
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "200000"))
+TRANSLATION_CACHE_MAX_BYTES = int(os.getenv("TRANSLATION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# LaTeX 构建缓存 (outputs/tex_build) 上限：超出总字节数时淘汰最久未使用的文档构建目录和格式文件，
+# 超过天数未使用的直接删除
+TEX_BUILD_MAX_BYTES = int(os.getenv("TEX_BUILD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+TEX_BUILD_MAX_AGE_DAYS = float(os.getenv("TEX_BUILD_MAX_AGE_DAYS", "30"))
+
+# 任务存储：sqlite:///path/to/tasks.db 或 redis://host:port/db
+TASK_STORE_URL = os.getenv("TASK_STORE_URL", f"sqlite:///{BASE_DIR / 'tasks.db'}")
+
+# 是否在 Web 进程内运行翻译（单机开发模式）；
+# 生产环境设为 0，并用 python -m app.tasks.worker 启动独立的工作进程
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "1") == "1"
+
+# 每个工作进程同时执行的翻译任务数
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+
+# 独立工作进程数（python -m app.tasks.worker 的默认 --processes）
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 1)))
+
+# 每个执行翻译的进程内 PDF 解析进程池的大小，0 表示把 CPU 核心平均分给本机所有执行翻译的进程
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "0"))
+
+# 已出队任务的租约时长（秒）：执行中每 1/3 租约续约一次，
+# 工作进程崩溃后租约到期，任务重新出队
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "120"))
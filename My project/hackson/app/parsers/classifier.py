@@ -0,0 +1,92 @@
+"""
+文本块分类 - 各解析器和 LaTeX 生成器共用的预编译规则
+
+所有正则在模块加载时编译一次，逐块判断时不再重复编译。
+"""
+import re
+from enum import Enum
+
+
+class BlockKind(Enum):
+    """文本块分类结果"""
+    FORMULA = "formula"            # 整段公式（不翻译）
+    NUMERIC = "numeric"            # 纯数字、页码、表格数值（不翻译）
+    REFERENCE = "reference"        # 参考文献条目
+    CAPTION = "caption"            # 图表标题
+    TRANSLATABLE = "translatable"  # 普通正文
+
+
+# 整段都是公式的块
+FORMULA_BLOCK_PATTERN = re.compile(
+    r'^\s*(?:'
+    r'\$\$[\s\S]*?\$\$'
+    r'|\\begin\{equation\*?\}[\s\S]*?\\end\{equation\*?\}'
+    r'|\\begin\{align\*?\}[\s\S]*?\\end\{align\*?\}'
+    r'|\\\[[\s\S]*?\\\]'
+    r')\s*$',
+    re.IGNORECASE
+)
+
+# 文本中夹带的公式
+INLINE_FORMULA_PATTERN = re.compile(
+    r'\$\$[\s\S]*?\$\$'
+    r'|\$[^\$\n]+?\$'
+    r'|\\begin\{(?:equation|align)\*?\}'
+)
+
+# 只由数字、空白和常见数值符号组成，且至少有一个数字
+NUMERIC_PATTERN = re.compile(r'^(?=[\s\S]*\d)[\d\s.,:;%+\-–−±×/()\[\]]+$')
+
+REFERENCE_PATTERN = re.compile(r'^\[?\d+[\]\.)]')
+
+CAPTION_PATTERN = re.compile(r'^(Figure|Fig\.|Table|Tab\.)\s*\d+', re.IGNORECASE)
+
+
+def is_formula_block(text: str) -> bool:
+    """整段是否为公式"""
+    return FORMULA_BLOCK_PATTERN.match(text) is not None
+
+
+def contains_formula(text: str) -> bool:
+    """是否包含数学公式"""
+    return INLINE_FORMULA_PATTERN.search(text) is not None
+
+
+def is_numeric(text: str) -> bool:
+    """是否为纯数值内容"""
+    return NUMERIC_PATTERN.match(text) is not None
+
+
+def is_reference(text: str) -> bool:
+    """是否是参考文献条目"""
+    return REFERENCE_PATTERN.match(text) is not None
+
+
+def is_figure_caption(text: str) -> bool:
+    """是否是图表标题"""
+    return CAPTION_PATTERN.match(text) is not None
+
+
+def looks_like_latex(text: str) -> bool:
+    """未翻译的原文是否看起来是 LaTeX 源码（生成 PDF 时不转义）"""
+    return text.startswith("$") or text.startswith("\\") or "equation" in text
+
+
+def classify_block(text: str) -> BlockKind:
+    """
+    对文本块分类
+
+    按 公式 -> 数值 -> 参考文献 -> 图表标题 的顺序匹配，都不命中则为普通正文。
+
+    Args:
+        text: 去掉首尾空白后的块文本
+    """
+    if is_formula_block(text):
+        return BlockKind.FORMULA
+    if is_numeric(text):
+        return BlockKind.NUMERIC
+    if is_reference(text):
+        return BlockKind.REFERENCE
+    if is_figure_caption(text):
+        return BlockKind.CAPTION
+    return BlockKind.TRANSLATABLE
@@ -12,10 +12,13 @@ from .base import (
     BaseParser, ParsedDocument, ContentBlock, 
     DocumentMetadata, BlockType
 )
+from .classifier import contains_formula, is_reference
 
 
 class DocxParser(BaseParser):
     """Word 文档解析器"""
+
+    HEADING_LEVEL_PATTERN = re.compile(r'heading\s*(\d+)')
     
     def parse(self, file_path: Path) -> ParsedDocument:
         """解析 Word 文档"""
@@ -77,7 +80,7 @@ class DocxParser(BaseParser):
                     should_translate=False
                 ))
             # 检查是否是引用
-            elif self._is_reference(text):
+            elif is_reference(text):
                 blocks.append(ContentBlock(
                     type=BlockType.REFERENCE,
                     content=text,
@@ -86,7 +89,7 @@ class DocxParser(BaseParser):
             # 普通段落
             else:
                 # 检查是否包含公式
-                has_formula = self._contains_formula(text)
+                has_formula = contains_formula(text)
                 blocks.append(ContentBlock(
                     type=BlockType.TEXT,
                     content=text,
@@ -109,31 +112,13 @@ class DocxParser(BaseParser):
     
     def _get_heading_level_from_style(self, style_name: str) -> int:
         """从样式名获取标题层级"""
-        match = re.search(r'heading\s*(\d+)', style_name)
+        match = self.HEADING_LEVEL_PATTERN.search(style_name)
         if match:
             return int(match.group(1))
         if "title" in style_name:
             return 1
         return 1
     
-    def _is_reference(self, text: str) -> bool:
-        """判断是否是参考文献"""
-        if re.match(r'^\[?\d+[\]\.)]', text):
-            return True
-        return False
-    
-    def _contains_formula(self, text: str) -> bool:
-        """检查是否包含数学公式"""
-        patterns = [
-            r'\$\$[\s\S]*?\$\$',
-            r'\$[^\$\n]+?\$',
-            r'\\begin\{equation\}',
-        ]
-        for pattern in patterns:
-            if re.search(pattern, text):
-                return True
-        return False
-    
     def _extract_table_text(self, table) -> str:
         """提取表格文本"""
         rows = []
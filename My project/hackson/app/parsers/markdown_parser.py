@@ -9,19 +9,17 @@ from .base import (
     BaseParser, ParsedDocument, ContentBlock, 
     DocumentMetadata, BlockType
 )
+from .classifier import contains_formula, is_reference
 
 
 class MarkdownParser(BaseParser):
     """Markdown 文件解析器"""
     
     # 代码块模式
-    CODE_BLOCK_PATTERN = r'```[\s\S]*?```'
-    
-    # LaTeX 公式模式
-    LATEX_PATTERNS = [
-        r'\$\$[\s\S]*?\$\$',
-        r'\$[^\$\n]+?\$',
-    ]
+    CODE_BLOCK_PATTERN = re.compile(r'```[\s\S]*?```')
+    CODE_PLACEHOLDER_PATTERN = re.compile(r'__CODE_BLOCK_(\d+)__')
+    HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+)$')
+    FRONT_MATTER_PATTERN = re.compile(r'^---\s*\n[\s\S]*?\n---\s*\n?')
     
     def parse(self, file_path: Path) -> ParsedDocument:
         """解析 Markdown 文件"""
@@ -68,7 +66,7 @@ class MarkdownParser(BaseParser):
         blocks = []
         
         # 移除 YAML front matter
-        content = re.sub(r'^---\s*\n[\s\S]*?\n---\s*\n?', '', content)
+        content = self.FRONT_MATTER_PATTERN.sub('', content)
         
         # 先提取代码块，用占位符替换
         code_blocks = []
@@ -76,7 +74,7 @@ class MarkdownParser(BaseParser):
             code_blocks.append(match.group(0))
             return f"__CODE_BLOCK_{len(code_blocks) - 1}__"
         
-        content = re.sub(self.CODE_BLOCK_PATTERN, save_code_block, content)
+        content = self.CODE_BLOCK_PATTERN.sub(save_code_block, content)
         
         # 按行处理
         lines = content.split('\n')
@@ -93,7 +91,7 @@ class MarkdownParser(BaseParser):
                 continue
             
             # 检查是否是代码块占位符
-            code_match = re.match(r'__CODE_BLOCK_(\d+)__', stripped)
+            code_match = self.CODE_PLACEHOLDER_PATTERN.match(stripped)
             if code_match:
                 if current_paragraph:
                     blocks.extend(self._process_paragraph('\n'.join(current_paragraph)))
@@ -108,7 +106,7 @@ class MarkdownParser(BaseParser):
                 continue
             
             # 检查是否是标题
-            heading_match = re.match(r'^(#{1,6})\s+(.+)$', stripped)
+            heading_match = self.HEADING_PATTERN.match(stripped)
             if heading_match:
                 if current_paragraph:
                     blocks.extend(self._process_paragraph('\n'.join(current_paragraph)))
@@ -151,7 +149,7 @@ class MarkdownParser(BaseParser):
             return blocks
         
         # 检查是否是参考文献格式
-        if re.match(r'^\[?\d+[\]\.)]', text):
+        if is_reference(text):
             blocks.append(ContentBlock(
                 type=BlockType.REFERENCE,
                 content=text,
@@ -160,7 +158,7 @@ class MarkdownParser(BaseParser):
             return blocks
         
         # 检查是否包含公式
-        has_formula = any(re.search(p, text) for p in self.LATEX_PATTERNS)
+        has_formula = contains_formula(text)
         
         blocks.append(ContentBlock(
             type=BlockType.TEXT,
@@ -1,30 +1,48 @@
 """
 PDF 文件解析器 - 使用 PyMuPDF 提取文本和图片
 """
+import os
 import re
 import io
 import base64
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field
 
 import fitz  # PyMuPDF
 
+from app.config import PDF_PARSE_WORKERS
 from .base import (
     BaseParser, ParsedDocument, ContentBlock, 
     DocumentMetadata, BlockType
 )
+from .classifier import contains_formula, is_figure_caption, is_reference
 
 
 @dataclass
 class ImageInfo:
-    """图片信息"""
-    data: bytes
-    ext: str
+    """
+    图片信息
+
+    解析阶段只记录图片的 xref 和位置，不读取图片数据；
+    生成 PDF 时再通过 extract() 从源文件中按需取出。
+    """
+    xref: int
     bbox: Tuple[float, float, float, float]  # (x0, y0, x1, y1)
     page_num: int
     width: float
     height: float
+    ext: Optional[str] = None  # 提取后才能确定
+
+    def extract(self, doc: "fitz.Document") -> bytes:
+        """从已打开的源 PDF 中提取图片数据"""
+        base_image = doc.extract_image(self.xref)
+        self.ext = base_image["ext"]
+        return base_image["image"]
 
 
 @dataclass
@@ -37,83 +55,140 @@ class PageContent:
     images: List[ImageInfo] = field(default_factory=list)
 
 
+def _parse_page(page: "fitz.Page", page_num: int) -> Tuple[PageContent, str]:
+    """解析单页，返回页面内容和该页的纯文本"""
+    page_content = PageContent(
+        page_num=page_num,
+        width=page.rect.width,
+        height=page.rect.height
+    )
+    page_text = ""
+
+    # 提取文本块（带位置信息）
+    text_dict = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)
+    for block in text_dict.get("blocks", []):
+        if block.get("type") == 0:  # 文本块
+            block_text = ""
+            for line in block.get("lines", []):
+                for span in line.get("spans", []):
+                    block_text += span.get("text", "")
+                block_text += "\n"
+
+            if block_text.strip():
+                page_content.text_blocks.append({
+                    "text": block_text.strip(),
+                    "bbox": block.get("bbox"),
+                    "lines": block.get("lines", [])
+                })
+                page_text += block_text + "\n"
+
+    # 记录图片位置（图片数据延迟到生成阶段再提取）
+    for img in page.get_images(full=True):
+        try:
+            xref = img[0]
+            img_rects = page.get_image_rects(xref)
+            if img_rects:
+                rect = img_rects[0]
+                page_content.images.append(ImageInfo(
+                    xref=xref,
+                    bbox=(rect.x0, rect.y0, rect.x1, rect.y1),
+                    page_num=page_num,
+                    width=rect.width,
+                    height=rect.height
+                ))
+        except Exception as e:
+            print(f"定位图片失败: {e}")
+
+    return page_content, page_text + "\n\n"
+
+
+def _parse_page_range(file_path: str, start: int, end: int) -> List[Tuple[PageContent, str]]:
+    """解析 [start, end) 范围内的页面（进程池任务，每个进程独立打开文件）"""
+    with fitz.open(file_path) as doc:
+        return [_parse_page(doc[page_num], page_num) for page_num in range(start, end)]
+
+
+# 解析进程池，每个进程只创建一次，所有解析共享；
+# 以 spawn 方式启动，避免在已有多个线程的 Web / 工作进程中 fork
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = PDF_PARSE_WORKERS or os.cpu_count() or 1
+_pool_lock = threading.Lock()
+
+
+def set_pool_size(workers: int):
+    """
+    设置解析进程池大小，需在第一次解析之前调用
+
+    同一台机器上运行多个工作进程时，应把 CPU 核心平均分给各进程，而不是每个进程都占满全部核心
+    """
+    global _pool_size
+    _pool_size = max(1, workers)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_pool_size,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """子进程异常退出后进程池不可再用，丢弃后下次解析重新创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
 class PDFParser(BaseParser):
     """PDF 文件解析器 - 保留图片和布局"""
     
-    # LaTeX 公式模式
-    LATEX_PATTERNS = [
-        r'\$\$[\s\S]*?\$\$',
-        r'\$[^\$\n]+?\$',
-        r'\\begin\{equation\}[\s\S]*?\\end\{equation\}',
-        r'\\begin\{align\}[\s\S]*?\\end\{align\}',
-    ]
+    # 标题识别规则
+    NUMBERED_HEADING_PATTERN = re.compile(r'^(\d+\.)+\s*\w')
+    SECTION_HEADING_PATTERN = re.compile(
+        r'^(Abstract|Introduction|Conclusion|References|'
+        r'Background|Methods?|Results?|Discussion|'
+        r'Acknowledgements?|Appendix)',
+        re.IGNORECASE
+    )
+    HEADING_LEVEL_PATTERN = re.compile(r'^((\d+\.)+)')
+    PARAGRAPH_SPLIT_PATTERN = re.compile(r'\n\s*\n')
+
+    # 页数达到该值才启用多进程解析，短文档启动进程池得不偿失
+    PARALLEL_MIN_PAGES = 32
+    # 每个进程平均分到的分片数，分片越多负载越均衡
+    SHARDS_PER_WORKER = 4
     
-    def __init__(self):
+    def __init__(self, workers: Optional[int] = None):
+        """
+        Args:
+            workers: 并行解析的进程数，默认为共享解析进程池的大小，为 1 时在当前进程内串行解析
+        """
+        self.workers = min(workers or _pool_size, _pool_size)
         self.pages_content: List[PageContent] = []
         self.images: List[ImageInfo] = []
     
     def parse(self, file_path: Path) -> ParsedDocument:
-        """解析 PDF 文件，提取文本和图片"""
-        doc = fitz.open(str(file_path))
-        
-        self.pages_content = []
-        self.images = []
-        full_text = ""
-        
-        for page_num, page in enumerate(doc):
-            page_content = PageContent(
-                page_num=page_num,
-                width=page.rect.width,
-                height=page.rect.height
-            )
-            
-            # 提取文本块（带位置信息）
-            text_dict = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)
-            for block in text_dict.get("blocks", []):
-                if block.get("type") == 0:  # 文本块
-                    block_text = ""
-                    for line in block.get("lines", []):
-                        for span in line.get("spans", []):
-                            block_text += span.get("text", "")
-                        block_text += "\n"
-                    
-                    if block_text.strip():
-                        page_content.text_blocks.append({
-                            "text": block_text.strip(),
-                            "bbox": block.get("bbox"),
-                            "lines": block.get("lines", [])
-                        })
-                        full_text += block_text + "\n"
-            
-            # 提取图片
-            for img_index, img in enumerate(page.get_images(full=True)):
-                try:
-                    xref = img[0]
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    image_ext = base_image["ext"]
-                    
-                    # 获取图片在页面上的位置
-                    img_rects = page.get_image_rects(xref)
-                    if img_rects:
-                        rect = img_rects[0]
-                        image_info = ImageInfo(
-                            data=image_bytes,
-                            ext=image_ext,
-                            bbox=(rect.x0, rect.y0, rect.x1, rect.y1),
-                            page_num=page_num,
-                            width=rect.width,
-                            height=rect.height
-                        )
-                        page_content.images.append(image_info)
-                        self.images.append(image_info)
-                except Exception as e:
-                    print(f"提取图片失败: {e}")
-            
-            self.pages_content.append(page_content)
-            full_text += "\n\n"
-        
-        doc.close()
+        """解析 PDF 文件，提取文本和图片位置"""
+        with fitz.open(str(file_path)) as doc:
+            page_count = doc.page_count
+            if self.workers <= 1 or page_count < self.PARALLEL_MIN_PAGES:
+                results = [_parse_page(page, page_num) for page_num, page in enumerate(doc)]
+            else:
+                results = None
+
+        if results is None:
+            results = self._parse_parallel(file_path, page_count)
+
+        # 按页码顺序合并
+        self.pages_content = [page_content for page_content, _ in results]
+        self.images = [img for page_content in self.pages_content for img in page_content.images]
+        full_text = "".join(page_text for _, page_text in results)
         
         # 解析文档结构
         metadata = self._extract_metadata(full_text)
@@ -132,6 +207,31 @@ class PDFParser(BaseParser):
         parsed_doc.source_path = file_path
         
         return parsed_doc
+
+    def _parse_parallel(self, file_path: Path, page_count: int) -> List[Tuple[PageContent, str]]:
+        """按页码区间分片，多进程并行解析"""
+        workers = min(self.workers, page_count)
+        shard_size = max(1, -(-page_count // (workers * self.SHARDS_PER_WORKER)))
+        ranges = [
+            (start, min(start + shard_size, page_count))
+            for start in range(0, page_count, shard_size)
+        ]
+
+        results: List[Tuple[PageContent, str]] = []
+        pool = _get_pool()
+        try:
+            # map 按提交顺序返回结果，页码顺序不会乱
+            for shard in pool.map(
+                _parse_page_range,
+                [str(file_path)] * len(ranges),
+                [start for start, _ in ranges],
+                [end for _, end in ranges]
+            ):
+                results.extend(shard)
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            raise
+        return results
     
     def _extract_metadata(self, text: str) -> DocumentMetadata:
         """提取文档元数据"""
@@ -151,7 +251,7 @@ class PDFParser(BaseParser):
     def _parse_content(self, text: str) -> List[ContentBlock]:
         """解析文档内容为块"""
         blocks = []
-        paragraphs = re.split(r'\n\s*\n', text)
+        paragraphs = self.PARAGRAPH_SPLIT_PATTERN.split(text)
         
         for para in paragraphs:
             para = para.strip()
@@ -168,14 +268,14 @@ class PDFParser(BaseParser):
                     level=level
                 ))
             # 检查是否是参考文献
-            elif self._is_reference(para):
+            elif is_reference(para):
                 blocks.append(ContentBlock(
                     type=BlockType.REFERENCE,
                     content=para,
                     should_translate=False
                 ))
             # 检查是否包含公式
-            elif self._contains_formula(para):
+            elif contains_formula(para):
                 blocks.append(ContentBlock(
                     type=BlockType.TEXT,
                     content=para,
@@ -183,7 +283,7 @@ class PDFParser(BaseParser):
                     metadata={"has_formula": True}
                 ))
             # 检查是否是图表标题
-            elif self._is_figure_caption(para):
+            elif is_figure_caption(para):
                 blocks.append(ContentBlock(
                     type=BlockType.FIGURE,
                     content=para,
@@ -201,15 +301,9 @@ class PDFParser(BaseParser):
     
     def _is_heading(self, text: str) -> bool:
         """判断是否是标题"""
-        if re.match(r'^(\d+\.)+\s*\w', text):
+        if self.NUMBERED_HEADING_PATTERN.match(text):
             return True
-        if re.match(
-            r'^(Abstract|Introduction|Conclusion|References|'
-            r'Background|Methods?|Results?|Discussion|'
-            r'Acknowledgements?|Appendix)',
-            text,
-            re.IGNORECASE
-        ):
+        if self.SECTION_HEADING_PATTERN.match(text):
             return True
         if len(text) < 100 and text and text[0].isupper() and '\n' not in text:
             words = text.split()
@@ -219,29 +313,10 @@ class PDFParser(BaseParser):
     
     def _get_heading_level(self, text: str) -> int:
         """获取标题层级"""
-        match = re.match(r'^((\d+\.)+)', text)
+        match = self.HEADING_LEVEL_PATTERN.match(text)
         if match:
             return len(match.group(1).split('.')) - 1
         return 1
     
-    def _is_reference(self, text: str) -> bool:
-        """判断是否是参考文献"""
-        if re.match(r'^\[?\d+[\]\.)]', text):
-            return True
-        return False
-    
-    def _is_figure_caption(self, text: str) -> bool:
-        """判断是否是图表标题"""
-        if re.match(r'^(Figure|Fig\.|Table|Tab\.)\s*\d+', text, re.IGNORECASE):
-            return True
-        return False
-    
-    def _contains_formula(self, text: str) -> bool:
-        """检查是否包含数学公式"""
-        for pattern in self.LATEX_PATTERNS:
-            if re.search(pattern, text):
-                return True
-        return False
-    
     def get_supported_extensions(self) -> List[str]:
         return [".pdf"]
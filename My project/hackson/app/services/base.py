@@ -1,10 +1,25 @@
 """
 AI 服务基类接口
 """
+import re
+import json
+import random
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Union
 from dataclasses import dataclass
 
+from .cache import TranslationCache
+from .rate_limiter import get_rate_limiter, estimate_tokens
+
+
+class RateLimitError(RuntimeError):
+    """服务商返回限流错误 (HTTP 429)，可以稍后重试"""
+
+
+class OutputBudgetExceeded(RuntimeError):
+    """流式输出超过长度预算，判定为失控生成并提前终止"""
+
 
 @dataclass
 class TranslationOptions:
@@ -18,28 +33,361 @@ class TranslationOptions:
 class BaseAIService(ABC):
     """AI 服务基类"""
     
-    def __init__(self, api_key: str, model: Optional[str] = None):
+    # 服务商标识，用于区分缓存
+    PROVIDER = ""
+    
+    # 提示词版本：修改系统提示词或翻译提示词后需要递增，使旧缓存失效
+    PROMPT_VERSION = "1"
+    
+    # 批量翻译：每个请求的 Token 预算（估算值，含输出）和段数上限
+    BATCH_MAX_TOKENS = 3000
+    BATCH_MAX_SEGMENTS = 40
+    
+    # 流式翻译的输出长度预算：原文长度的倍数，且不少于最小值
+    STREAM_MAX_OUTPUT_RATIO = 3.0
+    STREAM_MIN_OUTPUT_BUDGET = 2000
+    
+    # 限流重试：指数退避 + 完全抖动
+    MAX_RETRIES = 5
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 30.0
+    
+    def __init__(
+        self, 
+        api_key: str, 
+        model: Optional[str] = None,
+        cache: Optional[TranslationCache] = None
+    ):
         self.api_key = api_key
         self.model = model
+        self.cache = cache
+        self.rate_limiter = get_rate_limiter(self.PROVIDER or type(self).__name__)
     
-    @abstractmethod
     async def translate(
         self, 
         text: str, 
         options: Optional[TranslationOptions] = None
     ) -> str:
-        """翻译单段文本"""
-        pass
+        """翻译单段文本（优先读取缓存）"""
+        if not text.strip():
+            return text
+        
+        options = options or TranslationOptions()
+        key = self._cache_key(text, options)
+        
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        result = await self._translate_single(text)
+        
+        if self.cache is not None:
+            self.cache.set(key, result)
+        return result
+    
+    async def translate_stream(
+        self, 
+        text: str, 
+        options: Optional[TranslationOptions] = None,
+        max_chars: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式翻译单段文本，逐段产出译文片段
+        
+        命中缓存时一次性产出完整译文；输出超过 max_chars（默认按原文长度估算）
+        时关闭上游连接并抛出 OutputBudgetExceeded。
+        """
+        if not text.strip():
+            yield text
+            return
+        
+        options = options or TranslationOptions()
+        key = self._cache_key(text, options)
+        
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        
+        budget = max_chars or max(
+            self.STREAM_MIN_OUTPUT_BUDGET,
+            int(len(text) * self.STREAM_MAX_OUTPUT_RATIO)
+        )
+        
+        parts = []
+        size = 0
+        stream = self._complete_stream_with_retry(
+            self.get_system_prompt(),
+            self.get_translation_prompt(text),
+            estimate_tokens(text)
+        )
+        try:
+            async for piece in stream:
+                size += len(piece)
+                if size > budget:
+                    raise OutputBudgetExceeded(
+                        f"译文长度超过预算 ({budget} 字符)，已终止生成"
+                    )
+                parts.append(piece)
+                yield piece
+        finally:
+            await stream.aclose()
+        
+        if self.cache is not None:
+            self.cache.set(key, "".join(parts).strip())
     
-    @abstractmethod
     async def translate_batch(
         self, 
         texts: List[str], 
-        options: Optional[TranslationOptions] = None
-    ) -> List[str]:
-        """批量翻译文本"""
+        options: Optional[TranslationOptions] = None,
+        return_exceptions: bool = False
+    ) -> List[Union[str, BaseException]]:
+        """
+        批量翻译文本
+        
+        未命中缓存的文本按 Token 预算打包，每包只发送一次请求；
+        译文段数不匹配时只拆分重译缺失的段落。
+        
+        Args:
+            texts: 待翻译文本列表
+            options: 翻译选项
+            return_exceptions: 为 True 时翻译失败的位置返回异常对象，否则直接抛出
+            
+        Returns:
+            与 texts 一一对应的译文列表
+        """
+        options = options or TranslationOptions()
+        results: List[Union[str, BaseException, None]] = [None] * len(texts)
+        keys = [self._cache_key(text, options) for text in texts]
+        
+        # 1. 先查缓存，空文本原样返回
+        pending = []
+        for i, text in enumerate(texts):
+            if not text.strip():
+                results[i] = text
+                continue
+            if self.cache is not None:
+                cached = self.cache.get(keys[i])
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            pending.append(i)
+        
+        # 2. 按 Token 预算打包并发请求
+        batches = self.pack_batches([texts[i] for i in pending])
+        
+        async def run_batch(batch: List[int]):
+            indices = [pending[j] for j in batch]
+            translated = await self._translate_segments([texts[i] for i in indices])
+            for i, res in zip(indices, translated):
+                results[i] = res
+                if self.cache is not None and isinstance(res, str):
+                    self.cache.set(keys[i], res)
+        
+        await asyncio.gather(*(run_batch(batch) for batch in batches))
+        
+        if not return_exceptions:
+            for res in results:
+                if isinstance(res, BaseException):
+                    raise res
+        return results
+    
+    def pack_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        按 Token 预算和段数上限把文本分组
+        
+        Returns:
+            每组文本在 texts 中的下标
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (
+                current_tokens + tokens > self.BATCH_MAX_TOKENS
+                or len(current) >= self.BATCH_MAX_SEGMENTS
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _cache_key(self, text: str, options: TranslationOptions) -> str:
+        return TranslationCache.make_key(
+            text,
+            self.PROVIDER or type(self).__name__,
+            self.model,
+            options.source_lang,
+            options.target_lang,
+            options.style,
+            self.PROMPT_VERSION
+        )
+    
+    async def _translate_single(self, text: str) -> str:
+        """单段翻译请求（不经过缓存）"""
+        return await self._complete_with_retry(
+            self.get_system_prompt(),
+            self.get_translation_prompt(text),
+            estimate_tokens(text)
+        )
+    
+    async def _translate_segments(
+        self, 
+        texts: List[str]
+    ) -> List[Union[str, BaseException]]:
+        """
+        用一次请求翻译多个段落（不经过缓存）
+        
+        返回结果中缺失、重复或格式错误的段落会被拆成两半重新请求，
+        只剩一段时退化为单段翻译。
+        """
+        if len(texts) == 1:
+            try:
+                return [await self._translate_single(texts[0])]
+            except Exception as e:
+                return [e]
+        
+        try:
+            response = await self._complete_with_retry(
+                self.get_system_prompt(),
+                self.get_batch_translation_prompt(texts),
+                sum(estimate_tokens(text) for text in texts)
+            )
+        except Exception as e:
+            return [e] * len(texts)
+        
+        translated = self._parse_batch_response(response, len(texts))
+        results: List[Union[str, BaseException, None]] = [
+            translated.get(i) for i in range(len(texts))
+        ]
+        
+        missing = [i for i, res in enumerate(results) if res is None]
+        if missing:
+            half = (len(missing) + 1) // 2
+            for group in (missing[:half], missing[half:]):
+                if not group:
+                    continue
+                retried = await self._translate_segments([texts[i] for i in group])
+                for i, res in zip(group, retried):
+                    results[i] = res
+        
+        return results
+    
+    def _parse_batch_response(self, response: str, count: int) -> Dict[int, str]:
+        """
+        解析批量翻译返回的 JSON 数组
+        
+        Returns:
+            段落下标 -> 译文，只包含编号合法且唯一的段落
+        """
+        match = re.search(r'\[[\s\S]*\]', response)
+        if not match:
+            return {}
+        
+        try:
+            items = json.loads(match.group(0))
+        except ValueError:
+            return {}
+        if not isinstance(items, list):
+            return {}
+        
+        translated: Dict[int, str] = {}
+        duplicated = set()
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            seg_id = item.get("id")
+            text = item.get("text")
+            if not isinstance(seg_id, int) or not isinstance(text, str):
+                continue
+            idx = seg_id - 1
+            if not 0 <= idx < count or not text.strip():
+                continue
+            if idx in translated:
+                duplicated.add(idx)
+            translated[idx] = text.strip()
+        
+        # 同一编号出现多次说明模型打乱了分段，这些段落需要重译
+        for idx in duplicated:
+            del translated[idx]
+        return translated
+    
+    async def _complete_with_retry(
+        self, 
+        system_prompt: str, 
+        user_prompt: str,
+        tokens: int
+    ) -> str:
+        """经过全局限流器调用服务商 API，遇到限流错误时退避重试"""
+        for attempt in range(self.MAX_RETRIES + 1):
+            await self.rate_limiter.acquire(tokens)
+            try:
+                result = await self._complete(system_prompt, user_prompt)
+            except RateLimitError:
+                self.rate_limiter.release(rate_limited=True)
+                if attempt >= self.MAX_RETRIES:
+                    raise
+                delay = min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+                continue
+            except BaseException:
+                self.rate_limiter.release()
+                raise
+            
+            self.rate_limiter.release()
+            return result
+    
+    async def _complete_stream_with_retry(
+        self, 
+        system_prompt: str, 
+        user_prompt: str,
+        tokens: int
+    ) -> AsyncIterator[str]:
+        """流式版本的 _complete_with_retry；已经产出内容后不再重试"""
+        for attempt in range(self.MAX_RETRIES + 1):
+            await self.rate_limiter.acquire(tokens)
+            started = False
+            rate_limited = False
+            stream = self._complete_stream(system_prompt, user_prompt)
+            try:
+                async for piece in stream:
+                    started = True
+                    yield piece
+            except RateLimitError:
+                rate_limited = True
+                if started or attempt >= self.MAX_RETRIES:
+                    raise
+            finally:
+                await stream.aclose()
+                self.rate_limiter.release(rate_limited=rate_limited)
+            
+            if not rate_limited:
+                return
+            delay = min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+    
+    @abstractmethod
+    async def _complete(self, system_prompt: str, user_prompt: str) -> str:
+        """调用服务商 API 完成一次对话（不经过缓存和限流）"""
         pass
     
+    async def _complete_stream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """
+        流式调用服务商 API，逐段产出输出
+        
+        默认实现退化为一次性返回完整结果，支持流式输出的服务商应覆盖此方法。
+        """
+        yield await self._complete(system_prompt, user_prompt)
+    
     def get_system_prompt(self) -> str:
         """获取学术翻译系统提示词"""
         return """你是一名专业的学术论文翻译专家。请严格遵守以下规则翻译：
@@ -71,3 +419,19 @@ class BaseAIService(ABC):
 {text}
 
 翻译："""
+    
+    def get_batch_translation_prompt(self, texts: List[str]) -> str:
+        """生成批量翻译提示词，段落以带编号的 JSON 数组传递"""
+        segments = json.dumps(
+            [{"id": i + 1, "text": text} for i, text in enumerate(texts)],
+            ensure_ascii=False,
+            indent=1
+        )
+        return f"""请将下面 JSON 数组中每个元素的 text 字段从英文学术文本翻译成中文。
+
+要求：
+- 返回一个 JSON 数组，共 {len(texts)} 个元素，每个元素形如 {{"id": 原编号, "text": "译文"}}
+- 保持 id 不变，不要合并、拆分或遗漏任何段落
+- 仅返回 JSON 数组，不要添加解释或代码块标记
+
+{segments}"""
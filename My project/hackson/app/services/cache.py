@@ -0,0 +1,169 @@
+"""
+翻译缓存 - 基于内容寻址的本地 SQLite 持久化缓存
+"""
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+class TranslationCache:
+    """
+    翻译结果缓存
+
+    键为 (规范化原文, 服务商, 模型, 源语言, 目标语言, 翻译风格, 提示词版本) 的 SHA-256，
+    值保存在本地 SQLite 文件中，按最近访问时间做 LRU 淘汰，
+    同时限制条目数和总字节数。
+    """
+
+    # 每写入多少条检查一次容量，避免每次写入都做全表统计
+    EVICT_INTERVAL = 100
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_entries: int = 200000,
+        max_bytes: int = 512 * 1024 * 1024
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            isolation_level=None  # autocommit，显式控制事务
+        )
+        # WAL 模式允许多个进程同时读写同一个缓存文件
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_translations_last_access "
+            "ON translations(last_access)"
+        )
+        self._evict()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        规范化原文：去掉每行的缩进和行尾空白，使仅有缩进差异的文本命中同一缓存；
+        行内空白、换行和段落分隔保持不变，分段翻译依赖的文本结构不会被合并
+        """
+        return "\n".join(line.strip() for line in text.splitlines()).strip()
+
+    @classmethod
+    def make_key(
+        cls,
+        text: str,
+        provider: str,
+        model: Optional[str],
+        source_lang: str,
+        target_lang: str,
+        style: str,
+        prompt_version: str
+    ) -> str:
+        """生成缓存键"""
+        parts = [
+            cls.normalize(text),
+            provider,
+            model or "",
+            source_lang,
+            target_lang,
+            style,
+            prompt_version,
+        ]
+        # 使用不会出现在正文中的分隔符，避免字段拼接产生歧义
+        raw = "\x1f".join(parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，命中时刷新访问时间"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE translations SET last_access = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            return row[0]
+
+    def set(self, key: str, value: str):
+        """写入缓存"""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (key, value, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= self.EVICT_INTERVAL:
+                self._evict_locked()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM translations")
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        """按最近访问时间淘汰超出条目数或总字节数限制的记录（调用方需持有锁）"""
+        self._writes_since_evict = 0
+
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations"
+        ).fetchone()
+
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN ("
+                "SELECT key FROM translations ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations"
+            ).fetchone()
+
+        if total <= self.max_bytes:
+            return
+
+        # 从最久未访问的记录开始删除，直到总大小回到限制以内
+        excess = total - self.max_bytes
+        freed = 0
+        stale_keys = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM translations ORDER BY last_access ASC"
+        ):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+
+        self._conn.executemany("DELETE FROM translations WHERE key = ?", stale_keys)
@@ -1,56 +1,59 @@
 """
 Anthropic Claude API 服务实现
 """
-import asyncio
-from typing import List, Optional
+from typing import AsyncIterator, Optional
 
-from anthropic import AsyncAnthropic
+from anthropic import AsyncAnthropic, RateLimitError as AnthropicRateLimitError
 
-from .base import BaseAIService, TranslationOptions
+from .base import BaseAIService, RateLimitError
+from .cache import TranslationCache
 
 
 class ClaudeService(BaseAIService):
     """Anthropic Claude API 服务"""
     
+    PROVIDER = "claude"
     DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
     
-    def __init__(self, api_key: str, model: Optional[str] = None):
-        super().__init__(api_key, model or self.DEFAULT_MODEL)
+    def __init__(
+        self, 
+        api_key: str, 
+        model: Optional[str] = None,
+        cache: Optional[TranslationCache] = None
+    ):
+        super().__init__(api_key, model or self.DEFAULT_MODEL, cache)
         self.client = AsyncAnthropic(api_key=api_key)
     
-    async def translate(
-        self, 
-        text: str, 
-        options: Optional[TranslationOptions] = None
-    ) -> str:
-        """翻译单段文本"""
-        if not text.strip():
-            return text
-        
+    async def _complete(self, system_prompt: str, user_prompt: str) -> str:
+        """调用对话接口"""
         try:
             response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=4096,
-                system=self.get_system_prompt(),
+                system=system_prompt,
                 messages=[
-                    {"role": "user", "content": self.get_translation_prompt(text)}
+                    {"role": "user", "content": user_prompt}
                 ]
             )
             return response.content[0].text.strip()
+        except AnthropicRateLimitError as e:
+            raise RateLimitError(f"Claude 请求被限流: {str(e)}")
         except Exception as e:
             raise RuntimeError(f"Claude 翻译失败: {str(e)}")
     
-    async def translate_batch(
-        self, 
-        texts: List[str], 
-        options: Optional[TranslationOptions] = None
-    ) -> List[str]:
-        """批量翻译文本"""
-        semaphore = asyncio.Semaphore(3)
-        
-        async def translate_with_semaphore(text: str) -> str:
-            async with semaphore:
-                return await self.translate(text, options)
-        
-        tasks = [translate_with_semaphore(text) for text in texts]
-        return await asyncio.gather(*tasks)
+    async def _complete_stream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """流式调用对话接口"""
+        try:
+            async with self.client.messages.stream(
+                model=self.model,
+                max_tokens=4096,
+                system=system_prompt,
+                messages=[
+                    {"role": "user", "content": user_prompt}
+                ]
+            ) as stream:
+                # 退出上下文时关闭连接，提前终止也会停止生成
+                async for text in stream.text_stream:
+                    yield text
+        except AnthropicRateLimitError as e:
+            raise RateLimitError(f"Claude 请求被限流: {str(e)}")
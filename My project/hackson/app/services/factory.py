@@ -4,6 +4,7 @@ AI 服务工厂
 from typing import Optional
 
 from .base import BaseAIService
+from .cache import TranslationCache
 from .openai_service import OpenAIService
 from .qianwen_service import QianwenService
 from .claude_service import ClaudeService
@@ -13,7 +14,8 @@ from .modelscope_service import ModelScopeService
 def create_ai_service(
     provider: str, 
     api_key: str, 
-    model: Optional[str] = None
+    model: Optional[str] = None,
+    cache: Optional[TranslationCache] = None
 ) -> BaseAIService:
     """
     创建 AI 服务实例
@@ -22,6 +24,7 @@ def create_ai_service(
         provider: 服务提供商 (openai, qianwen, claude, modelscope)
         api_key: API 密钥
         model: 可选的模型名称
+        cache: 可选的翻译缓存，所有服务商共享
     
     Returns:
         BaseAIService: AI 服务实例
@@ -39,7 +42,7 @@ def create_ai_service(
             f"支持的提供商: {', '.join(providers.keys())}"
         )
     
-    return providers[provider](api_key, model)
+    return providers[provider](api_key, model, cache)
 
 
 # 各服务商可用的模型列表
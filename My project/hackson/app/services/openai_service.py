@@ -1,57 +1,69 @@
 """
 OpenAI API 服务实现
 """
-import asyncio
-from typing import List, Optional
+from typing import AsyncIterator, Optional
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError as OpenAIRateLimitError
 
-from .base import BaseAIService, TranslationOptions
+from .base import BaseAIService, RateLimitError
+from .cache import TranslationCache
 
 
 class OpenAIService(BaseAIService):
     """OpenAI API 服务"""
     
+    PROVIDER = "openai"
     DEFAULT_MODEL = "gpt-4o-mini"
     
-    def __init__(self, api_key: str, model: Optional[str] = None):
-        super().__init__(api_key, model or self.DEFAULT_MODEL)
+    def __init__(
+        self, 
+        api_key: str, 
+        model: Optional[str] = None,
+        cache: Optional[TranslationCache] = None
+    ):
+        super().__init__(api_key, model or self.DEFAULT_MODEL, cache)
         self.client = AsyncOpenAI(api_key=api_key)
     
-    async def translate(
-        self, 
-        text: str, 
-        options: Optional[TranslationOptions] = None
-    ) -> str:
-        """翻译单段文本"""
-        if not text.strip():
-            return text
-        
+    async def _complete(self, system_prompt: str, user_prompt: str) -> str:
+        """调用对话接口"""
         try:
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": self.get_system_prompt()},
-                    {"role": "user", "content": self.get_translation_prompt(text)}
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.3,
                 max_tokens=4096
             )
             return response.choices[0].message.content.strip()
+        except OpenAIRateLimitError as e:
+            raise RateLimitError(f"OpenAI 请求被限流: {str(e)}")
         except Exception as e:
             raise RuntimeError(f"OpenAI 翻译失败: {str(e)}")
     
-    async def translate_batch(
-        self, 
-        texts: List[str], 
-        options: Optional[TranslationOptions] = None
-    ) -> List[str]:
-        """批量翻译文本（并发控制）"""
-        semaphore = asyncio.Semaphore(3)  # 限制并发数
-        
-        async def translate_with_semaphore(text: str) -> str:
-            async with semaphore:
-                return await self.translate(text, options)
+    async def _complete_stream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """流式调用对话接口"""
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.3,
+                max_tokens=4096,
+                stream=True
+            )
+        except OpenAIRateLimitError as e:
+            raise RateLimitError(f"OpenAI 请求被限流: {str(e)}")
+        except Exception as e:
+            raise RuntimeError(f"OpenAI 翻译失败: {str(e)}")
         
-        tasks = [translate_with_semaphore(text) for text in texts]
-        return await asyncio.gather(*tasks)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # 提前终止时关闭 HTTP 连接，停止生成
+            await stream.close()
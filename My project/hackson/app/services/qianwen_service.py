@@ -2,76 +2,108 @@
 通义千问 API 服务实现
 """
 import asyncio
-from typing import List, Optional
+from typing import AsyncIterator, Optional
 from http import HTTPStatus
 
 import dashscope
 from dashscope import Generation
 
-from .base import BaseAIService, TranslationOptions
+from .base import BaseAIService, RateLimitError
+from .cache import TranslationCache
 
 
 class QianwenService(BaseAIService):
     """通义千问 API 服务"""
     
+    PROVIDER = "qianwen"
     DEFAULT_MODEL = "qwen-turbo"
     
-    def __init__(self, api_key: str, model: Optional[str] = None):
-        super().__init__(api_key, model or self.DEFAULT_MODEL)
+    def __init__(
+        self, 
+        api_key: str, 
+        model: Optional[str] = None,
+        cache: Optional[TranslationCache] = None
+    ):
+        super().__init__(api_key, model or self.DEFAULT_MODEL, cache)
         dashscope.api_key = api_key
     
-    async def translate(
-        self, 
-        text: str, 
-        options: Optional[TranslationOptions] = None
-    ) -> str:
-        """翻译单段文本"""
-        if not text.strip():
-            return text
-        
+    async def _complete(self, system_prompt: str, user_prompt: str) -> str:
+        """调用对话接口"""
         try:
             # 使用线程池执行同步 API 调用
             loop = asyncio.get_event_loop()
             response = await loop.run_in_executor(
                 None,
-                self._sync_translate,
-                text
+                self._sync_complete,
+                system_prompt,
+                user_prompt
             )
             return response
+        except RateLimitError:
+            raise
         except Exception as e:
             raise RuntimeError(f"通义千问翻译失败: {str(e)}")
     
-    def _sync_translate(self, text: str) -> str:
-        """同步翻译方法"""
+    def _sync_complete(self, system_prompt: str, user_prompt: str) -> str:
+        """同步调用对话接口"""
         response = Generation.call(
             model=self.model,
             messages=[
-                {"role": "system", "content": self.get_system_prompt()},
-                {"role": "user", "content": self.get_translation_prompt(text)}
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
             ],
             temperature=0.3,
             max_tokens=4096,
             result_format='message'
         )
         
+        self._check_response(response)
+        return response.output.choices[0].message.content.strip()
+    
+    async def _complete_stream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """流式调用对话接口（SDK 返回同步生成器，逐块在线程池中读取）"""
+        loop = asyncio.get_event_loop()
+        responses = await loop.run_in_executor(
+            None,
+            lambda: Generation.call(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.3,
+                max_tokens=4096,
+                result_format='message',
+                stream=True,
+                incremental_output=True
+            )
+        )
+        
+        try:
+            while True:
+                response = await loop.run_in_executor(None, next, responses, None)
+                if response is None:
+                    break
+                self._check_response(response)
+                content = response.output.choices[0].message.content
+                if content:
+                    yield content
+        finally:
+            try:
+                responses.close()
+            except ValueError:
+                # 取消时线程池中的 next() 可能仍在执行，生成器会随之结束
+                pass
+    
+    def _check_response(self, response):
+        """检查响应状态，限流时抛出 RateLimitError"""
         if response.status_code == HTTPStatus.OK:
-            return response.output.choices[0].message.content.strip()
+            return
+        elif response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            raise RateLimitError(
+                f"通义千问请求被限流: {response.code} - {response.message}"
+            )
         else:
             raise RuntimeError(
                 f"API 错误: {response.code} - {response.message}"
             )
-    
-    async def translate_batch(
-        self, 
-        texts: List[str], 
-        options: Optional[TranslationOptions] = None
-    ) -> List[str]:
-        """批量翻译文本"""
-        semaphore = asyncio.Semaphore(3)
-        
-        async def translate_with_semaphore(text: str) -> str:
-            async with semaphore:
-                return await self.translate(text, options)
-        
-        tasks = [translate_with_semaphore(text) for text in texts]
-        return await asyncio.gather(*tasks)
@@ -0,0 +1,154 @@
+"""
+服务商限流器 - 令牌桶 (请求数/分钟、Token 数/分钟) + 自适应并发
+"""
+import time
+import asyncio
+from collections import deque
+from typing import Dict, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算一次翻译请求消耗的 Token 数（输入 + 输出）"""
+    # 英文约 4 字符 / token，中文约 1 字 / token，这里取折中值并计入等长输出
+    return max(1, len(text) // 3) * 2
+
+
+class TokenBucket:
+    """
+    异步令牌桶
+
+    采用预约方式：先扣除令牌（允许透支），再按欠额等待，
+    保证并发请求按到达顺序排队，且不依赖绑定事件循环的同步原语。
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        """获取令牌，不足时等待"""
+        # 单次请求超过桶容量时按容量计，避免永远等待
+        amount = min(amount, self.capacity)
+        self._refill()
+        self._tokens -= amount
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+    def drain(self):
+        """清空令牌（收到 429 后让后续请求冷却）"""
+        self._refill()
+        self._tokens = min(self._tokens, 0)
+
+
+class AdaptiveConcurrency:
+    """
+    自适应并发控制 (AIMD)
+
+    成功时缓慢增加并发上限，收到限流错误时减半。
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 16):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self):
+        while self._in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self._in_flight += 1
+
+    def release(self, rate_limited: bool = False):
+        self._in_flight -= 1
+        if rate_limited:
+            self.limit = max(self.minimum, self.limit / 2)
+        else:
+            # 每个完整窗口约增加 1
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class ProviderRateLimiter:
+    """单个服务商的全局限流器"""
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int = 8,
+        initial_concurrency: int = 4
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(
+            initial_concurrency, minimum=1, maximum=max_concurrency
+        )
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.concurrency.maximum
+
+    async def acquire(self, tokens: int):
+        """占用一个并发槽，并按请求数和 Token 数限流"""
+        await self.concurrency.acquire()
+        try:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(tokens)
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+    def release(self, rate_limited: bool = False):
+        """释放并发槽；rate_limited 为 True 时降低并发并让令牌桶冷却"""
+        if rate_limited:
+            self.requests.drain()
+        self.concurrency.release(rate_limited)
+
+
+# 各服务商默认限额 (请求数/分钟, Token 数/分钟, 最大并发)
+DEFAULT_RATE_LIMITS = {
+    "openai": (500, 200000, 16),
+    "claude": (50, 40000, 8),
+    "qianwen": (300, 300000, 8),
+    "modelscope": (60, 100000, 4),
+}
+
+# 未知服务商使用的保守限额
+FALLBACK_RATE_LIMIT = (60, 60000, 4)
+
+# 进程内全局限流器，同一服务商的所有任务共享
+_limiters: Dict[str, ProviderRateLimiter] = {}
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """获取服务商的全局限流器"""
+    if provider not in _limiters:
+        rpm, tpm, max_concurrency = DEFAULT_RATE_LIMITS.get(provider, FALLBACK_RATE_LIMIT)
+        _limiters[provider] = ProviderRateLimiter(
+            rpm, tpm,
+            max_concurrency=max_concurrency,
+            initial_concurrency=max(1, max_concurrency // 2)
+        )
+    return _limiters[provider]
@@ -0,0 +1,116 @@
+"""
+任务存储基类接口
+"""
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+
+class LeaseLostError(RuntimeError):
+    """工作进程持有的任务租约已被其他工作进程重新租用或已确认"""
+
+
+class BaseTaskStore(ABC):
+    """
+    翻译任务存储
+
+    同时承担任务状态存储、任务队列和事件流三个职责，
+    Web 进程写入任务并入队，工作进程出队执行并回写进度和事件。
+
+    出队的任务被租用 lease_seconds 秒，期间不会再次出队。执行中的任务需定期 renew() 续约，
+    执行结束后 ack() 才从队列删除；工作进程崩溃或被杀时租约到期，任务重新出队。
+    每次出队生成新的租约 ID，租约被其他工作进程重新租用后，原工作进程的续约、确认和
+    update_leased() 写入都会失败，不会覆盖新租约持有者写入的状态。
+    """
+
+    # 任务结束后事件的保留时间（秒）
+    EVENTS_RETENTION = 300
+
+    def __init__(self, lease_seconds: float = 120):
+        self.lease_seconds = lease_seconds
+
+    @abstractmethod
+    def create(self, task_id: str, data: dict):
+        """创建任务"""
+        pass
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[dict]:
+        """读取任务，不存在时返回 None"""
+        pass
+
+    @abstractmethod
+    def update(self, task_id: str, **fields):
+        """更新任务的部分字段，任务不存在时抛出 KeyError"""
+        pass
+
+    @abstractmethod
+    def enqueue(self, task_id: str):
+        """将任务加入待执行队列"""
+        pass
+
+    @abstractmethod
+    def update_leased(self, task_id: str, lease_id: str, **fields) -> bool:
+        """
+        仅当 lease_id 仍是任务当前的租约时更新任务字段
+
+        Returns:
+            是否已更新；租约已被重新租用或已确认时返回 False，任务不存在时抛出 KeyError
+        """
+        pass
+
+    @abstractmethod
+    def dequeue(self, timeout: float = 1.0) -> Optional[Tuple[str, str]]:
+        """
+        取出并租用下一个待执行任务（包括租约已到期的任务）
+
+        Args:
+            timeout: 队列为空时最长等待秒数
+
+        Returns:
+            (任务 ID, 租约 ID)，超时返回 None
+        """
+        pass
+
+    @abstractmethod
+    def renew(self, task_id: str, lease_id: str) -> bool:
+        """延长已出队任务的租约，租约已丢失时返回 False"""
+        pass
+
+    @abstractmethod
+    def ack(self, task_id: str, lease_id: str) -> bool:
+        """确认任务执行结束，从队列中删除；租约已丢失时不删除并返回 False"""
+        pass
+
+    @abstractmethod
+    def append_event(self, task_id: str, event: str, data: dict):
+        """追加一条任务事件（进度变化、分块译文等），供推送通道读取"""
+        pass
+
+    @abstractmethod
+    def read_events(
+        self,
+        task_id: str,
+        after: int = 0,
+        limit: int = 500
+    ) -> List[Tuple[int, str, dict]]:
+        """
+        读取任务事件
+
+        Args:
+            task_id: 任务 ID
+            after: 只返回序号大于该值的事件
+            limit: 单次最多返回条数
+
+        Returns:
+            (序号, 事件类型, 数据) 列表，按序号递增
+        """
+        pass
+
+    @abstractmethod
+    def expire_events(self, task_id: str):
+        """任务结束后只再保留 EVENTS_RETENTION 秒事件，供推送通道读完剩余事件后清理"""
+        pass
+
+    def close(self):
+        """释放连接"""
+        pass
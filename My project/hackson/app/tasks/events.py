@@ -0,0 +1,108 @@
+"""
+任务事件分发 - 同一 Web 进程内每个任务只有一个轮询协程，事件分发给该任务的所有 SSE 连接
+"""
+import asyncio
+from typing import AsyncIterator, Dict, List, Set, Tuple
+
+from .base import BaseTaskStore
+
+# 任务结束状态
+TERMINAL_STATUSES = ("completed", "failed")
+
+Event = Tuple[int, str, dict]
+
+
+def is_terminal(event: str, data: dict) -> bool:
+    """是否为任务结束事件"""
+    return event == "progress" and data.get("status") in TERMINAL_STATUSES
+
+
+class TaskEventHub:
+    """
+    任务事件轮询与分发
+
+    同一任务的多个连接（多个标签页、断线重连）共享一个轮询协程，
+    任务存储的读取放在线程池中执行，不阻塞事件循环；没有连接时轮询自动停止。
+    """
+
+    # 没有新事件时读取任务存储的间隔（秒）
+    POLL_INTERVAL = 0.5
+    # 单次读取的最大事件数
+    BATCH_SIZE = 500
+
+    def __init__(self, store: BaseTaskStore):
+        self.store = store
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+
+    async def subscribe(self, task_id: str, cursor: int = 0) -> AsyncIterator[Event]:
+        """
+        按序号顺序产出序号大于 cursor 的事件，产出任务结束事件后停止
+
+        Args:
+            task_id: 任务 ID
+            cursor: 客户端已收到的最后一个事件序号（断线重连时的 Last-Event-ID）
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        if task_id not in self._pollers:
+            self._pollers[task_id] = asyncio.create_task(self._poll(task_id, cursor))
+
+        try:
+            # 先补发轮询协程启动前的历史事件，之后的事件由轮询协程推送，按序号去重
+            while True:
+                events = await self._read(task_id, cursor)
+                for seq, event, data in events:
+                    cursor = seq
+                    yield seq, event, data
+                    if is_terminal(event, data):
+                        return
+                if len(events) < self.BATCH_SIZE:
+                    break
+
+            while True:
+                item = await queue.get()
+                if item is None:
+                    # 轮询出错退出，结束本次连接，由客户端携带 Last-Event-ID 重连
+                    return
+                seq, event, data = item
+                if seq <= cursor:
+                    continue
+                cursor = seq
+                yield seq, event, data
+                if is_terminal(event, data):
+                    return
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+                    poller = self._pollers.pop(task_id, None)
+                    if poller is not None:
+                        poller.cancel()
+
+    async def _read(self, task_id: str, cursor: int) -> List[Event]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.store.read_events, task_id, cursor, self.BATCH_SIZE)
+
+    async def _poll(self, task_id: str, cursor: int):
+        """轮询任务存储，把新事件推送给所有订阅者，任务结束后退出"""
+        try:
+            while task_id in self._subscribers:
+                events = await self._read(task_id, cursor)
+                for seq, event, data in events:
+                    cursor = seq
+                    for queue in self._subscribers.get(task_id, ()):
+                        queue.put_nowait((seq, event, data))
+                    if is_terminal(event, data):
+                        return
+                if len(events) < self.BATCH_SIZE:
+                    await asyncio.sleep(self.POLL_INTERVAL)
+        except Exception as e:
+            print(f"任务事件轮询失败 {task_id}: {e}")
+            for queue in self._subscribers.get(task_id, ()):
+                queue.put_nowait(None)
+        finally:
+            if self._pollers.get(task_id) is asyncio.current_task():
+                del self._pollers[task_id]
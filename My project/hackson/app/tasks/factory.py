@@ -0,0 +1,33 @@
+"""
+任务存储工厂
+"""
+from pathlib import Path
+
+from app.config import TASK_LEASE_SECONDS
+from .base import BaseTaskStore
+
+
+def create_task_store(url: str, lease_seconds: float = TASK_LEASE_SECONDS) -> BaseTaskStore:
+    """
+    根据 URL 创建任务存储
+
+    Args:
+        url: sqlite:///path/to/tasks.db 或 redis://host:port/db
+        lease_seconds: 已出队任务的租约时长（秒）
+
+    Returns:
+        BaseTaskStore: 任务存储实例
+    """
+    if url.startswith("sqlite:///"):
+        from .sqlite_store import SQLiteTaskStore
+        return SQLiteTaskStore(Path(url[len("sqlite:///"):]), lease_seconds)
+
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        # redis 为可选依赖，只有使用 Redis 存储时才导入
+        from .redis_store import RedisTaskStore
+        return RedisTaskStore(url, lease_seconds)
+
+    raise ValueError(
+        f"不支持的任务存储: {url}。"
+        f"支持的格式: sqlite:///path, redis://host:port/db"
+    )
@@ -0,0 +1,171 @@
+"""
+Redis 任务存储 - 多机部署共享（兼容 Redis 协议的服务均可）
+"""
+import json
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import redis
+
+from .base import BaseTaskStore
+
+
+class RedisTaskStore(BaseTaskStore):
+    """
+    基于 Redis 的任务存储，任务为 Hash，队列为 List，
+    已出队任务的租约到期时间为 Sorted Set，租约 ID 为 Hash
+    """
+
+    KEY_PREFIX = "translation:task:"
+    QUEUE_KEY = "translation:queue"
+    LEASES_KEY = "translation:leases"
+    LEASE_IDS_KEY = "translation:lease_ids"
+    EVENTS_PREFIX = "translation:events:"
+
+    # 队列为空时的轮询间隔（秒）
+    POLL_INTERVAL = 0.5
+
+    # 优先重新租用租约已到期的任务，否则从队首取出并租用；整个脚本原子执行
+    POP_SCRIPT = """
+    local task_id = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, 1)[1]
+    if not task_id then
+        task_id = redis.call('RPOP', KEYS[1])
+    end
+    if task_id then
+        redis.call('ZADD', KEYS[2], ARGV[2], task_id)
+        redis.call('HSET', KEYS[3], task_id, ARGV[3])
+    end
+    return task_id
+    """
+
+    # 只更新已存在的任务，避免为不存在（或已过期）的任务创建残缺的记录；
+    # 给出租约 ID 时只有仍持有租约才更新。返回 -1: 任务不存在，0: 租约已丢失，1: 已更新
+    UPDATE_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return -1
+    end
+    if ARGV[2] ~= '' and redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+    return 1
+    """
+
+    # 仍持有租约时续约 / 确认
+    RENEW_SCRIPT = """
+    if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+        return 0
+    end
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[3], ARGV[1])
+    return 1
+    """
+    ACK_SCRIPT = """
+    if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+        return 0
+    end
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return 1
+    """
+
+    # 任务记录保留时间（秒），过期后自动清理
+    TASK_TTL = 7 * 24 * 3600
+
+    def __init__(self, url: str, lease_seconds: float = 120):
+        super().__init__(lease_seconds)
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._pop = self.client.register_script(self.POP_SCRIPT)
+        self._update = self.client.register_script(self.UPDATE_SCRIPT)
+        self._renew = self.client.register_script(self.RENEW_SCRIPT)
+        self._ack = self.client.register_script(self.ACK_SCRIPT)
+
+    def _key(self, task_id: str) -> str:
+        return f"{self.KEY_PREFIX}{task_id}"
+
+    def create(self, task_id: str, data: dict):
+        key = self._key(task_id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={k: json.dumps(v, ensure_ascii=False) for k, v in data.items()})
+        pipe.expire(key, self.TASK_TTL)
+        pipe.execute()
+
+    def get(self, task_id: str) -> Optional[dict]:
+        raw = self.client.hgetall(self._key(task_id))
+        if not raw:
+            return None
+        return {k: json.loads(v) for k, v in raw.items()}
+
+    def update(self, task_id: str, **fields):
+        self._update_fields(task_id, "", fields)
+
+    def update_leased(self, task_id: str, lease_id: str, **fields) -> bool:
+        return self._update_fields(task_id, lease_id, fields)
+
+    def _update_fields(self, task_id: str, lease_id: str, fields: dict) -> bool:
+        # 每个字段单独序列化，HSET 只覆盖被修改的字段，不需要读改写
+        args = []
+        for k, v in fields.items():
+            args += [k, json.dumps(v, ensure_ascii=False)]
+        if not args:
+            return True
+        result = self._update(keys=[self._key(task_id), self.LEASE_IDS_KEY], args=[task_id, lease_id] + args)
+        if result < 0:
+            raise KeyError(task_id)
+        return result == 1
+
+    def enqueue(self, task_id: str):
+        self.client.lpush(self.QUEUE_KEY, task_id)
+
+    def dequeue(self, timeout: float = 1.0) -> Optional[Tuple[str, str]]:
+        # 出队和租用必须原子完成，无法使用 BRPOP 阻塞等待，改为轮询
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            lease_id = uuid.uuid4().hex
+            task_id = self._pop(
+                keys=[self.QUEUE_KEY, self.LEASES_KEY, self.LEASE_IDS_KEY],
+                args=[now, now + self.lease_seconds, lease_id]
+            )
+            if task_id is not None:
+                return task_id, lease_id
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.POLL_INTERVAL, remaining))
+
+    def renew(self, task_id: str, lease_id: str) -> bool:
+        return bool(self._renew(
+            keys=[self.LEASES_KEY, self.LEASE_IDS_KEY],
+            args=[task_id, lease_id, time.time() + self.lease_seconds]
+        ))
+
+    def ack(self, task_id: str, lease_id: str) -> bool:
+        return bool(self._ack(keys=[self.LEASES_KEY, self.LEASE_IDS_KEY], args=[task_id, lease_id]))
+
+    def append_event(self, task_id: str, event: str, data: dict):
+        key = f"{self.EVENTS_PREFIX}{task_id}"
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps({"event": event, "data": data}, ensure_ascii=False))
+        pipe.expire(key, self.TASK_TTL)
+        pipe.execute()
+
+    def read_events(
+        self,
+        task_id: str,
+        after: int = 0,
+        limit: int = 500
+    ) -> List[Tuple[int, str, dict]]:
+        # 事件序号为列表下标 + 1
+        items = self.client.lrange(f"{self.EVENTS_PREFIX}{task_id}", after, after + limit - 1)
+        events = []
+        for offset, raw in enumerate(items):
+            item = json.loads(raw)
+            events.append((after + offset + 1, item["event"], item["data"]))
+        return events
+
+    def expire_events(self, task_id: str):
+        self.client.expire(f"{self.EVENTS_PREFIX}{task_id}", self.EVENTS_RETENTION)
+
+    def close(self):
+        self.client.close()
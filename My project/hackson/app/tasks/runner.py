@@ -0,0 +1,147 @@
+"""
+翻译任务执行器 - 从任务存储读取任务并执行翻译
+"""
+import asyncio
+import contextlib
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from app.config import OUTPUT_DIR
+from app.services.cache import TranslationCache
+from app.services.factory import create_ai_service
+from app.parsers.factory import create_parser
+from app.translator.translator import TranslationManager
+from .base import BaseTaskStore, LeaseLostError
+
+# 可以推送给前端的任务字段（不包含文件路径、API 密钥等内部字段）
+PUBLIC_FIELDS = ("status", "progress", "message", "result_file")
+
+
+def update_task(store: BaseTaskStore, task_id: str, lease_id: str, **fields):
+    """
+    更新任务状态，并把公开字段的变化作为 progress 事件推送
+
+    租约已被其他工作进程重新租用时不写入，抛出 LeaseLostError
+    """
+    if not store.update_leased(task_id, lease_id, **fields):
+        raise LeaseLostError(task_id)
+    event = {k: v for k, v in fields.items() if k in PUBLIC_FIELDS}
+    if event:
+        store.append_event(task_id, "progress", event)
+
+
+async def execute_translation(
+    store: BaseTaskStore,
+    task_id: str,
+    lease_id: str,
+    cache: TranslationCache
+):
+    """执行翻译任务，所有状态写入都检查 lease_id 是否仍持有租约"""
+    task = store.get(task_id)
+    if task is None:
+        print(f"任务不存在: {task_id}")
+        return
+
+    if task["status"] != "pending":
+        # 上次执行的工作进程退出后租约到期，任务重新出队
+        if task["status"] == "processing":
+            # API 密钥在首次出队时已清除，无法继续执行
+            with contextlib.suppress(LeaseLostError):
+                update_task(
+                    store,
+                    task_id,
+                    lease_id,
+                    status="failed",
+                    message="翻译失败: 执行任务的工作进程意外退出，请重新提交"
+                )
+        return
+
+    file_path = Path(task["file_path"])
+    api_key = task["api_key"]
+
+    try:
+        # 开始执行时立即清除存储中的 API 密钥，只保留在本进程内存中
+        update_task(
+            store,
+            task_id,
+            lease_id,
+            status="processing",
+            message="正在解析文件...",
+            progress=10,
+            api_key=None
+        )
+
+        # 解析文件（大文件解析耗时较长，放到线程池避免阻塞同进程的其他任务）
+        parser = create_parser(file_path.suffix)
+        document = await asyncio.get_running_loop().run_in_executor(
+            None, parser.parse, file_path
+        )
+
+        update_task(store, task_id, lease_id, message="正在初始化 AI 服务...", progress=20)
+
+        # 创建 AI 服务
+        ai_service = create_ai_service(task["provider"], api_key, task["model"], cache)
+
+        # 创建翻译管理器
+        manager = TranslationManager(ai_service)
+
+        # 定义进度回调
+        def progress_callback(progress: int, message: str):
+            update_task(store, task_id, lease_id, progress=20 + int(progress * 0.7), message=message)
+
+        # 每个块翻译完成后推送部分译文，前端可以边翻译边阅读
+        def block_callback(page: Optional[int], block: int, text: str):
+            store.append_event(task_id, "block", {"page": page, "block": block, "text": text})
+
+        # 根据文件类型决定输出格式
+        is_pdf = file_path.suffix.lower() == ".pdf"
+
+        if is_pdf:
+            # PDF 文件：生成带图片的 PDF
+            output_filename = f"{task_id}.pdf"
+            output_path = OUTPUT_DIR / output_filename
+
+            await manager.translate_to_pdf(
+                document,
+                output_path,
+                progress_callback,
+                block_callback
+            )
+
+            media_type = "application/pdf"
+        else:
+            # 其他文件：生成 Markdown
+            translated_content = await manager.translate_document(
+                document, progress_callback, block_callback
+            )
+
+            update_task(store, task_id, lease_id, message="正在保存结果...", progress=95)
+
+            output_filename = f"{task_id}.md"
+            output_path = OUTPUT_DIR / output_filename
+
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(translated_content)
+
+            media_type = "text/markdown"
+
+        update_task(
+            store,
+            task_id,
+            lease_id,
+            result_file=output_filename,
+            media_type=media_type,
+            status="completed",
+            progress=100,
+            message="翻译完成！"
+        )
+
+    except LeaseLostError:
+        # 租约到期后已被其他工作进程接管（并标记为失败），不再覆盖其状态
+        print(f"任务租约已丢失，停止执行: {task_id}")
+
+    except Exception as e:
+        traceback.print_exc()
+        with contextlib.suppress(LeaseLostError):
+            update_task(store, task_id, lease_id, status="failed", message=f"翻译失败: {str(e)}")
@@ -0,0 +1,229 @@
+"""
+SQLite 任务存储 - 单机多进程共享
+"""
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .base import BaseTaskStore
+
+
+class SQLiteTaskStore(BaseTaskStore):
+    """基于 SQLite 文件的任务存储，适合单机部署多个 Web / 工作进程"""
+
+    # 队列为空时的轮询间隔（秒）
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, db_path: Path, lease_seconds: float = 120):
+        super().__init__(lease_seconds)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            isolation_level=None,  # autocommit，显式控制事务
+            timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_queue (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                lease_until REAL,
+                lease_id TEXT
+            )
+            """
+        )
+        # 旧版本创建的队列表没有租约列
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(task_queue)")}
+        if "lease_until" not in columns:
+            self._conn.execute("ALTER TABLE task_queue ADD COLUMN lease_until REAL")
+        if "lease_id" not in columns:
+            self._conn.execute("ALTER TABLE task_queue ADD COLUMN lease_id TEXT")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                event TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_task_events_task ON task_events(task_id, seq)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_event_expiry (
+                task_id TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+
+    def create(self, task_id: str, data: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tasks (task_id, data, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (task_id, json.dumps(data, ensure_ascii=False), now, now)
+            )
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, task_id: str, **fields):
+        self._update(task_id, None, fields)
+
+    def update_leased(self, task_id: str, lease_id: str, **fields) -> bool:
+        return self._update(task_id, lease_id, fields)
+
+    def _update(self, task_id: str, lease_id: Optional[str], fields: dict) -> bool:
+        """读改写任务数据；给出 lease_id 时在同一事务内检查租约，租约已丢失则不写入"""
+        with self._lock:
+            # BEGIN IMMEDIATE 获取写锁，避免多进程读改写时互相覆盖
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM tasks WHERE task_id = ?", (task_id,)
+                ).fetchone()
+                if row is None:
+                    raise KeyError(task_id)
+                if lease_id is not None and self._conn.execute(
+                    "SELECT 1 FROM task_queue WHERE task_id = ? AND lease_id = ?", (task_id, lease_id)
+                ).fetchone() is None:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                data = json.loads(row[0])
+                data.update(fields)
+                self._conn.execute(
+                    "UPDATE tasks SET data = ?, updated_at = ? WHERE task_id = ?",
+                    (json.dumps(data, ensure_ascii=False), time.time(), task_id)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def enqueue(self, task_id: str):
+        with self._lock:
+            self._conn.execute("INSERT INTO task_queue (task_id) VALUES (?)", (task_id,))
+
+    def dequeue(self, timeout: float = 1.0) -> Optional[Tuple[str, str]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            lease = self._pop()
+            if lease is not None:
+                return lease
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.POLL_INTERVAL, remaining))
+
+    def _pop(self) -> Optional[Tuple[str, str]]:
+        """原子地租用队首未被租用（或租约已到期）的任务，返回 (任务 ID, 新租约 ID)"""
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT seq, task_id FROM task_queue "
+                    "WHERE lease_until IS NULL OR lease_until < ? ORDER BY seq LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE task_queue SET lease_until = ?, lease_id = ? WHERE seq = ?",
+                        (now + self.lease_seconds, lease_id, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return (row[1], lease_id) if row else None
+
+    def renew(self, task_id: str, lease_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE task_queue SET lease_until = ? WHERE task_id = ? AND lease_id = ?",
+                (time.time() + self.lease_seconds, task_id, lease_id)
+            )
+        return cursor.rowcount > 0
+
+    def ack(self, task_id: str, lease_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM task_queue WHERE task_id = ? AND lease_id = ?", (task_id, lease_id)
+            )
+        return cursor.rowcount > 0
+
+    def append_event(self, task_id: str, event: str, data: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO task_events (task_id, event, data) VALUES (?, ?, ?)",
+                (task_id, event, json.dumps(data, ensure_ascii=False))
+            )
+
+    def read_events(
+        self,
+        task_id: str,
+        after: int = 0,
+        limit: int = 500
+    ) -> List[Tuple[int, str, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event, data FROM task_events "
+                "WHERE task_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (task_id, after, limit)
+            ).fetchall()
+        return [(seq, event, json.loads(data)) for seq, event, data in rows]
+
+    def expire_events(self, task_id: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO task_event_expiry (task_id, expires_at) VALUES (?, ?)",
+                    (task_id, now + self.EVENTS_RETENTION)
+                )
+                # 顺带清理所有已过保留期的任务事件
+                self._conn.execute(
+                    "DELETE FROM task_events WHERE task_id IN "
+                    "(SELECT task_id FROM task_event_expiry WHERE expires_at < ?)",
+                    (now,)
+                )
+                self._conn.execute("DELETE FROM task_event_expiry WHERE expires_at < ?", (now,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,140 @@
+"""
+翻译工作进程 - 从共享任务队列取任务执行
+
+用法:
+    python -m app.tasks.worker --processes 4 --concurrency 2
+"""
+import asyncio
+import argparse
+import multiprocessing
+
+from app.config import (
+    CACHE_DIR, TASK_STORE_URL, WORKER_CONCURRENCY, WORKER_PROCESSES, PDF_PARSE_WORKERS,
+    TRANSLATION_CACHE_MAX_ENTRIES, TRANSLATION_CACHE_MAX_BYTES
+)
+from app.parsers import pdf_parser
+from app.services.cache import TranslationCache
+from .base import BaseTaskStore
+from .factory import create_task_store
+from .runner import execute_translation
+
+
+def create_translation_cache() -> TranslationCache:
+    """创建翻译缓存（同一机器上的所有进程共享同一个缓存文件）"""
+    return TranslationCache(
+        CACHE_DIR / "translations.db",
+        max_entries=TRANSLATION_CACHE_MAX_ENTRIES,
+        max_bytes=TRANSLATION_CACHE_MAX_BYTES
+    )
+
+
+async def run_worker(
+    store: BaseTaskStore,
+    cache: TranslationCache,
+    concurrency: int = WORKER_CONCURRENCY
+):
+    """
+    持续从队列取任务执行，直到被取消
+
+    Args:
+        store: 任务存储
+        cache: 翻译缓存
+        concurrency: 同时执行的任务数
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    running = set()
+
+    try:
+        while True:
+            await semaphore.acquire()
+
+            # 阻塞式出队放到线程池，避免卡住事件循环
+            leased = await loop.run_in_executor(None, store.dequeue, 1.0)
+            if leased is None:
+                semaphore.release()
+                continue
+
+            async def run(task_id: str, lease_id: str):
+                lease = asyncio.create_task(keep_leased(store, task_id, lease_id))
+                try:
+                    await execute_translation(store, task_id, lease_id, cache)
+                    # 被取消（进程退出）时不确认，租约到期后任务重新出队；
+                    # 租约已被接管时由新的持有者确认
+                    if await loop.run_in_executor(None, store.ack, task_id, lease_id):
+                        await loop.run_in_executor(None, store.expire_events, task_id)
+                finally:
+                    lease.cancel()
+                    semaphore.release()
+
+            task = asyncio.create_task(run(*leased))
+            running.add(task)
+            task.add_done_callback(running.discard)
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def keep_leased(store: BaseTaskStore, task_id: str, lease_id: str):
+    """任务执行期间定期续约，直到被取消或租约已被接管"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(store.lease_seconds / 3)
+        try:
+            if not await loop.run_in_executor(None, store.renew, task_id, lease_id):
+                print(f"任务租约已丢失 {task_id}")
+                return
+        except Exception as e:
+            print(f"任务续约失败 {task_id}: {e}")
+
+
+def _worker_process(store_url: str, concurrency: int, parse_workers: int):
+    """单个工作进程入口"""
+    pdf_parser.set_pool_size(parse_workers)
+    store = create_task_store(store_url)
+    cache = create_translation_cache()
+    try:
+        asyncio.run(run_worker(store, cache, concurrency))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+        cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学术论文翻译工作进程")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES,
+                        help="工作进程数")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY,
+                        help="每个进程同时执行的任务数")
+    parser.add_argument("--store", default=TASK_STORE_URL,
+                        help="任务存储 URL (sqlite:///path 或 redis://host:port/db)")
+    args = parser.parse_args()
+
+    # CPU 核心平均分给各工作进程的 PDF 解析进程池，避免 N 个进程各占满全部核心
+    parse_workers = PDF_PARSE_WORKERS or max(1, multiprocessing.cpu_count() // args.processes)
+
+    processes = [
+        multiprocessing.Process(
+            target=_worker_process,
+            args=(args.store, args.concurrency, parse_workers),
+            name=f"translation-worker-{i}"
+        )
+        for i in range(args.processes)
+    ]
+    for p in processes:
+        p.start()
+
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
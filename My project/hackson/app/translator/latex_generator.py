@@ -1,24 +1,61 @@
 """
 LaTeX 生成器 - 将提取的内容和翻译结果生成 LaTeX 项目并编译为 PDF
+
+构建目录按源文档内容哈希命名，同一文档的多次生成（包括重复上传）共用：
+- 图片按内容哈希命名，已存在则不再写入
+- 单页 PDF 以页面 .tex 的内容哈希命名，未变化的页面直接复用
+- 所有需要重编的页面合并为一个文档，只调用一次 xelatex（字体只加载一次），再拆分为单页 PDF
+- 导言区预编译为格式文件 (mylatexformat)，按导言区哈希在所有文档间共享
+最后用 PyMuPDF 按页序合并单页 PDF。构建缓存超出大小或时间上限时按最近使用时间淘汰。
 """
 import os
+import re
+import time
+import hashlib
 import subprocess
 import shutil
+import uuid
+import zipfile
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
-from app.parsers.pdf_parser import ParsedDocument, ImageInfo
+from typing import List, Dict, Any, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from app.config import TEX_BUILD_MAX_BYTES, TEX_BUILD_MAX_AGE_DAYS
+from app.parsers.pdf_parser import ParsedDocument, ImageInfo, PageContent
+from app.parsers.classifier import looks_like_latex
 
 class LatexGenerator:
     """LaTeX 生成器"""
+
+    # 预编译导言区的格式文件名（不含扩展名）
+    FORMAT_NAME = "preamble"
+    # 本次需要重编的页面合并成的文档名前缀
+    STALE_NAME = "stale"
+    # 最近该时间（秒）内使用过的构建目录可能正被其他任务编译，不参与淘汰
+    CACHE_ACTIVE_SECONDS = 3600
+
+    # LaTeX 特殊字符转义表
+    LATEX_SPECIAL_CHARS = {
+        "&": r"\&",
+        "%": r"\%",
+        "$": r"\$",
+        "#": r"\#",
+        "_": r"\_",
+        "{": r"\{",
+        "}": r"\}",
+        "~": r"\textasciitilde{}",
+        "^": r"\textasciicircum{}",
+        "\\": r"\textbackslash{}",
+    }
+    LATEX_SPECIAL_PATTERN = re.compile('|'.join(re.escape(k) for k in LATEX_SPECIAL_CHARS))
     
-    def __init__(self):
-        pass
-        
     def generate(
         self,
         document: ParsedDocument,
         translated_pages: List[Dict[int, str]],
-        output_path: Path
+        output_path: Path,
+        build_dir: Optional[Path] = None
     ) -> Path:
         """
         生成 LaTeX 项目并编译
@@ -27,85 +64,240 @@ class LatexGenerator:
             document: 解析后的文档对象 (包含图片和元数据)
             translated_pages: 翻译后的文本块映射 List[Dict[block_idx, text]]
             output_path: 最终 PDF 输出路径
+            build_dir: 构建目录，默认为输出目录下的 tex_build/<源文档内容哈希>；
+                对同一目录重复生成时只重新编译内容有变化的页面
             
         Returns:
             生成的 PDF 路径 (如果编译失败，可能返回 None 或抛出异常)
         """
-        # 创建临时构建目录
-        build_dir = output_path.parent / f"tex_build_{output_path.stem}"
-        if build_dir.exists():
-            shutil.rmtree(build_dir)
+        # 输出文件名每个任务都不同，缓存目录必须按源文档内容命名才能跨任务复用
+        cache_root = output_path.parent / "tex_build"
+        if build_dir is None:
+            build_dir = cache_root / self._file_hash(Path(document.source_path))[:32]
         build_dir.mkdir(parents=True, exist_ok=True)
+        # 目录修改时间记录最近使用时间，淘汰时据此判断
+        os.utime(build_dir)
+        self._evict_cache(cache_root, build_dir)
         
         # 1. 保存图片
         images_dir = build_dir / "images"
         images_dir.mkdir(exist_ok=True)
         
         # 映射图片对象 ID 到文件名
-        image_filename_map = {}
-        
-        # 保存所有页面提取的图片
-        for img_idx, img in enumerate(document.images):
-            # 简单的命名策略
-            img_filename = f"img_{img_idx}.{img.ext}"
-            img_path = images_dir / img_filename
-            with open(img_path, "wb") as f:
-                f.write(img.data)
-            image_filename_map[id(img)] = f"images/{img_filename}"
+        image_filename_map = self._extract_images(document, images_dir)
             
         # 2. 生成 tex 内容
-        tex_content = self._build_tex_content(document, translated_pages, image_filename_map)
-        
-        tex_file = build_dir / "main.tex"
-        with open(tex_file, "w", encoding="utf-8") as f:
-            f.write(tex_content)
-            
+        preamble = self._build_preamble()
+        bodies = [
+            self._build_page_body(
+                page_content,
+                translated_pages[page_idx] if page_idx < len(translated_pages) else {},
+                image_filename_map
+            )
+            for page_idx, page_content in enumerate(document.pages_content)
+        ]
+
         # 3. 编译 PDF
+        log_path = output_path.with_suffix(".log")
         try:
-            # 假设系统安装了 xelatex
-            # 需要编译两次以确保引用正确 (虽然这里主要用绝对定位，一次可能够，但保险起见)
-            cmd = ["xelatex", "-interaction=nonstopmode", "main.tex"]
-            
-            # 第一次编译
-            subprocess.run(cmd, cwd=str(build_dir), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            # 第二次编译 (如果有目录或交叉引用需要)
-            # subprocess.run(cmd, cwd=str(build_dir), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            
-            built_pdf = build_dir / "main.pdf"
-            if built_pdf.exists():
-                shutil.copy(built_pdf, output_path)
-                return output_path
-            else:
-                raise RuntimeError("PDF compilation failed: Output file not found.")
+            page_pdfs = self._compile_pages(build_dir, cache_root / "formats", preamble, bodies, log_path)
+
+            # 按页序合并单页 PDF
+            with fitz.open() as merged:
+                for page_pdf in page_pdfs:
+                    with fitz.open(str(page_pdf)) as page_doc:
+                        merged.insert_pdf(page_doc)
+                merged.save(str(output_path), garbage=3, deflate=True)
+            return output_path
                 
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        except (subprocess.CalledProcessError, FileNotFoundError, RuntimeError) as e:
             # 如果编译失败，或者没有 xelatex
             print(f"LaTeX compilation failed: {e}")
             
-            # 打包整个构建目录 (包含图片和 tex) 供用户下载
-            # base_name 不带后缀，root_dir 是要打包的目录
-            zip_base_name = str(output_path.with_suffix(""))
-            archive_path = shutil.make_archive(zip_base_name, 'zip', build_dir)
-            zip_filename = Path(archive_path).name
+            # 完整的 tex 只写到本任务的输出文件，不经过共享构建目录，并发任务之间互不覆盖
+            tex_file = output_path.with_suffix(".tex")
+            tex_file.write_text(
+                preamble + "\\begin{document}\n" + "\n\\newpage\n".join(bodies) + "\n\\end{document}\n",
+                encoding="utf-8"
+            )
             
-            # 同时也保存一份单独的 tex 文件方便查看
-            shutil.copy(tex_file, output_path.with_suffix(".tex"))
+            # 源码包只含本任务的 tex、编译日志和引用的图片，可直接上传 Overleaf
+            zip_path = output_path.with_suffix(".zip")
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.write(tex_file, "main.tex")
+                if log_path.exists():
+                    archive.write(log_path, "main.log")
+                for image in sorted(set(image_filename_map.values())):
+                    archive.write(build_dir / image, image)
+            zip_filename = zip_path.name
             
             raise RuntimeError(
                 f"本地 PDF 编译失败。已生成源码包 {zip_filename} 和 .tex 文件。\n"
                 f"解决方法 1: 安装 MiKTeX (Windows) 或 TeXLive 并确保 xelatex 在 PATH 中。\n"
                 f"解决方法 2: 下载该 zip 包上传到 Overleaf.com 进行在线编译。"
             )
-            
-        return output_path
 
-    def _build_tex_content(
-        self, 
-        document: ParsedDocument, 
-        translated_pages: List[Dict[int, str]],
-        image_filename_map: Dict[int, str]
-    ) -> str:
-        """构建 LaTeX 源码"""
+    def _compile_pages(
+        self,
+        build_dir: Path,
+        format_dir: Path,
+        preamble: str,
+        bodies: List[str],
+        log_path: Path
+    ) -> List[Path]:
+        """
+        编译内容有变化的页面，返回按页序排列的单页 PDF 路径
+
+        单页 PDF 以页面 .tex 的内容哈希命名，已存在时直接复用；
+        其余页面合并为一个文档一次编译，再按页拆分，避免每页启动一次 xelatex 并重复加载字体。
+        同一文档的并发任务各自使用唯一的编译任务名，单页 PDF 原子写入，互不覆盖。
+        编译失败时把本次的编译日志复制到 log_path。
+        """
+        pages_dir = build_dir / "pages"
+        pages_dir.mkdir(exist_ok=True)
+
+        stale = []
+        page_pdfs = []
+        for body in bodies:
+            page_body = "\\null\n" + body  # \null 保证只有绝对定位内容的页面也会输出
+            page_pdf = pages_dir / f"{self._hash(preamble + page_body)[:32]}.pdf"
+            page_pdfs.append(page_pdf)
+            if not page_pdf.exists() and page_pdf not in (pdf for pdf, _ in stale):
+                stale.append((page_pdf, page_body))
+        if not stale:
+            return page_pdfs
+
+        job_name = f"{self.STALE_NAME}-{uuid.uuid4().hex}"
+        stale_tex = build_dir / f"{job_name}.tex"
+        stale_tex.write_text(
+            preamble
+            + "\\begin{document}\n"
+            + "\n\\newpage\n".join(body for _, body in stale)
+            + "\n\\end{document}\n",
+            encoding="utf-8"
+        )
+        try:
+            cmd = ["xelatex", "-interaction=nonstopmode", "-halt-on-error", stale_tex.name]
+            fmt = self._build_format(build_dir, format_dir, preamble)
+            # 格式文件不可用时（如版本不匹配）退回普通编译
+            result = None
+            if fmt:
+                result = subprocess.run(
+                    cmd[:1] + [f"-fmt={fmt}"] + cmd[1:],
+                    cwd=str(build_dir), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                )
+            if result is None or result.returncode != 0:
+                subprocess.run(cmd, cwd=str(build_dir), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+            stale_pdf = stale_tex.with_suffix(".pdf")
+            if not stale_pdf.exists():
+                raise RuntimeError(f"PDF compilation failed: {stale_pdf.name} not found.")
+            with fitz.open(str(stale_pdf)) as compiled:
+                if compiled.page_count != len(stale):
+                    raise RuntimeError(
+                        f"PDF compilation failed: expected {len(stale)} pages, got {compiled.page_count}."
+                    )
+                for page_idx, (page_pdf, _) in enumerate(stale):
+                    tmp_pdf = page_pdf.with_name(f"{job_name}-{page_pdf.name}")
+                    with fitz.open() as page_doc:
+                        page_doc.insert_pdf(compiled, from_page=page_idx, to_page=page_idx)
+                        page_doc.save(str(tmp_pdf))
+                    os.replace(tmp_pdf, page_pdf)
+        except Exception:
+            stale_log = stale_tex.with_suffix(".log")
+            if stale_log.exists():
+                shutil.copyfile(stale_log, log_path)
+            raise
+        finally:
+            for suffix in (".tex", ".pdf", ".log", ".aux"):
+                stale_tex.with_suffix(suffix).unlink(missing_ok=True)
+
+        return page_pdfs
+
+    def _build_format(self, build_dir: Path, format_dir: Path, preamble: str) -> Optional[str]:
+        """
+        将导言区预编译为格式文件并链接到构建目录，返回可传给 -fmt 的格式名，不可用时返回 None
+
+        格式文件以导言区哈希命名保存在 format_dir 中，所有文档共用，导言区不变时只构建一次。
+        """
+        preamble_hash = self._hash(preamble)[:32]
+        shared_fmt = format_dir / f"{preamble_hash}.fmt"
+        fmt_file = build_dir / f"{self.FORMAT_NAME}.fmt"
+
+        if not shared_fmt.exists():
+            format_dir.mkdir(parents=True, exist_ok=True)
+            # 并发任务各自用唯一的任务名构建，再原子替换到共享位置
+            job_name = f"{preamble_hash}-{uuid.uuid4().hex}"
+            (format_dir / f"{job_name}.tex").write_text(
+                preamble + "\\begin{document}\n\\end{document}\n", encoding="utf-8"
+            )
+            cmd = [
+                "xelatex", "-ini", "-interaction=nonstopmode", f"-jobname={job_name}",
+                "&xelatex", "mylatexformat.ltx", f"{job_name}.tex"
+            ]
+            try:
+                result = subprocess.run(cmd, cwd=str(format_dir), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except FileNotFoundError:
+                return None
+            finally:
+                for suffix in (".tex", ".log"):
+                    (format_dir / f"{job_name}{suffix}").unlink(missing_ok=True)
+
+            built_fmt = format_dir / f"{job_name}.fmt"
+            if result.returncode != 0 or not built_fmt.exists():
+                built_fmt.unlink(missing_ok=True)
+                print("LaTeX format preload unavailable, falling back to full compilation")
+                return None
+            os.replace(built_fmt, shared_fmt)
+        else:
+            os.utime(shared_fmt)  # 记录最近使用时间
+
+        # 导言区变化时共享格式文件名也随之变化，构建目录中的链接需要更新
+        if not fmt_file.exists() or not os.path.samefile(fmt_file, shared_fmt):
+            tmp_file = fmt_file.with_suffix(".fmt.tmp")
+            tmp_file.unlink(missing_ok=True)
+            try:
+                os.link(shared_fmt, tmp_file)
+            except OSError:
+                shutil.copyfile(shared_fmt, tmp_file)
+            os.replace(tmp_file, fmt_file)
+        return self.FORMAT_NAME
+
+    def _extract_images(self, document: ParsedDocument, images_dir: Path) -> Dict[int, str]:
+        """
+        从源 PDF 中按需提取图片到构建目录
+
+        同一个 xref 在多页重复出现（如页眉 logo）时只提取一次；
+        文件以内容哈希命名，内容相同的图片只写入一份。
+
+        Returns:
+            图片对象 ID 到相对文件名的映射
+        """
+        image_filename_map = {}
+        if not document.images:
+            return image_filename_map
+
+        xref_files: Dict[int, str] = {}
+        with fitz.open(str(document.source_path)) as pdf:
+            for img in document.images:
+                if img.xref not in xref_files:
+                    try:
+                        data = img.extract(pdf)
+                    except Exception as e:
+                        print(f"提取图片失败: {e}")
+                        continue
+                    img_filename = f"{hashlib.sha256(data).hexdigest()[:32]}.{img.ext}"
+                    img_path = images_dir / img_filename
+                    if not img_path.exists():
+                        with open(img_path, "wb") as f:
+                            f.write(data)
+                    xref_files[img.xref] = f"images/{img_filename}"
+                image_filename_map[id(img)] = xref_files[img.xref]
+
+        return image_filename_map
+
+    def _build_preamble(self) -> str:
+        """构建 LaTeX 导言区（不含 \\begin{document}）"""
         
         # LaTeX 头部
         c = []
@@ -116,8 +308,6 @@ class LatexGenerator:
         # 为了极简 hack，这里假设大部分是 A4。或者我们可以用 \usepackage[absolute]{textpos} 忽略页边距。
         
         c.append(r"\usepackage{xeCJK}")
-        c.append(r"\setCJKmainfont{SimSun}") # 假设有宋体，或者让用户配置
-        c.append(r"\setCJKsansfont{SimHei}")
         c.append(r"\usepackage{graphicx}")
         c.append(r"\usepackage[absolute,overlay]{textpos}")
         c.append(r"\usepackage{calc}")
@@ -129,93 +319,120 @@ class LatexGenerator:
         c.append(r"\textblockorigin{0pt}{0pt}") # 原点左上角
         
         c.append(r"\pagestyle{empty}") # 不显示页码，因为我们是还在原排版的
+
+        # 以上内容会被转储进格式文件；XeTeX 无法转储已加载的系统字体
+        # (Can't \dump a format with native fonts)，字体设置必须放在 \endofdump 之后，
+        # 每次构建只编译一个文档，字体也只加载一次。未使用格式文件时该命令为空操作。
+        c.append(r"\csname endofdump\endcsname")
+        c.append(r"\setCJKmainfont{SimSun}") # 假设有宋体，或者让用户配置
+        c.append(r"\setCJKsansfont{SimHei}")
+
+        return "\n".join(c) + "\n"
+
+    def _build_page_body(
+        self,
+        page_content: PageContent,
+        translations: Dict[int, str],
+        image_filename_map: Dict[int, str]
+    ) -> str:
+        """构建单页正文"""
+        c = []
+        # 处理这一页的图片
+        for img in page_content.images:
+            # img: ImageInfo
+            img_path = image_filename_map.get(id(img))
+            if not img_path:
+                continue
+            
+            # 放置图片
+            x, y, x1, y1 = img.bbox
+            w = x1 - x
+            h = y1 - y
+            
+            # 使用 textblock 放置图片
+            # \begin{textblock*}{width}(x,y)
+            c.append(f"\\begin{{textblock*}}{{{w}pt}}({x}pt,{y}pt)")
+            c.append(f"\\includegraphics[width={w}pt,height={h}pt]{{{img_path}}}")
+            c.append(r"\end{textblock*}")
         
-        c.append(r"\begin{document}")
-        
-        for page_idx, page_content in enumerate(document.pages_content):
-            # 获取页面尺寸，调整 geometry (如果文档页面大小不一，这比较麻烦，简单的做法是只用 textpos 铺满)
-            # LaTeX 很难中途改变页面大小，除非用 pdfpages 或 geometry \newgeometry
-            # 这里简单起见，假设页面尺寸固定，或者我们只管内容放置。
+        # 处理这一页的文本
+        for b_idx, block in enumerate(page_content.text_blocks):
+            x, y, x1, y1 = block["bbox"]
+            w = x1 - x
             
-            # 处理这一页的图片
-            for img in page_content.images:
-                # img: ImageInfo
-                img_path = image_filename_map.get(id(img))
-                if not img_path:
-                    continue
+            text = translations.get(b_idx, "")
+            is_translated = True
+            
+            # 如果没在 translations 里 (例如公式或者过滤掉的短文本)，使用原文
+            if not text:
+                 text = block.get("text", "").strip()
+                 is_translated = False
+            
+            if text:
+                # 简单的公式检测，决定是否转义
+                is_formula = not is_translated and looks_like_latex(text)
                 
-                # 放置图片
-                x, y, x1, y1 = img.bbox
-                w = x1 - x
-                h = y1 - y
+                if is_formula:
+                    # 公式不转义 (可能存在风险，但在 hackson 项目中可接受)
+                    safe_text = text
+                else:
+                    # 普通文本转义
+                    safe_text = self._escape_latex(text)
                 
-                # 使用 textblock 放置图片
-                # \begin{textblock*}{width}(x,y)
                 c.append(f"\\begin{{textblock*}}{{{w}pt}}({x}pt,{y}pt)")
-                c.append(f"\\includegraphics[width={w}pt,height={h}pt]{{{img_path}}}")
+                # 设置字体大小
+                c.append(r"\fontsize{9pt}{11pt}\selectfont") 
+                c.append(f"{safe_text}")
                 c.append(r"\end{textblock*}")
-            
-            # 处理这一页的文本
-            # 需要先找到该页的翻译结果
-            translations = {}
-            if page_idx < len(translated_pages):
-                translations = translated_pages[page_idx]
-                
-            for b_idx, block in enumerate(page_content.text_blocks):
-                x, y, x1, y1 = block["bbox"]
-                w = x1 - x
-                
-                text = translations.get(b_idx, "")
-                is_translated = True
-                
-                # 如果没在 translations 里 (例如公式或者过滤掉的短文本)，使用原文
-                if not text:
-                     text = block.get("text", "").strip()
-                     is_translated = False
-                
-                if text:
-                    # 简单的公式检测，决定是否转义
-                    is_formula = False
-                    if not is_translated:
-                        # 检查是否看起来像 LaTeX 公式
-                        if text.startswith("$") or text.startswith("\\") or "equation" in text:
-                            is_formula = True
-                    
-                    if is_formula:
-                        # 公式不转义 (可能存在风险，但在 hackson 项目中可接受)
-                        safe_text = text
-                    else:
-                        # 普通文本转义
-                        safe_text = self._escape_latex(text)
-                    
-                    c.append(f"\\begin{{textblock*}}{{{w}pt}}({x}pt,{y}pt)")
-                    # 设置字体大小
-                    c.append(r"\fontsize{9pt}{11pt}\selectfont") 
-                    c.append(f"{safe_text}")
-                    c.append(r"\end{textblock*}")
-            
-            # 换页
-            if page_idx < len(document.pages_content) - 1:
-                c.append(r"\newpage")
-                
-        c.append(r"\end{document}")
+
         return "\n".join(c)
 
+    def _evict_cache(self, cache_root: Path, keep: Path):
+        """
+        淘汰构建缓存：删除超过 TEX_BUILD_MAX_AGE_DAYS 天未使用的文档构建目录和格式文件，
+        总大小仍超过 TEX_BUILD_MAX_BYTES 时再按最近使用时间从旧到新删除
+
+        keep 和最近 CACHE_ACTIVE_SECONDS 秒内使用过的条目可能正在编译，不会被删除。
+        """
+        if not cache_root.is_dir():
+            return
+        entries = []  # (最近使用时间, 字节数, 路径)
+        for path in cache_root.iterdir():
+            try:
+                if path.name == "formats":
+                    for fmt in path.glob("*.fmt"):
+                        stat = fmt.stat()
+                        entries.append((stat.st_mtime, stat.st_size, fmt))
+                elif path.is_dir():
+                    size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+                    entries.append((path.stat().st_mtime, size, path))
+            except OSError:  # 并发任务正在删除或替换
+                continue
+
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= TEX_BUILD_MAX_BYTES and now - last_used <= TEX_BUILD_MAX_AGE_DAYS * 86400:
+                break
+            if path == keep or now - last_used < self.CACHE_ACTIVE_SECONDS:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+            total -= size
+
+    def _hash(self, content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _file_hash(self, path: Path) -> str:
+        """按块计算文件内容的 SHA-256"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
     def _escape_latex(self, text: str) -> str:
         """转义 LaTeX 特殊字符"""
-        chars = {
-            "&": r"\&",
-            "%": r"\%",
-            "$": r"\$",
-            "#": r"\#",
-            "_": r"\_",
-            "{": r"\{",
-            "}": r"\}",
-            "~": r"\textasciitilde{}",
-            "^": r"\textasciicircum{}",
-            "\\": r"\textbackslash{}",
-        }
-        pattern = re.compile('|'.join(re.escape(k) for k in chars.keys()))
-        return pattern.sub(lambda m: chars[m.group()], text)
-
-import re
+        return self.LATEX_SPECIAL_PATTERN.sub(lambda m: self.LATEX_SPECIAL_CHARS[m.group()], text)
@@ -0,0 +1,86 @@
+"""
+翻译调度器 - 将整个文档的文本块放入同一个队列并发翻译
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.base import BaseAIService
+
+
+@dataclass
+class TranslationJob:
+    """待翻译的文本块"""
+    key: Any   # 调用方用于回填结果的标识，例如 (page_idx, block_idx)
+    text: str
+
+
+class TranslationScheduler:
+    """
+    文档级翻译调度器
+
+    所有页面的文本块打包后进入同一个队列，由一组工作协程消费。
+    实际并发和请求速率由服务商的全局限流器控制，
+    这里的工作协程数只是上限。
+    """
+
+    def __init__(self, ai_service: BaseAIService, max_workers: Optional[int] = None):
+        self.ai_service = ai_service
+        self.max_workers = max_workers or ai_service.rate_limiter.max_concurrency
+
+    async def run(
+        self,
+        jobs: List[TranslationJob],
+        on_job_done: Optional[Callable[[int, int, TranslationJob, Optional[str]], None]] = None
+    ) -> Dict[Any, Optional[str]]:
+        """
+        翻译所有文本块
+
+        Args:
+            jobs: 待翻译的文本块
+            on_job_done: 每个块完成后的回调 (已完成数, 总数, 任务, 译文或 None)
+
+        Returns:
+            key -> 译文 的映射，翻译失败的块对应 None
+        """
+        results: Dict[Any, Optional[str]] = {}
+        if not jobs:
+            return results
+
+        # 短文本块按 Token 预算打包，每包只发一次请求
+        queue: asyncio.Queue = asyncio.Queue()
+        for batch in self.ai_service.pack_batches([job.text for job in jobs]):
+            queue.put_nowait([jobs[i] for i in batch])
+
+        total = len(jobs)
+        done = 0
+
+        async def worker():
+            nonlocal done
+            while True:
+                try:
+                    batch = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                translated = await self.ai_service.translate_batch(
+                    [job.text for job in batch],
+                    return_exceptions=True
+                )
+
+                for job, res in zip(batch, translated):
+                    if isinstance(res, BaseException):
+                        print(f"Block {job.key} translation error: {res}")
+                        res = None
+                    else:
+                        res = res.strip()
+
+                    results[job.key] = res
+                    done += 1
+                    if on_job_done:
+                        on_job_done(done, total, job, res)
+
+        workers = [worker() for _ in range(min(self.max_workers, queue.qsize()))]
+        await asyncio.gather(*workers)
+
+        return results
@@ -1,15 +1,18 @@
 """
 翻译管理器 - 协调整个翻译流程
 """
-import re
-import asyncio
 from pathlib import Path
-from typing import Callable, Optional, List, Dict
+from typing import Callable, Optional, List, Tuple
 
 from app.parsers.base import ParsedDocument, ContentBlock, BlockType
+from app.parsers.classifier import BlockKind, classify_block
 from app.services.base import BaseAIService
 from app.translator.pdf_generator import PDFGenerator
 from app.translator.latex_generator import LatexGenerator
+from app.translator.scheduler import TranslationScheduler, TranslationJob
+
+# 分块译文回调 (页码或 None, 块序号, 译文)，用于向前端推送部分结果
+BlockCallback = Callable[[Optional[int], int, str], None]
 
 
 class TranslationManager:
@@ -27,7 +30,8 @@ class TranslationManager:
         self,
         document: ParsedDocument,
         output_path: Path,
-        progress_callback: Optional[Callable[[int, str], None]] = None
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        block_callback: Optional[BlockCallback] = None
     ) -> Path:
         """
         翻译文档并生成 PDF
@@ -37,6 +41,7 @@ class TranslationManager:
             document: 解析后的文档
             output_path: 输出 PDF 路径
             progress_callback: 进度回调
+            block_callback: 每个文本块翻译完成后的回调
             
         Returns:
             输出文件路径
@@ -47,7 +52,9 @@ class TranslationManager:
             
         # 检查是否有详细的页面内容（用于精确布局还原）
         if hasattr(document, 'pages_content') and document.pages_content:
-            return await self._translate_pdf_with_layout(document, output_path, progress_callback)
+            return await self._translate_pdf_with_layout(
+                document, output_path, progress_callback, block_callback
+            )
         
         # 降级方案：如果没有页面信息（比如不是PDF源或者是简单的解析器），无法做布局还原
         # 这里为了演示，抛出异常或仅做简单文本拼接（暂不支持）
@@ -57,95 +64,50 @@ class TranslationManager:
         self,
         document: ParsedDocument,
         output_path: Path,
-        progress_callback: Optional[Callable[[int, str], None]] = None
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        block_callback: Optional[BlockCallback] = None
     ) -> Path:
         """使用页面布局信息进行精确翻译"""
-        converted_pages = [] # List[Dict[block_idx, text]]
-        
-        total_pages = len(document.pages_content)
+        # 收集所有页面的文本块，放入同一个调度队列
+        jobs = []
         
         for page_idx, page_content in enumerate(document.pages_content):
-            if progress_callback:
-                progress = int((page_idx / total_pages) * 90)
-                progress_callback(progress, f"正在翻译第 {page_idx + 1}/{total_pages} 页...")
-            
-            page_translations = {}
-            
-            # 收集该页所有的文本块
-            blocks_to_translate = []
-            block_indices = []
-            
             for b_idx, block in enumerate(page_content.text_blocks):
                 text = block.get("text", "").strip()
                 if not text:
                     continue
-                # 简单过滤掉纯数字或太短的非句文本（可选）
-                if len(text) < 2 and text.isdigit():
-                    continue
-                
-                # 过滤掉数学公式块 (不翻译，pdf生成时会自动跳过)
-                is_formula = False
-                # 常见的整段公式模式
-                formula_patterns = [
-                    r'^\s*\$\$[\s\S]*?\$\$\s*$',
-                    r'^\s*\\begin\{equation\}[\s\S]*?\\end\{equation\}\s*$',
-                    r'^\s*\\begin\{align\}[\s\S]*?\\end\{align\}\s*$',
-                    r'^\s*\\\[[\s\S]*?\\\]\s*$'
-                ]
-                import re # Ensure re is available inside function if not global, but usually global
-                
-                for pattern in formula_patterns:
-                    if re.match(pattern, text, re.IGNORECASE):
-                        is_formula = True
-                        break
-                
-                if is_formula:
+                # 过滤掉整段公式和纯数值块 (不翻译，pdf生成时会自动使用原文)
+                if classify_block(text) in (BlockKind.FORMULA, BlockKind.NUMERIC):
                     continue
 
-                blocks_to_translate.append(text)
-                block_indices.append(b_idx)
-            
-            if not blocks_to_translate:
-                converted_pages.append({})
-                continue
-                
-            # 批量翻译（为了提高速度，可以将一页的文本合并发送）
-            # 这里简单实现：逐块或合并翻译
-            # 为了保持块的独立性以便回填，我们将它们组合成一个列表提示给 AI，或者分别翻译
-            # 考虑到上下文，最好是整页文本一起给 AI，请求返回对应的翻译列表
-            # 但为了鲁棒性，这里先逐块翻译（或者小批量）
-            
-            # 简易策略：逐块调用 (注意：这会很慢，但在 Hackathon 项目中可接受)
-            # 优化策略：合并为一个大文本，用特殊分隔符，然后分割
-            
-            combined_text = "\n---BLOCK_SEP---\n".join(blocks_to_translate)
-            
-            try:
-                # 提示 AI 保持分隔符
-                system_prompt = "You are a translator. Translate the following text segments into Chinese. Maintain the number of segments. Segments are separated by '---BLOCK_SEP---'. Return ONLY the translated segments separated by '---BLOCK_SEP---'."
-                # 注意：BaseAIService 可能没有 system_prompt 参数，视具体实现而定
-                # 这里假设 direct translate
-                
-                # 由于我们无法修改 ai_service 接口，这里只能调用 translate
-                # 我们假设 translate 只是简单的 text -> translated text
-                # 尝试分块翻译
-                
-                # 并发翻译该页所有块
-                tasks = [self.ai_service.translate(text) for text in blocks_to_translate]
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                for i, res in enumerate(results):
-                    original_idx = block_indices[i]
-                    if isinstance(res, Exception):
-                        # 翻译失败，使用原文
-                        page_translations[original_idx] = blocks_to_translate[i]
-                    else:
-                        page_translations[original_idx] = res.strip()
-                        
-            except Exception as e:
-                print(f"Page {page_idx} translation error: {e}")
-            
-            converted_pages.append(page_translations)
+                jobs.append(TranslationJob(key=(page_idx, b_idx), text=text))
+        
+        total_pages = len(document.pages_content)
+        converted_pages = [{} for _ in range(total_pages)]  # List[Dict[block_idx, text]]
+        
+        if progress_callback:
+            progress_callback(0, f"共 {total_pages} 页、{len(jobs)} 个文本块，开始翻译...")
+        
+        # 按块汇报进度，而不是按页
+        def on_job_done(done: int, total: int, job: TranslationJob, translated: Optional[str]):
+            page_idx, b_idx = job.key
+            if block_callback and translated is not None:
+                block_callback(page_idx, b_idx, translated)
+            if progress_callback:
+                progress = int((done / total) * 90)
+                progress_callback(
+                    progress,
+                    f"已翻译 {done}/{total} 个文本块（第 {page_idx + 1}/{total_pages} 页）..."
+                )
+        
+        scheduler = TranslationScheduler(self.ai_service)
+        results = await scheduler.run(jobs, on_job_done)
+        
+        for job in jobs:
+            page_idx, b_idx = job.key
+            translated = results.get(job.key)
+            # 翻译失败，使用原文
+            converted_pages[page_idx][b_idx] = translated if translated is not None else job.text
             
         if progress_callback:
             progress_callback(95, "正在生成最终 PDF (LaTeX)...")
@@ -167,7 +129,8 @@ class TranslationManager:
     async def translate_document(
         self,
         document: ParsedDocument,
-        progress_callback: Optional[Callable[[int, str], None]] = None
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        block_callback: Optional[BlockCallback] = None
     ) -> str:
         """
         翻译整个文档
@@ -175,6 +138,7 @@ class TranslationManager:
         Args:
             document: 解析后的文档
             progress_callback: 进度回调函数 (progress: 0-100, message: str)
+            block_callback: 每个翻译块完成后的回调
             
         Returns:
             翻译后的 Markdown 文本
@@ -201,7 +165,10 @@ class TranslationManager:
                 progress_callback(progress, f"正在翻译第 {i + 1}/{total_chunks} 块...")
             
             try:
-                translated_text = await self.ai_service.translate(chunk_text)
+                # 流式接收译文，段落一完成就推送，不必等整个块返回
+                translated_text, emitted = await self._translate_chunk_streaming(
+                    block_indices, chunk_text, block_callback
+                )
                 
                 # 如果是单个块，直接映射
                 if len(block_indices) == 1:
@@ -219,6 +186,11 @@ class TranslationManager:
                 # 翻译失败，保留原文
                 for idx in block_indices:
                     translated_blocks[idx] = f"[翻译失败: {str(e)}]\n{translatable_blocks[idx].content}"
+                continue
+            
+            if block_callback:
+                for idx in block_indices[emitted:]:
+                    block_callback(None, idx, translated_blocks[idx])
         
         if progress_callback:
             progress_callback(100, "翻译完成，正在组装文档...")
@@ -226,6 +198,34 @@ class TranslationManager:
         # 组装最终文档
         return self._assemble_document(document, translatable_blocks, translated_blocks)
     
+    async def _translate_chunk_streaming(
+        self,
+        block_indices: List[int],
+        chunk_text: str,
+        block_callback: Optional[BlockCallback] = None
+    ) -> Tuple[str, int]:
+        """
+        流式翻译一个块，增量组装译文
+        
+        Returns:
+            (完整译文, 已通过 block_callback 推送的块数)
+        """
+        buffer = ""
+        emitted = 0
+        
+        async for piece in self.ai_service.translate_stream(chunk_text):
+            buffer += piece
+            if not block_callback:
+                continue
+            
+            # 最后一个段落可能还没生成完，只推送之前已完整的段落
+            paragraphs = buffer.split('\n\n')
+            while emitted < min(len(paragraphs) - 1, len(block_indices)):
+                block_callback(None, block_indices[emitted], paragraphs[emitted].strip())
+                emitted += 1
+        
+        return buffer.strip(), emitted
+    
     def _create_chunks(
         self, 
         blocks: List[ContentBlock]
@@ -0,0 +1,76 @@
+"""
+LaTeX 构建耗时基准：整文档单次编译 vs 缓存构建（冷启动 / 全部命中 / 单页变化）
+
+需要 xelatex、mylatexformat 和 PyMuPDF。译文直接使用原文，不调用翻译服务。
+
+用法（在 hackson 目录下）:
+    python -m benchmarks.latex_build paper.pdf
+"""
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.parsers.pdf_parser import PDFParser  # noqa: E402
+from app.translator.latex_generator import LatexGenerator  # noqa: E402
+
+
+def timed(name: str, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:8.2f} s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LaTeX 构建基准")
+    parser.add_argument("pdf", type=Path, help="源 PDF")
+    args = parser.parse_args()
+
+    document = PDFParser().parse(args.pdf)
+    pages = [
+        {b_idx: block.get("text", "") for b_idx, block in enumerate(page.text_blocks)}
+        for page in document.pages_content
+    ]
+    generator = LatexGenerator()
+    print(f"{len(pages)} pages")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # 基线：与改动前一致，每次生成整份 main.tex 并完整编译一次
+        baseline_dir = tmp / "baseline"
+        (baseline_dir / "images").mkdir(parents=True)
+        images = generator._extract_images(document, baseline_dir / "images")
+        bodies = [
+            generator._build_page_body(page_content, pages[page_idx], images)
+            for page_idx, page_content in enumerate(document.pages_content)
+        ]
+        (baseline_dir / "main.tex").write_text(
+            generator._build_preamble()
+            + "\\begin{document}\n" + "\n\\newpage\n".join(bodies) + "\n\\end{document}\n",
+            encoding="utf-8"
+        )
+        timed("baseline (main.tex)", lambda: subprocess.run(
+            ["xelatex", "-interaction=nonstopmode", "main.tex"],
+            cwd=str(baseline_dir), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        ))
+
+        out = tmp / "out"
+        out.mkdir()
+        timed("cold (no cache, no format)", lambda: generator.generate(document, pages, out / "a.pdf"))
+        timed("warm (all pages cached)", lambda: generator.generate(document, pages, out / "b.pdf"))
+        pages[0] = {b_idx: text + " " for b_idx, text in pages[0].items()} or {0: "x"}
+        timed("one page changed", lambda: generator.generate(document, pages, out / "c.pdf"))
+        shutil.rmtree(out / "tex_build" / next(p.name for p in (out / "tex_build").iterdir() if p.name != "formats"))
+        timed("new document, shared format", lambda: generator.generate(document, pages, out / "d.pdf"))
+
+
+if __name__ == "__main__":
+    main()
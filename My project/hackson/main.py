@@ -2,41 +2,114 @@
 学术论文翻译网站 - FastAPI 主应用
 """
 import os
+import re
+import json
 import uuid
 import asyncio
+import hashlib
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+import aiofiles
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
-from app.services.factory import create_ai_service
-from app.parsers.factory import create_parser
-from app.translator.translator import TranslationManager
+from app.config import (
+    BASE_DIR, UPLOAD_DIR, OUTPUT_DIR, TASK_STORE_URL,
+    EMBEDDED_WORKER, WORKER_CONCURRENCY, MAX_FILE_SIZE
+)
+from app.tasks.events import TERMINAL_STATUSES, TaskEventHub
+from app.tasks.factory import create_task_store
+from app.tasks.worker import run_worker, create_translation_cache
+
+# 上传 / 下载时每次读写的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# 上传请求体中 multipart 边界、字段头等文件内容以外部分的上限（字节）
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# 翻译任务存储 (多个 Web 进程和工作进程共享)
+task_store = create_task_store(TASK_STORE_URL)
+
+# 任务事件分发，同一任务的所有推送连接共享一个轮询
+event_hub = TaskEventHub(task_store)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """单机开发模式下在 Web 进程内运行翻译工作协程"""
+    worker = None
+    if EMBEDDED_WORKER:
+        # 翻译缓存 (修订版论文重新上传时，未改动的段落直接命中缓存)
+        translation_cache = create_translation_cache()
+        worker = asyncio.create_task(
+            run_worker(task_store, translation_cache, WORKER_CONCURRENCY)
+        )
+    yield
+    if worker:
+        worker.cancel()
+
+
+class UploadSizeLimitMiddleware:
+    """
+    在解析 multipart 之前限制上传请求体大小
+
+    FastAPI 在调用接口函数之前就会把整个 multipart 请求体解析并落盘，
+    接口内的大小检查无法阻止超大请求被完整接收。这里在 ASGI 层：
+    - Content-Length 超过上限时直接返回 413，不读取请求体
+    - 未声明长度（分块传输）时边接收边计数，超过上限立即中止解析
+    """
+
+    def __init__(self, app, path: str, max_body_size: int):
+        self.app = app
+        self.path = path
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"文件大小超过 {MAX_FILE_SIZE // (1024 * 1024)}MB 限制"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = JSONResponse({"detail": detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # 在表单解析过程中抛出，由 FastAPI 的异常处理返回 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
 
-load_dotenv()
 
-app = FastAPI(title="学术论文翻译工具", version="1.0.0")
+app = FastAPI(title="学术论文翻译工具", version="1.0.0", lifespan=lifespan)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path="/api/upload",
+    max_body_size=MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD
+)
 
 # 挂载静态文件和模板
-BASE_DIR = Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
-# 存储目录
-UPLOAD_DIR = BASE_DIR / "uploads"
-OUTPUT_DIR = BASE_DIR / "outputs"
-UPLOAD_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
-
-# 翻译任务状态存储 (生产环境应使用 Redis)
-translation_tasks: dict = {}
-
 
 class TranslationRequest(BaseModel):
     file_id: str
@@ -62,7 +135,7 @@ async def home(request: Request):
 @app.get("/translate/{task_id}")
 async def translate_page(request: Request, task_id: str):
     """翻译进度页面"""
-    if task_id not in translation_tasks:
+    if task_store.get(task_id) is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     return templates.TemplateResponse("translate.html", {
         "request": request,
@@ -83,31 +156,49 @@ async def upload_file(file: UploadFile = File(...)):
             detail=f"不支持的文件类型。支持的类型: {', '.join(allowed_extensions)}"
         )
     
-    # 验证文件大小 (最大 20MB)
-    content = await file.read()
-    if len(content) > 20 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="文件大小超过 20MB 限制")
+    # 请求体大小已由 UploadSizeLimitMiddleware 在解析前限制（包含表单开销），
+    # 这里按文件本身的大小精确校验
+    size_limit_detail = f"文件大小超过 {MAX_FILE_SIZE // (1024 * 1024)}MB 限制"
     
-    # 保存文件
-    file_id = str(uuid.uuid4())
-    file_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+    # 分块写入临时文件，同时计算 SHA-256，超过大小限制立即中止
+    tmp_path = UPLOAD_DIR / f".{uuid.uuid4()}.part"
+    sha256 = hashlib.sha256()
+    size = 0
     
-    with open(file_path, "wb") as f:
-        f.write(content)
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise HTTPException(status_code=400, detail=size_limit_detail)
+                sha256.update(chunk)
+                await f.write(chunk)
+        
+        # 以内容哈希作为文件 ID，相同文件只保存一份
+        file_id = sha256.hexdigest()
+        file_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+        
+        if file_path.exists():
+            tmp_path.unlink()
+        else:
+            os.replace(tmp_path, file_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
     
     return {
         "file_id": file_id,
         "filename": file.filename,
-        "size": len(content),
+        "size": size,
         "type": file_ext
     }
 
 
 @app.post("/api/translate")
-async def start_translation(
-    request: TranslationRequest,
-    background_tasks: BackgroundTasks
-):
+async def start_translation(request: TranslationRequest):
     """启动翻译任务 API"""
     # 查找上传的文件
     file_path = None
@@ -122,7 +213,7 @@ async def start_translation(
     
     # 创建任务
     task_id = str(uuid.uuid4())
-    translation_tasks[task_id] = {
+    task_store.create(task_id, {
         "status": "pending",
         "progress": 0,
         "message": "准备开始翻译...",
@@ -131,102 +222,21 @@ async def start_translation(
         "provider": request.provider,
         "api_key": request.api_key,
         "model": request.model
-    }
+    })
     
-    # 后台执行翻译
-    background_tasks.add_task(
-        execute_translation,
-        task_id,
-        file_path,
-        request.provider,
-        request.api_key,
-        request.model
-    )
+    # 加入任务队列，由工作进程执行翻译
+    task_store.enqueue(task_id)
     
     return {"task_id": task_id, "status": "pending"}
 
 
-async def execute_translation(
-    task_id: str,
-    file_path: Path,
-    provider: str,
-    api_key: str,
-    model: Optional[str]
-):
-    """执行翻译任务"""
-    try:
-        translation_tasks[task_id]["status"] = "processing"
-        translation_tasks[task_id]["message"] = "正在解析文件..."
-        translation_tasks[task_id]["progress"] = 10
-        
-        # 解析文件
-        parser = create_parser(file_path.suffix)
-        document = parser.parse(file_path)
-        
-        translation_tasks[task_id]["message"] = "正在初始化 AI 服务..."
-        translation_tasks[task_id]["progress"] = 20
-        
-        # 创建 AI 服务
-        ai_service = create_ai_service(provider, api_key, model)
-        
-        # 创建翻译管理器
-        manager = TranslationManager(ai_service)
-        
-        # 定义进度回调
-        def progress_callback(progress: int, message: str):
-            translation_tasks[task_id]["progress"] = 20 + int(progress * 0.7)
-            translation_tasks[task_id]["message"] = message
-        
-        # 根据文件类型决定输出格式
-        is_pdf = file_path.suffix.lower() == ".pdf"
-        
-        if is_pdf:
-            # PDF 文件：生成带图片的 PDF
-            output_filename = f"{task_id}.pdf"
-            output_path = OUTPUT_DIR / output_filename
-            
-            await manager.translate_to_pdf(
-                document, 
-                output_path, 
-                progress_callback
-            )
-            
-            translation_tasks[task_id]["result_file"] = output_filename
-            translation_tasks[task_id]["media_type"] = "application/pdf"
-        else:
-            # 其他文件：生成 Markdown
-            translated_content = await manager.translate_document(document, progress_callback)
-            
-            translation_tasks[task_id]["message"] = "正在保存结果..."
-            translation_tasks[task_id]["progress"] = 95
-            
-            output_filename = f"{task_id}.md"
-            output_path = OUTPUT_DIR / output_filename
-            
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(translated_content)
-            
-            translation_tasks[task_id]["result_file"] = output_filename
-            translation_tasks[task_id]["media_type"] = "text/markdown"
-        
-        translation_tasks[task_id]["status"] = "completed"
-        translation_tasks[task_id]["progress"] = 100
-        translation_tasks[task_id]["message"] = "翻译完成！"
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        translation_tasks[task_id]["status"] = "failed"
-        translation_tasks[task_id]["message"] = f"翻译失败: {str(e)}"
-
-
 @app.get("/api/status/{task_id}")
 async def get_status(task_id: str):
     """查询翻译状态 API"""
-    if task_id not in translation_tasks:
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    task = translation_tasks[task_id]
     return TranslationStatus(
         task_id=task_id,
         status=task["status"],
@@ -236,13 +246,113 @@ async def get_status(task_id: str):
     )
 
 
-@app.get("/api/download/{task_id}")
-async def download_result(task_id: str):
-    """下载翻译结果 API"""
-    if task_id not in translation_tasks:
+def _parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单区间的 Range 请求头
+    
+    Returns:
+        (start, end) 闭区间；格式无法识别（含多区间）时返回 None，按完整文件响应
+    """
+    match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', range_header)
+    if not match:
+        return None
+    
+    start_str, end_str = match.groups()
+    if not start_str and not end_str:
+        return None
+    
+    if not start_str:
+        # 后缀区间：bytes=-500 表示最后 500 字节
+        length = int(end_str)
+        start = max(0, file_size - length)
+        end = file_size - 1
+        if length == 0:
+            start = file_size
+    else:
+        start = int(start_str)
+        end = min(int(end_str), file_size - 1) if end_str else file_size - 1
+    
+    if start > end or start >= file_size:
+        raise HTTPException(
+            status_code=416,
+            detail="请求的范围无效",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, end
+
+
+async def _iter_file_range(file_path: Path, start: int, end: int):
+    """按块读取文件的 [start, end] 区间"""
+    async with aiofiles.open(file_path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _format_sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """格式化一条 Server-Sent Event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@app.get("/api/events/{task_id}")
+async def task_events(request: Request, task_id: str):
+    """
+    翻译进度推送 API (Server-Sent Events)
+    
+    事件类型：
+        progress: 任务状态变化 (status / progress / message / result_file 中变化的字段)
+        block: 单个文本块的译文 (page / block / text)
+    """
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    task = translation_tasks[task_id]
+    # 浏览器断线重连时会带上最后收到的事件序号
+    try:
+        cursor = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        cursor = 0
+    
+    async def event_stream():
+        # 先推送当前状态快照
+        yield _format_sse("progress", {
+            "status": task["status"],
+            "progress": task["progress"],
+            "message": task["message"],
+            "result_file": task.get("result_file")
+        })
+        if task["status"] in TERMINAL_STATUSES:
+            return
+        
+        async for seq, event, data in event_hub.subscribe(task_id, cursor):
+            yield _format_sse(event, data, seq)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 关闭 Nginx 缓冲
+        }
+    )
+
+
+@app.get("/api/download/{task_id}")
+async def download_result(request: Request, task_id: str):
+    """下载翻译结果 API（支持 Range 断点续传）"""
+    task = task_store.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
     
     if task["status"] != "completed":
         raise HTTPException(status_code=400, detail="翻译尚未完成")
@@ -258,10 +368,31 @@ async def download_result(task_id: str):
     # 根据文件类型设置 media_type
     media_type = task.get("media_type", "text/markdown")
     
-    return FileResponse(
-        path=file_path,
-        filename=f"translated_{result_file}",
-        media_type=media_type
+    download_name = f"translated_{result_file}"
+    file_size = file_path.stat().st_size
+    
+    range_header = request.headers.get("range")
+    byte_range = _parse_range_header(range_header, file_size) if range_header else None
+    
+    if byte_range is None:
+        return FileResponse(
+            path=file_path,
+            filename=download_name,
+            media_type=media_type,
+            headers={"Accept-Ranges": "bytes"}
+        )
+    
+    start, end = byte_range
+    return StreamingResponse(
+        _iter_file_range(file_path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{file_size}",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": f'attachment; filename="{download_name}"'
+        }
     )
 
 
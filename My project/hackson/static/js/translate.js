@@ -13,10 +13,20 @@ const downloadBtn = document.getElementById('downloadBtn');
 const previewSection = document.getElementById('previewSection');
 const previewContent = document.getElementById('previewContent');
 
-// 状态轮询间隔
+// 状态轮询间隔 (浏览器不支持 SSE 或推送通道断开时使用)
 let pollInterval = null;
 const POLL_INTERVAL_MS = 2000;
 
+// 推送通道
+let eventSource = null;
+
+// 当前任务状态 (progress 事件只包含变化的字段，需要合并)
+const taskState = { status: 'pending', progress: 0, message: '' };
+
+// 实时译文最多保留的字符数
+const LIVE_PREVIEW_MAX_CHARS = 20000;
+let livePreviewText = '';
+
 // 初始化
 function init() {
     if (!taskId) {
@@ -25,11 +35,64 @@ function init() {
         return;
     }
     
-    // 开始轮询状态
+    if (window.EventSource) {
+        subscribeEvents();
+    } else {
+        startPolling();
+    }
+}
+
+// 订阅服务端推送的进度和分块译文
+function subscribeEvents() {
+    eventSource = new EventSource(`/api/events/${taskId}`);
+    
+    eventSource.addEventListener('progress', (event) => {
+        Object.assign(taskState, JSON.parse(event.data));
+        updateUI(taskState);
+        
+        if (taskState.status === 'completed' || taskState.status === 'failed') {
+            eventSource.close();
+        }
+    });
+    
+    eventSource.addEventListener('block', (event) => {
+        appendLivePreview(JSON.parse(event.data));
+    });
+    
+    eventSource.onerror = () => {
+        // 连接被彻底关闭时退回到轮询；CONNECTING 状态下浏览器会自动重连
+        if (eventSource.readyState === EventSource.CLOSED
+            && taskState.status !== 'completed' && taskState.status !== 'failed') {
+            startPolling();
+        }
+    };
+}
+
+// 开始轮询
+function startPolling() {
+    if (pollInterval) {
+        return;
+    }
     pollStatus();
     pollInterval = setInterval(pollStatus, POLL_INTERVAL_MS);
 }
 
+// 追加单个文本块的译文到实时预览
+function appendLivePreview(data) {
+    if (taskState.status === 'completed') {
+        return;
+    }
+    
+    const header = data.page !== null && data.page !== undefined ? `[第 ${data.page + 1} 页] ` : '';
+    livePreviewText += `${header}${data.text}\n\n`;
+    if (livePreviewText.length > LIVE_PREVIEW_MAX_CHARS) {
+        livePreviewText = livePreviewText.substring(livePreviewText.length - LIVE_PREVIEW_MAX_CHARS);
+    }
+    
+    previewContent.textContent = livePreviewText;
+    previewSection.style.display = 'block';
+}
+
 // 轮询翻译状态
 async function pollStatus() {
     try {
@@ -40,6 +103,7 @@ async function pollStatus() {
         }
         
         const data = await response.json();
+        Object.assign(taskState, data);
         updateUI(data);
         
         // 如果完成或失败，停止轮询
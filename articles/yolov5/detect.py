@@ -29,7 +29,6 @@ Usage - formats:
 """
 
 import argparse
-import csv
 import os
 import platform
 import sys
@@ -61,7 +60,7 @@ ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 from ultralytics.utils.plotting import Annotator, colors, save_one_box
 
 from models.common import DetectMultiBackend
-from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
+from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadBatches, LoadImages, LoadScreenshots, LoadStreams
 from utils.general import (
     LOGGER,
     Profile,
@@ -79,6 +78,7 @@ from utils.general import (
     xyxy2xywh,
 )
 from utils.torch_utils import select_device, smart_inference_mode
+from utils.writers import AsyncWriter
 
 
 @smart_inference_mode()
@@ -112,6 +112,11 @@ def run(
     half=False,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
     vid_stride=1,  # video frame-rate stride
+    stream_buffer=1,  # frames buffered per stream
+    stream_policy="latest",  # stream drop policy: latest, fps or all
+    stream_fps=None,  # frames sampled per second per stream with stream_policy='fps'
+    batch_size=1,  # image/video inference batch size
+    workers=0,  # image/video decode and letterbox prefetch threads, 0 to read on the main thread
 ):
     """Runs YOLOv5 detection inference on various sources like images, videos, directories, streams, etc.
 
@@ -147,6 +152,13 @@ def run(
         half (bool): If True, use FP16 half-precision inference. Default is False.
         dnn (bool): If True, use OpenCV DNN backend for ONNX inference. Default is False.
         vid_stride (int): Stride for processing video frames, to skip frames between processing. Default is 1.
+        stream_buffer (int): Number of frames buffered per stream source. Default is 1.
+        stream_policy (str): Stream drop policy, 'latest' keeps the newest frames, 'fps' samples frames at stream_fps
+            and 'all' keeps every frame, pausing the stream reader while its buffer is full. Default is 'latest'.
+        stream_fps (float | None): Frames sampled per second per stream with stream_policy='fps'. Default is None.
+        batch_size (int): Number of images or video frames per inference batch for file sources. Default is 1.
+        workers (int): Threads decoding and letterboxing batches ahead of inference for file sources, 0 reads one
+            image at a time on the main thread. Default is 0.
 
     Returns:
         None
@@ -185,13 +197,36 @@ def run(
     bs = 1  # batch_size
     if webcam:
         view_img = check_imshow(warn=True)
-        dataset = LoadStreams(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        dataset = LoadStreams(
+            source,
+            img_size=imgsz,
+            stride=stride,
+            auto=pt,
+            vid_stride=vid_stride,
+            buffer=stream_buffer,
+            policy=stream_policy,
+            sample_fps=stream_fps,
+        )
         bs = len(dataset)
     elif screenshot:
         dataset = LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
+    elif batch_size > 1 or workers:
+        dataset = LoadBatches(
+            source,
+            img_size=imgsz,
+            stride=stride,
+            auto=pt,
+            vid_stride=vid_stride,
+            batch_size=batch_size,
+            workers=workers,
+        )
+        bs = batch_size
     else:
         dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
-    vid_path, vid_writer = [None] * bs, [None] * bs
+    batched = webcam or isinstance(dataset, LoadBatches)  # path, im0s and frame are per image lists
+    vid_path = [None] * bs
+    writer = AsyncWriter()  # saves results in the background
+    csv_path = save_dir / "predictions.csv"
 
     # Run inference
     model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
@@ -208,7 +243,8 @@ def run(
 
         # Inference
         with dt[1]:
-            visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
+            stem = Path(path[0] if batched else path).stem
+            visualize = increment_path(save_dir / stem, mkdir=True) if visualize else False
             if model.xml and im.shape[0] > 1:
                 pred = None
                 for image in ims:
@@ -226,26 +262,15 @@ def run(
         # Second-stage classifier (optional)
         # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
 
-        # Define the path for the CSV file
-        csv_path = save_dir / "predictions.csv"
-
-        # Create or append to the CSV file
-        def write_to_csv(image_name, prediction, confidence):
-            """Writes prediction data for an image to a CSV file, appending if the file exists."""
-            data = {"Image Name": image_name, "Prediction": prediction, "Confidence": confidence}
-            file_exists = os.path.isfile(csv_path)
-            with open(csv_path, mode="a", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=data.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(data)
-
         # Process predictions
         for i, det in enumerate(pred):  # per image
             seen += 1
             if webcam:  # batch_size >= 1
                 p, im0, frame = path[i], im0s[i].copy(), dataset.count
                 s += f"{i}: "
+            elif batched:
+                p, im0, frame = path[i], im0s[i].copy(), dataset.frame[i]
+                s += f"{i}: "
             else:
                 p, im0, frame = path, im0s.copy(), getattr(dataset, "frame", 0)
 
@@ -266,6 +291,7 @@ def run(
                     s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "  # add to string
 
                 # Write results
+                rows, lines = [], []  # CSV rows and label lines of this image
                 for *xyxy, conf, cls in reversed(det):
                     c = int(cls)  # integer class
                     label = names[c] if hide_conf else f"{names[c]}"
@@ -273,7 +299,7 @@ def run(
                     confidence_str = f"{confidence:.2f}"
 
                     if save_csv:
-                        write_to_csv(p.name, label, confidence_str)
+                        rows.append({"Image Name": p.name, "Prediction": label, "Confidence": confidence_str})
 
                     if save_txt:  # Write to file
                         if save_format == 0:
@@ -283,15 +309,20 @@ def run(
                         else:
                             coords = (torch.tensor(xyxy).view(1, 4) / gn).view(-1).tolist()  # xyxy
                         line = (cls, *coords, conf) if save_conf else (cls, *coords)  # label format
-                        with open(f"{txt_path}.txt", "a") as f:
-                            f.write(("%g " * len(line)).rstrip() % line + "\n")
+                        lines.append(("%g " * len(line)).rstrip() % line + "\n")
 
                     if save_img or save_crop or view_img:  # Add bbox to image
                         c = int(cls)  # integer class
                         label = None if hide_labels else (names[c] if hide_conf else f"{names[c]} {conf:.2f}")
                         annotator.box_label(xyxy, label, color=colors(c, True))
                     if save_crop:
-                        save_one_box(xyxy, imc, file=save_dir / "crops" / names[c] / f"{p.stem}.jpg", BGR=True)
+                        file = save_dir / "crops" / names[c] / f"{p.stem}.jpg"
+                        writer.submit(save_one_box, xyxy, imc, file=file, BGR=True)
+
+                if rows:
+                    writer.csv(csv_path, rows)
+                if lines:
+                    writer.append(f"{txt_path}.txt", "".join(lines))
 
             # Stream results
             im0 = annotator.result()
@@ -306,28 +337,32 @@ def run(
             # Save results (image with detections)
             if save_img:
                 if dataset.mode == "image":
-                    cv2.imwrite(save_path, im0)
+                    writer.submit(cv2.imwrite, save_path, im0)
                 else:  # 'video' or 'stream'
-                    if vid_path[i] != save_path:  # new video
-                        vid_path[i] = save_path
-                        if isinstance(vid_writer[i], cv2.VideoWriter):
-                            vid_writer[i].release()  # release previous video writer
+                    j = i if webcam else 0  # video slot, one per stream
+                    if vid_path[j] != save_path:  # new video
+                        vid_path[j] = save_path
                         if vid_cap:  # video
                             fps = vid_cap.get(cv2.CAP_PROP_FPS)
                             w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
                             h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
                         else:  # stream
                             fps, w, h = 30, im0.shape[1], im0.shape[0]
-                        save_path = str(Path(save_path).with_suffix(".mp4"))  # force *.mp4 suffix on results videos
-                        vid_writer[i] = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
-                    vid_writer[i].write(im0)
+                    writer.video(j, save_path, im0, fps, (w, h))
 
         # Print time (inference-only)
         LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1e3:.1f}ms")
 
     # Print results
+    writer.close()  # flush saved results
     t = tuple(x.t / seen * 1e3 for x in dt)  # speeds per image
     LOGGER.info(f"Speed: %.1fms pre-process, %.1fms inference, %.1fms NMS per image at shape {(1, 3, *imgsz)}" % t)
+    if webcam:
+        for x in dataset.stats():
+            LOGGER.info(
+                f"{x['source']}: {x['read']} frames read, {x['dropped']} dropped, {x['stale']} stale, "
+                f"{x['lag'] * 1e3:.1f}ms lag"
+            )
     if save_txt or save_img:
         s = f"\n{len(list(save_dir.glob('labels/*.txt')))} labels saved to {save_dir / 'labels'}" if save_txt else ""
         LOGGER.info(f"Results saved to {colorstr('bold', save_dir)}{s}")
@@ -369,6 +404,12 @@ def parse_opt():
         --dnn (bool, optional): Flag to use OpenCV DNN for ONNX inference. Defaults to False.
         --vid-stride (int, optional): Video frame-rate stride, determining the number of frames to skip in between
             consecutive frames. Defaults to 1.
+        --stream-buffer (int, optional): Frames buffered per stream source. Defaults to 1.
+        --stream-policy (str, optional): Stream drop policy, one of 'latest', 'fps' or 'all'. Defaults to 'latest'.
+        --stream-fps (float, optional): Frames sampled per second per stream with --stream-policy fps. Defaults to
+            None.
+        --batch-size (int, optional): Image/video inference batch size. Defaults to 1.
+        --workers (int, optional): Threads prefetching image/video batches, 0 reads on the main thread. Defaults to 0.
 
     Returns:
         argparse.Namespace: Parsed command-line arguments as an argparse.Namespace object.
@@ -414,6 +455,11 @@ def parse_opt():
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
     parser.add_argument("--vid-stride", type=int, default=1, help="video frame-rate stride")
+    parser.add_argument("--stream-buffer", type=int, default=1, help="frames buffered per stream")
+    parser.add_argument("--stream-policy", default="latest", choices=("latest", "fps", "all"), help="drop policy")
+    parser.add_argument("--stream-fps", type=float, default=None, help="stream sampling FPS for --stream-policy fps")
+    parser.add_argument("--batch-size", type=int, default=1, help="image/video inference batch size")
+    parser.add_argument("--workers", type=int, default=0, help="image/video prefetch threads, 0 for main thread")
     opt = parser.parse_args()
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
     print_args(vars(opt))
@@ -828,6 +828,7 @@ class AutoShape(nn.Module):
         self.dmb = isinstance(model, DetectMultiBackend)  # DetectMultiBackend() instance
         self.pt = not self.dmb or model.pt  # PyTorch model
         self.model = model.eval()
+        self.buffers = {}  # pooled host input buffers {(shape, dtype): [(buffer, transfer event)]}
         if self.pt:
             m = self.model.model.model[-1] if self.dmb else self.model.model[-1]  # Detect()
             m.inplace = False  # Detect.inplace=False for safe multithread inference
@@ -864,58 +865,103 @@ class AutoShape(nn.Module):
 
         dt = (Profile(), Profile(), Profile())
         with dt[0]:
-            if isinstance(size, int):  # expand
-                size = (size, size)
-            p = next(self.model.parameters()) if self.pt else torch.empty(1, device=self.model.device)  # param
-            autocast = self.amp and (p.device.type != "cpu")  # Automatic Mixed Precision (AMP) inference
             if isinstance(ims, torch.Tensor):  # torch
-                with amp.autocast(autocast):
+                p = self._param()
+                with amp.autocast(self.amp and (p.device.type != "cpu")):
                     return self.model(ims.to(p.device).type_as(p), augment=augment)  # inference
+            ims, x, shape0, shape1, files = self.preprocess(ims, size)
 
-            # Pre-process
-            n, ims = (len(ims), list(ims)) if isinstance(ims, (list, tuple)) else (1, [ims])  # number, list of images
-            shape0, shape1, files = [], [], []  # image and inference shapes, filenames
-            for i, im in enumerate(ims):
-                f = f"image{i}"  # filename
-                if isinstance(im, (str, Path)):  # filename or uri
-                    im, f = Image.open(requests.get(im, stream=True).raw if str(im).startswith("http") else im), im
-                    im = np.asarray(exif_transpose(im))
-                elif isinstance(im, Image.Image):  # PIL Image
-                    im, f = np.asarray(exif_transpose(im)), getattr(im, "filename", f) or f
-                files.append(Path(f).with_suffix(".jpg").name)
-                if im.shape[0] < 5:  # image in CHW
-                    im = im.transpose((1, 2, 0))  # reverse dataloader .transpose(2, 0, 1)
-                im = im[..., :3] if im.ndim == 3 else cv2.cvtColor(im, cv2.COLOR_GRAY2BGR)  # enforce 3ch input
-                s = im.shape[:2]  # HWC
-                shape0.append(s)  # image shape
-                g = max(size) / max(s)  # gain
-                shape1.append([int(y * g) for y in s])
-                ims[i] = im if im.data.contiguous else np.ascontiguousarray(im)  # update
-            shape1 = [make_divisible(x, self.stride) for x in np.array(shape1).max(0)]  # inf shape
-            x = [letterbox(im, shape1, auto=False)[0] for im in ims]  # pad
-            x = np.ascontiguousarray(np.array(x).transpose((0, 3, 1, 2)))  # stack and BHWC to BCHW
-            x = torch.from_numpy(x).to(p.device).type_as(p) / 255  # uint8 to fp16/32
-
-        with amp.autocast(autocast):
-            # Inference
-            with dt[1]:
-                y = self.model(x, augment=augment)  # forward
-
-            # Post-process
-            with dt[2]:
-                y = non_max_suppression(
-                    y if self.dmb else y[0],
-                    self.conf,
-                    self.iou,
-                    self.classes,
-                    self.agnostic,
-                    self.multi_label,
-                    max_det=self.max_det,
-                )  # NMS
-                for i in range(n):
-                    scale_boxes(shape1, y[i][:, :4], shape0[i])
-
-            return Detections(ims, y, files, dt, self.names, x.shape)
+        with dt[1]:
+            y = self.inference(x, augment)
+
+        with dt[2]:
+            y = self.postprocess(y, shape0, shape1)
+
+        return Detections(ims, y, files, dt, self.names, x.shape)
+
+    def _param(self):
+        """Returns a model parameter (or an empty tensor for non-PyTorch backends) carrying the inference device and
+        dtype.
+        """
+        return next(self.model.parameters()) if self.pt else torch.empty(1, device=self.model.device)
+
+    @smart_inference_mode()
+    def preprocess(self, ims, size=640):
+        """Loads and letterboxes images into one BCHW 0-1 tensor, returning (ims, x, shape0, shape1, files)."""
+        if isinstance(size, int):  # expand
+            size = (size, size)
+        p = self._param()
+        ims = list(ims) if isinstance(ims, (list, tuple)) else [ims]  # list of images
+        shape0, shape1, files = [], [], []  # image and inference shapes, filenames
+        for i, im in enumerate(ims):
+            f = f"image{i}"  # filename
+            if isinstance(im, (str, Path)):  # filename or uri
+                im, f = Image.open(requests.get(im, stream=True).raw if str(im).startswith("http") else im), im
+                im = np.asarray(exif_transpose(im))
+            elif isinstance(im, Image.Image):  # PIL Image
+                im, f = np.asarray(exif_transpose(im)), getattr(im, "filename", f) or f
+            files.append(Path(f).with_suffix(".jpg").name)
+            if im.shape[0] < 5:  # image in CHW
+                im = im.transpose((1, 2, 0))  # reverse dataloader .transpose(2, 0, 1)
+            im = im[..., :3] if im.ndim == 3 else cv2.cvtColor(im, cv2.COLOR_GRAY2BGR)  # enforce 3ch input
+            s = im.shape[:2]  # HWC
+            shape0.append(s)  # image shape
+            g = max(size) / max(s)  # gain
+            shape1.append([int(y * g) for y in s])
+            ims[i] = im if im.data.contiguous else np.ascontiguousarray(im)  # update
+        shape1 = [make_divisible(x, self.stride) for x in np.array(shape1).max(0)]  # inf shape
+        key = (len(ims), *shape1, 3), torch.from_numpy(np.empty(0, np.result_type(*ims))).dtype  # BHWC shape, dtype
+        buf = self._buffer(key, p.device)
+        b = buf.numpy()
+        for i, im in enumerate(ims):
+            letterbox(im, shape1, auto=False, dst=b[i])  # pad into batch buffer
+        x = buf.to(p.device, non_blocking=True).permute(0, 3, 1, 2)  # BHWC to BCHW
+        x = x.to(p.dtype, copy=True).div_(255)  # uint8 to fp16/32 on device, never aliasing the pooled buffer
+        self._release(key, buf, x.device)
+        return ims, x, shape0, shape1, files
+
+    def _buffer(self, key, device):
+        """Takes a host input buffer for (shape, dtype) `key` from the pool, pinned for CUDA models, waiting for its
+        previous transfer to finish.
+        """
+        try:
+            buf, event = self.buffers.setdefault(key, []).pop()
+        except IndexError:
+            if len(self.buffers) > 8:  # bound pool to recently used shapes
+                self.buffers.pop(next(iter(self.buffers)))
+            return torch.empty(key[0], dtype=key[1], pin_memory=device.type == "cuda")
+        if event is not None:
+            event.synchronize()
+        return buf
+
+    def _release(self, key, buf, device):
+        """Returns a host input buffer to the pool, with an event marking its asynchronous copy to `device`."""
+        event = torch.cuda.Event() if device.type == "cuda" else None
+        if event is not None:
+            event.record()
+        self.buffers.setdefault(key, []).append((buf, event))
+
+    @smart_inference_mode()
+    def inference(self, x, augment=False):
+        """Runs the model forward pass on a preprocessed BCHW tensor, with AMP if enabled."""
+        with amp.autocast(self.amp and (x.device.type != "cpu")):
+            return self.model(x, augment=augment)  # forward
+
+    @smart_inference_mode()
+    def postprocess(self, y, shape0, shape1):
+        """Applies NMS to raw model outputs and rescales boxes from inference shape1 to original image shapes0."""
+        y = non_max_suppression(
+            y if self.dmb else y[0],
+            self.conf,
+            self.iou,
+            self.classes,
+            self.agnostic,
+            self.multi_label,
+            max_det=self.max_det,
+        )  # NMS
+        for i, s in enumerate(shape0):
+            scale_boxes(shape1, y[i][:, :4], s)
+        return y
 
 
 class Detections:
@@ -310,6 +310,7 @@ def run(
 
         # Metrics
         plot_masks = []  # masks for plotting
+        cm_detections, cm_labels = [], []  # image-indexed inputs of confusion_matrix.process_batches()
         for si, (pred, proto) in enumerate(zip(preds, protos)):
             labels = targets[targets[:, 0] == si, 1:]
             nl, npr = labels.shape[0], pred.shape[0]  # number of labels, predictions
@@ -322,7 +323,7 @@ def run(
                 if nl:
                     stats.append((correct_masks, correct_bboxes, *torch.zeros((2, 0), device=device), labels[:, 0]))
                     if plots:
-                        confusion_matrix.process_batch(detections=None, labels=labels[:, 0])
+                        cm_labels.append(torch.cat((torch.full_like(labels[:, :1], si), labels), 1))  # boxes unused
                 continue
 
             # Masks
@@ -344,7 +345,8 @@ def run(
                 correct_bboxes = process_batch(predn, labelsn, iouv)
                 correct_masks = process_batch(predn, labelsn, iouv, pred_masks, gt_masks, overlap=overlap, masks=True)
                 if plots:
-                    confusion_matrix.process_batch(predn, labelsn)
+                    cm_detections.append(torch.cat((torch.full_like(predn[:, :1], si), predn[:, :6]), 1))
+                    cm_labels.append(torch.cat((torch.full_like(labelsn[:, :1], si), labelsn), 1))
             stats.append((correct_masks, correct_bboxes, pred[:, 4], pred[:, 5], labels[:, 0]))  # (conf, pcls, tcls)
 
             pred_masks = torch.as_tensor(pred_masks, dtype=torch.uint8)
@@ -361,6 +363,10 @@ def run(
                 save_one_json(predn, jdict, path, class_map, pred_masks)  # append to COCO-JSON dictionary
             # callbacks.run('on_val_image_end', pred, predn, path, names, im[si])
 
+        if cm_labels:
+            detections = torch.cat(cm_detections) if cm_detections else torch.zeros((0, 7), device=device)
+            confusion_matrix.process_batches(detections, torch.cat(cm_labels))
+
         # Plot images
         if plots and batch_i < 3:
             if len(plot_masks):
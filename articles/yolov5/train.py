@@ -21,8 +21,8 @@ import random
 import subprocess
 import sys
 import time
-from copy import deepcopy
 from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
 
 try:
@@ -49,11 +49,13 @@ from ultralytics.utils.patches import torch_load
 import val as validate  # for end-of-epoch mAP
 from models.experimental import attempt_load
 from models.yolo import Model
+from utils.augmentations import BatchAugment
 from utils.autoanchor import check_anchors
 from utils.autobatch import check_train_batch_size
 from utils.callbacks import Callbacks
 from utils.dataloaders import create_dataloader
 from utils.downloads import attempt_download, is_url
+from utils.evolve import SuccessiveHalving, TrialScheduler
 from utils.general import (
     LOGGER,
     TQDM_BAR_FORMAT,
@@ -86,6 +88,7 @@ from utils.loss import ComputeLoss
 from utils.metrics import fitness
 from utils.plots import plot_evolve
 from utils.torch_utils import (
+    AsyncCheckpoint,
     EarlyStopping,
     ModelEMA,
     de_parallel,
@@ -261,7 +264,7 @@ def train(hyp, opt, device, callbacks):
     scheduler = lr_scheduler.LambdaLR(optimizer, lr_lambda=lf)  # plot_lr_scheduler(optimizer, scheduler, epochs)
 
     # EMA
-    ema = ModelEMA(model) if RANK in {-1, 0} else None
+    ema = ModelEMA(model, every=opt.ema_every) if RANK in {-1, 0} else None
 
     # Resume
     best_fitness, start_epoch = 0.0, 0
@@ -301,6 +304,7 @@ def train(hyp, opt, device, callbacks):
         prefix=colorstr("train: "),
         shuffle=True,
         seed=opt.seed,
+        batch_augment=opt.batch_augment,
     )
     labels = np.concatenate(dataset.labels, 0)
     mlc = int(labels[:, 0].max())  # max label class
@@ -356,7 +360,9 @@ def train(hyp, opt, device, callbacks):
     scheduler.last_epoch = start_epoch - 1  # do not move
     scaler = torch.cuda.amp.GradScaler(enabled=amp)
     stopper, stop = EarlyStopping(patience=opt.patience), False
+    checkpoint = AsyncCheckpoint(keep=opt.save_keep)  # background checkpoint writer
     compute_loss = ComputeLoss(model)  # init loss class
+    batch_augment = BatchAugment(hyp, mosaic=not opt.rect) if opt.batch_augment else None
     callbacks.run("on_train_start")
     LOGGER.info(
         f"Image sizes {imgsz} train, {imgsz} val\n"
@@ -390,6 +396,8 @@ def train(hyp, opt, device, callbacks):
             callbacks.run("on_train_batch_start")
             ni = i + nb * epoch  # number integrated batches (since train start)
             imgs = imgs.to(device, non_blocking=True).float() / 255  # uint8 to float32, 0-255 to 0.0-1.0
+            if batch_augment:
+                imgs, targets = batch_augment(imgs, targets)  # mosaic, perspective, HSV and flips on device
 
             # Warmup
             if ni <= nw:
@@ -455,7 +463,7 @@ def train(hyp, opt, device, callbacks):
             callbacks.run("on_train_epoch_end", epoch=epoch)
             ema.update_attr(model, include=["yaml", "nc", "hyp", "names", "stride", "class_weights"])
             final_epoch = (epoch + 1 == epochs) or stopper.possible_stop
-            if not noval or final_epoch:  # Calculate mAP
+            if not noval or final_epoch or epoch + 1 in getattr(opt, "evolve_rungs", ()):  # Calculate mAP
                 results, maps, _ = validate.run(
                     data_dict,
                     batch_size=batch_size // WORLD_SIZE * 2,
@@ -477,14 +485,15 @@ def train(hyp, opt, device, callbacks):
                 best_fitness = fi
             log_vals = list(mloss) + list(results) + lr
             callbacks.run("on_fit_epoch_end", log_vals, epoch, best_fitness, fi)
+            stop |= callbacks.stop_training  # i.e. evolve trial pruned by successive halving
 
             # Save model
             if (not nosave) or (final_epoch and not evolve):  # if save
                 ckpt = {
                     "epoch": epoch,
                     "best_fitness": best_fitness,
-                    "model": deepcopy(de_parallel(model)).half(),
-                    "ema": deepcopy(ema.ema).half(),
+                    "model": de_parallel(model),  # snapshot to FP16 on CPU by checkpoint.save()
+                    "ema": ema.ema,
                     "updates": ema.updates,
                     "optimizer": optimizer.state_dict(),
                     "opt": vars(opt),
@@ -492,14 +501,15 @@ def train(hyp, opt, device, callbacks):
                     "date": datetime.now().isoformat(),
                 }
 
-                # Save last, best and delete
-                torch.save(ckpt, last)
-                if best_fitness == fi:
-                    torch.save(ckpt, best)
-                if opt.save_period > 0 and epoch % opt.save_period == 0:
-                    torch.save(ckpt, w / f"epoch{epoch}.pt")
+                # Save last, best and delete in the background, best and periodic checkpoints link to last
+                checkpoint.save(
+                    ckpt,
+                    last,
+                    best=best if best_fitness == fi else None,
+                    periodic=w / f"epoch{epoch}.pt" if opt.save_period > 0 and epoch % opt.save_period == 0 else None,
+                    done=partial(callbacks.run, "on_model_save", last, epoch, final_epoch, best_fitness, fi),
+                )
                 del ckpt
-                callbacks.run("on_model_save", last, epoch, final_epoch, best_fitness, fi)
 
         # EarlyStopping
         if RANK != -1:  # if DDP training
@@ -513,6 +523,7 @@ def train(hyp, opt, device, callbacks):
         # end epoch ----------------------------------------------------------------------------------------------------
     # end training -----------------------------------------------------------------------------------------------------
     if RANK in {-1, 0}:
+        checkpoint.wait()  # finish background checkpoint saves
         LOGGER.info(f"\n{epoch - start_epoch + 1} epochs completed in {(time.time() - t0) / 3600:.3f} hours.")
         for f in last, best:
             if f.exists():
@@ -583,8 +594,10 @@ def parse_opt(known=False):
         "--evolve_population", type=str, default=ROOT / "data/hyps", help="location for loading population"
     )
     parser.add_argument("--resume_evolve", type=str, default=None, help="resume evolve from last generation")
+    parser.add_argument("--evolve-workers", type=int, default=1, help="concurrent evolve trials")
+    parser.add_argument("--evolve-halving", type=int, default=0, help="successive halving rate eta, 0 to disable")
     parser.add_argument("--bucket", type=str, default="", help="gsutil bucket")
-    parser.add_argument("--cache", type=str, nargs="?", const="ram", help="image --cache ram/disk")
+    parser.add_argument("--cache", type=str, nargs="?", const="ram", help="image --cache ram/disk/mmap")
     parser.add_argument("--image-weights", action="store_true", help="use weighted image selection for training")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
     parser.add_argument("--multi-scale", action="store_true", help="vary img-size +/- 50%%")
@@ -596,11 +609,14 @@ def parse_opt(known=False):
     parser.add_argument("--name", default="exp", help="save to project/name")
     parser.add_argument("--exist-ok", action="store_true", help="existing project/name ok, do not increment")
     parser.add_argument("--quad", action="store_true", help="quad dataloader")
+    parser.add_argument("--batch-augment", action="store_true", help="augment collated batches on device")
     parser.add_argument("--cos-lr", action="store_true", help="cosine LR scheduler")
     parser.add_argument("--label-smoothing", type=float, default=0.0, help="Label smoothing epsilon")
+    parser.add_argument("--ema-every", type=int, default=1, help="Update EMA every x optimizer steps")
     parser.add_argument("--patience", type=int, default=100, help="EarlyStopping patience (epochs without improvement)")
     parser.add_argument("--freeze", nargs="+", type=int, default=[0], help="Freeze layers: backbone=10, first3=0 1 2")
     parser.add_argument("--save-period", type=int, default=-1, help="Save checkpoint every x epochs (disabled if < 1)")
+    parser.add_argument("--save-keep", type=int, default=0, help="Keep newest x --save-period checkpoints, 0 for all")
     parser.add_argument("--seed", type=int, default=0, help="Global training seed")
     parser.add_argument("--local_rank", type=int, default=-1, help="Automatic DDP Multi-GPU argument, do not modify")
 
@@ -796,6 +812,12 @@ def main(opt, callbacks=Callbacks()):
             for initial_value in initial_values:
                 population = [initial_value, *population]
 
+        # Trials run concurrently with --evolve-workers > 1, stopped early with --evolve-halving
+        halving = None
+        if opt.evolve_halving:
+            halving = SuccessiveHalving(save_dir / "evolve_halving.jsonl", opt.epochs, eta=opt.evolve_halving)
+        scheduler = TrialScheduler(train, opt, device, workers=opt.evolve_workers, halving=halving)
+
         # Run the genetic algorithm for a fixed number of generations
         list_keys = list(hyp_GA.keys())
         for generation in range(opt.evolve):
@@ -811,14 +833,15 @@ def main(opt, callbacks=Callbacks()):
             # Adaptive elite size
             elite_size = min_elite_size + int((max_elite_size - min_elite_size) * (generation / opt.evolve))
             # Evaluate the fitness of each individual in the population
-            fitness_scores = []
+            hyps = []
             for individual in population:
                 for key, value in zip(hyp_GA.keys(), individual):
                     hyp_GA[key] = value
                 hyp.update(hyp_GA)
-                results = train(hyp.copy(), opt, device, callbacks)
-                callbacks = Callbacks()
-                # Write mutation results
+                hyps.append(hyp.copy())
+            fitness_scores = [0.0] * len(hyps)
+            for i, results, pruned in scheduler.run(hyps, name=f"gen{generation}-"):
+                # Write mutation results of trials trained for all epochs
                 keys = (
                     "metrics/precision",
                     "metrics/recall",
@@ -828,8 +851,9 @@ def main(opt, callbacks=Callbacks()):
                     "val/obj_loss",
                     "val/cls_loss",
                 )
-                print_mutation(keys, results, hyp.copy(), save_dir, opt.bucket)
-                fitness_scores.append(results[2])
+                if not pruned:
+                    print_mutation(keys, results, hyps[i], save_dir, opt.bucket)
+                fitness_scores[i] = results[2]
 
             # Select the fittest individuals for reproduction using adaptive tournament selection
             selected_indices = []
@@ -873,6 +897,7 @@ def main(opt, callbacks=Callbacks()):
                 next_generation.append(child)
             # Replace the old population with the new generation
             population = next_generation
+        scheduler.close()
         # Print the best solution found
         best_index = fitness_scores.index(max(fitness_scores))
         best_individual = population[best_index]
@@ -940,8 +965,12 @@ def run(**kwargs):
         evolve_population (str, optional): Directory for loading population during evolution. Defaults to ROOT / 'data/
             hyps'.
         resume_evolve (str, optional): Resume hyperparameter evolution from the last generation. Defaults to None.
+        evolve_workers (int, optional): Evolve trials trained concurrently in worker processes, assigned CUDA devices
+            round-robin or sharing the CPU. Defaults to 1.
+        evolve_halving (int, optional): Successive halving rate eta, stopping evolve trials whose fitness at epochs
+            epochs // eta**k is outside the top 1/eta. Defaults to 0 (disabled).
         bucket (str, optional): gsutil bucket for saving checkpoints. Defaults to an empty string.
-        cache (str, optional): Cache image data in 'ram' or 'disk'. Defaults to None.
+        cache (str, optional): Cache image data in 'ram', 'disk' or memory-mapped 'mmap' shards. Defaults to None.
         image_weights (bool, optional): Use weighted image selection for training. Defaults to False.
         device (str, optional): CUDA device identifier, e.g., '0', '0,1,2,3', or 'cpu'. Defaults to an empty string.
         multi_scale (bool, optional): Use multi-scale training, varying image size by ±50%. Defaults to False.
@@ -955,9 +984,12 @@ def run(**kwargs):
         quad (bool, optional): Use quad dataloader. Defaults to False.
         cos_lr (bool, optional): Use cosine learning rate scheduler. Defaults to False.
         label_smoothing (float, optional): Label smoothing epsilon value. Defaults to 0.0.
+        ema_every (int, optional): Update the model EMA every x optimizer steps. Defaults to 1.
         patience (int, optional): Patience for early stopping, measured in epochs without improvement. Defaults to 100.
         freeze (list, optional): Layers to freeze, e.g., backbone=10, first 3 layers = [0, 1, 2]. Defaults to [0].
         save_period (int, optional): Frequency in epochs to save checkpoints. Disabled if < 1. Defaults to -1.
+        save_keep (int, optional): Number of newest periodic checkpoints to keep, older ones are deleted. Keeps all if
+            0. Defaults to 0.
         seed (int, optional): Global training random seed. Defaults to 0.
         local_rank (int, optional): Automatic DDP Multi-GPU argument. Do not modify. Defaults to -1.
 
@@ -7,10 +7,11 @@ import random
 import cv2
 import numpy as np
 import torch
+import torch.nn.functional as F
 import torchvision.transforms as T
 import torchvision.transforms.functional as TF
 
-from utils.general import LOGGER, check_version, colorstr, resample_segments, segment2box, xywhn2xyxy
+from utils.general import LOGGER, check_version, colorstr, resample_segments, segment2box, xywhn2xyxy, xyxy2xywhn
 from utils.metrics import bbox_ioa
 
 IMAGENET_MEAN = 0.485, 0.456, 0.406  # RGB mean
@@ -117,8 +118,13 @@ def replicate(im, labels):
     return im, labels
 
 
-def letterbox(im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleFill=False, scaleup=True, stride=32):
-    """Resizes and pads image to new_shape with stride-multiple constraints, returns resized image, ratio, padding."""
+def letterbox(
+    im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleFill=False, scaleup=True, stride=32, dst=None
+):
+    """Resizes and pads image to new_shape with stride-multiple constraints, returns resized image, ratio, padding.
+
+    If given, `dst` is a preallocated HWC array of the padded output shape that the result is written into in place.
+    """
     shape = im.shape[:2]  # current shape [height, width]
     if isinstance(new_shape, int):
         new_shape = (new_shape, new_shape)
@@ -142,10 +148,19 @@ def letterbox(im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleF
     dw /= 2  # divide padding into 2 sides
     dh /= 2
 
-    if shape[::-1] != new_unpad:  # resize
-        im = cv2.resize(im, new_unpad, interpolation=cv2.INTER_LINEAR)
     top, bottom = round(dh - 0.1), round(dh + 0.1)
     left, right = round(dw - 0.1), round(dw + 0.1)
+    if dst is not None:  # pad and resize directly into dst
+        (w, h), c = new_unpad, np.asarray(color, dtype=dst.dtype)
+        dst[:top], dst[top + h :], dst[top : top + h, :left], dst[top : top + h, left + w :] = c, c, c, c  # border
+        roi = dst[top : top + h, left : left + w]
+        if shape[::-1] != new_unpad:  # resize
+            cv2.resize(im, new_unpad, dst=roi, interpolation=cv2.INTER_LINEAR)
+        else:
+            roi[:] = im
+        return dst, ratio, (dw, dh)
+    if shape[::-1] != new_unpad:  # resize
+        im = cv2.resize(im, new_unpad, interpolation=cv2.INTER_LINEAR)
     im = cv2.copyMakeBorder(im, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)  # add border
     return im, ratio, (dw, dh)
 
@@ -310,6 +325,170 @@ def box_candidates(box1, box2, wh_thr=2, ar_thr=100, area_thr=0.1, eps=1e-16):
     return (w2 > wh_thr) & (h2 > wh_thr) & (w2 * h2 / (w1 * h1 + eps) > area_thr) & (ar < ar_thr)  # candidates
 
 
+class BatchAugment:
+    """Applies mosaic, random perspective, MixUp, HSV and flip augmentations to whole collated batches with vectorized
+    torch ops on CPU or CUDA.
+
+    Used with LoadImagesAndLabels(batch_augment=True), which then only loads and letterboxes images. Mosaic tiles are
+    the batch images themselves, one random batch permutation per quadrant, so each output image mixes 4 images of the
+    batch. Images and labels are warped in one gather and one batched matmul for the whole batch.
+    """
+
+    def __init__(self, hyp, mosaic=True, pad=114):
+        """Initializes batch augmentation from a hyperparameter dict, optionally disabling mosaic (i.e. for --rect)."""
+        self.hyp = hyp
+        self.mosaic = mosaic
+        self.pad = pad / 255  # images are float 0-1
+
+    def __call__(self, imgs, targets):
+        """Augments imgs(b,3,h,w) float RGB 0-1 and targets(n,6) [image, class, x, y, w, h] normalized, returning both
+        on imgs.device.
+        """
+        hyp = self.hyp
+        b, _, h, w = imgs.shape
+        device = imgs.device
+        targets = targets.to(device)
+        mosaic = torch.rand(b, device=device) < (hyp["mosaic"] if self.mosaic else 0.0)
+
+        # Mosaic tiles: quadrant k of output j is image perm[k, j] with its top-left corner at offset[j, k]
+        perm = torch.rand(4, b, device=device).argsort(1)
+        xc = torch.empty(b, device=device).uniform_(w / 2, 1.5 * w).floor()  # mosaic center x, y
+        yc = torch.empty(b, device=device).uniform_(h / 2, 1.5 * h).floor()
+        x0, y0 = torch.stack((xc - w, xc, xc - w, xc), 1), torch.stack((yc - h, yc - h, yc, yc), 1)
+        offset = torch.stack((x0, y0), 2) * mosaic.view(b, 1, 1)  # (b,4,2), zero for non-mosaic images
+        src = torch.where(mosaic, perm, torch.arange(b, device=device))  # (4,b), non-mosaic images sample themselves
+        cw, ch = w * (1 + mosaic.float()), h * (1 + mosaic.float())  # canvas size before perspective
+
+        # Labels to canvas pixel xyxy, 4 copies (one per quadrant) for mosaic images, 1 copy for the rest
+        i, cls, box = targets[:, 0].long(), targets[:, 1], xywhn2xyxy(targets[:, 2:6], w, h)
+        dest = perm.argsort(1)[:, i]  # (4,n) output image of each label in each quadrant
+        k = torch.arange(4, device=device).view(4, 1).expand_as(dest)
+        keep, single = mosaic[dest], ~mosaic[i]
+        dest, k = dest[keep], k[keep]
+        tiles = box.expand(4, -1, -1)[keep] + offset[dest, k].repeat(1, 2)
+        dest = torch.cat((dest, i[single]))
+        cls = torch.cat((cls.expand(4, -1)[keep], cls[single]))
+        box = torch.cat((tiles, box[single]))
+        box[:, 0::2] = torch.minimum(box[:, 0::2].clamp(0), cw[dest, None])  # clip to canvas
+        box[:, 1::2] = torch.minimum(box[:, 1::2].clamp(0), ch[dest, None])
+
+        # Random perspective, see random_perspective()
+        M, s = self.perspective_matrix(b, w, h, cw, ch, device)
+        imgs = self.warp(imgs, torch.linalg.inv(M), src, offset, xc, yc, mosaic, cw, ch)
+        xy = torch.ones(len(box), 4, 3, device=device)
+        xy[..., :2] = box[:, [0, 1, 2, 3, 0, 3, 2, 1]].view(-1, 4, 2)  # x1y1, x2y2, x1y2, x2y1
+        xy = xy @ M[dest].transpose(1, 2)
+        xy = xy[..., :2] / xy[..., 2:3]  # perspective rescale, no-op for affine
+        new = torch.cat((xy.amin(1), xy.amax(1)), 1)
+        new[:, 0::2] = new[:, 0::2].clamp(0, w)
+        new[:, 1::2] = new[:, 1::2].clamp(0, h)
+        j = self.box_candidates(box * s[dest, None], new)
+        dest, cls, box = dest[j], cls[j], new[j]
+
+        # MixUp with a random other image of the batch, mosaic images only
+        mix = mosaic & (torch.rand(b, device=device) < hyp["mixup"])
+        if mix.any():
+            partner = torch.rand(b, device=device).argsort()
+            r = torch.distributions.Beta(32.0, 32.0).sample((b, 1, 1, 1)).to(device)  # mixup ratio
+            imgs = torch.where(mix.view(b, 1, 1, 1), imgs * r + imgs[partner] * (1 - r), imgs)
+            d = partner.argsort()[dest]
+            j = mix[d]
+            dest, cls, box = torch.cat((dest, d[j])), torch.cat((cls, cls[j])), torch.cat((box, box[j]))
+
+        # HSV color-space
+        if hyp["hsv_h"] or hyp["hsv_s"] or hyp["hsv_v"]:
+            gain = torch.empty(b, 3, device=device).uniform_(-1, 1)
+            gain = gain * torch.tensor((hyp["hsv_h"], hyp["hsv_s"], hyp["hsv_v"]), device=device) + 1
+            imgs = self.augment_hsv(imgs, gain)
+
+        labels = torch.cat((dest[:, None].float(), cls[:, None], xyxy2xywhn(box, w, h, clip=True, eps=1e-3)), 1)
+
+        # Flip up-down and left-right
+        for p, dim, col in (hyp["flipud"], 2, 3), (hyp["fliplr"], 3, 2):
+            if p:
+                flip = torch.rand(b, device=device) < p
+                imgs = torch.where(flip.view(b, 1, 1, 1), imgs.flip(dim), imgs)
+                labels[:, col] = torch.where(flip[dest], 1 - labels[:, col], labels[:, col])
+
+        return imgs.contiguous(), labels
+
+    def perspective_matrix(self, b, w, h, cw, ch, device):
+        """Returns per-image canvas-to-output matrices M(b,3,3) and scale gains s(b,), built as in random_perspective().
+        """
+        hyp = self.hyp
+
+        def uniform(a, x):
+            return torch.empty(b, device=device).uniform_(-1, 1) * x + a
+
+        C, P, R, S, T = torch.eye(3, device=device).repeat(5, b, 1, 1)
+        C[:, 0, 2], C[:, 1, 2] = -cw / 2, -ch / 2  # center
+        P[:, 2, 0], P[:, 2, 1] = uniform(0, hyp["perspective"]), uniform(0, hyp["perspective"])
+        a = uniform(0, hyp["degrees"]) * math.pi / 180  # rotation and scale, cv2.getRotationMatrix2D()
+        s = uniform(1, hyp["scale"])
+        R[:, 0, 0], R[:, 0, 1] = s * a.cos(), s * a.sin()
+        R[:, 1, 0], R[:, 1, 1] = -s * a.sin(), s * a.cos()
+        S[:, 0, 1] = (uniform(0, hyp["shear"]) * math.pi / 180).tan()  # x shear (deg)
+        S[:, 1, 0] = (uniform(0, hyp["shear"]) * math.pi / 180).tan()  # y shear (deg)
+        T[:, 0, 2], T[:, 1, 2] = uniform(0.5, hyp["translate"]) * w, uniform(0.5, hyp["translate"]) * h
+        return T @ S @ R @ P @ C, s  # order of operations (right to left) is IMPORTANT
+
+    def warp(self, imgs, Mi, src, offset, xc, yc, mosaic, cw, ch):
+        """Samples every output pixel bilinearly from its mosaic tile through inverse matrices Mi(b,3,3), padding
+        outside the canvas and tiles.
+        """
+        b, c, h, w = imgs.shape
+        device = imgs.device
+        y, x = torch.meshgrid(torch.arange(h, device=device), torch.arange(w, device=device), indexing="ij")
+        p = torch.stack((x, y, torch.ones_like(x)), -1).view(1, -1, 3).float()
+        q = p @ Mi.transpose(1, 2)
+        qx, qy = (q[..., :2] / q[..., 2:3]).unbind(-1)  # (b,h*w) canvas coordinates
+
+        right, bottom = qx >= xc[:, None], qy >= yc[:, None]  # quadrant, unused for non-mosaic images
+        k = (right.long() + 2 * bottom.long()) * mosaic[:, None]
+        sx = qx - torch.where(right, offset[:, 1:2, 0], offset[:, 0:1, 0])  # tile coordinates
+        sy = qy - torch.where(bottom, offset[:, 2:3, 1], offset[:, 0:1, 1])
+        inside = (sx > -1) & (sx < w) & (sy > -1) & (sy < h)  # bilinear footprint touches the tile
+        inside &= (qx > -0.5) & (qx < cw[:, None] - 0.5) & (qy > -0.5) & (qy < ch[:, None] - 0.5)
+
+        # Sample all tiles at once from an atlas of the batch stacked vertically, separated by 1 pad row so bilinear
+        # weights blend tile edges with the pad value like cv2.warpAffine(borderValue=114)
+        H = h + 1
+        atlas = F.pad(imgs - self.pad, (0, 0, 0, 1)).transpose(0, 1).reshape(1, c, b * H, w)
+        sy = sy + src.T.gather(1, k) * H
+        grid = torch.stack(((sx + 0.5) * (2 / w) - 1, (sy + 0.5) * (2 / (b * H)) - 1), -1).view(1, b * h, w, 2)
+        out = F.grid_sample(atlas, grid, mode="bilinear", padding_mode="zeros", align_corners=False)
+        out = out.view(c, b, h, w).transpose(0, 1) * inside.view(b, 1, h, w) + self.pad
+        return out
+
+    @staticmethod
+    def augment_hsv(imgs, gain):
+        """Applies per-image hue, saturation and value gains(b,3) to RGB imgs(b,3,h,w) as in augment_hsv()."""
+        r, g, b = imgs.unbind(1)
+        v = imgs.amax(1)
+        delta = v - imgs.amin(1)
+        s = torch.where(v > 0, delta / v.clamp(min=1e-8), torch.zeros_like(v))
+        d = delta.clamp(min=1e-8)
+        hue = torch.where(v == r, ((g - b) / d) % 6, torch.where(v == g, (b - r) / d + 2, (r - g) / d + 4))
+        hue = torch.where(delta > 0, hue, torch.zeros_like(hue)) / 6  # 0-1
+
+        gain = gain.view(-1, 3, 1, 1)
+        hue = (hue * gain[:, 0]) % 1
+        s = (s * gain[:, 1]).clamp(0, 1)
+        v = (v * gain[:, 2]).clamp(0, 1)
+
+        n = torch.tensor((5, 3, 1), device=imgs.device).view(1, 3, 1, 1)  # HSV to RGB
+        k = (n + hue[:, None] * 6) % 6
+        return v[:, None] - (v * s)[:, None] * torch.minimum(k, 4 - k).clamp(0, 1)
+
+    @staticmethod
+    def box_candidates(box1, box2, wh_thr=2, ar_thr=100, area_thr=0.1, eps=1e-16):
+        """Tensor version of box_candidates() for box1(n,4) before and box2(n,4) after augmentation, xyxy."""
+        w1, h1 = box1[:, 2] - box1[:, 0], box1[:, 3] - box1[:, 1]
+        w2, h2 = box2[:, 2] - box2[:, 0], box2[:, 3] - box2[:, 1]
+        ar = torch.maximum(w2 / (h2 + eps), h2 / (w2 + eps))  # aspect ratio
+        return (w2 > wh_thr) & (h2 > wh_thr) & (w2 * h2 / (w1 * h1 + eps) > area_thr) & (ar < ar_thr)  # candidates
+
+
 def classify_albumentations(
     augment=True,
     size=224,
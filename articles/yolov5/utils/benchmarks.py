@@ -0,0 +1,181 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""
+Throughput benchmarks for YOLOv5 training pipeline components.
+
+Usage:
+    $ python -m utils.benchmarks --task augment --data coco128.yaml --img 640 --batch-size 16 --workers 8
+    $ python -m utils.benchmarks --task build_targets --cfg yolov5s.yaml --img 640 --batch-size 16 --labels 200
+"""
+
+import argparse
+import inspect
+from itertools import chain, islice, repeat
+from pathlib import Path
+
+import torch
+import yaml
+
+from models.yolo import Model
+from utils.augmentations import BatchAugment
+from utils.dataloaders import create_dataloader
+from utils.general import LOGGER, ROOT, check_dataset, check_yaml, print_args
+from utils.loss import ComputeLoss
+from utils.torch_utils import select_device, time_sync
+
+
+def augment(data, hyp, imgsz=640, batch_size=16, workers=8, batches=50, device=""):
+    """Compares training imgs/s of per-sample dataloader augmentation against BatchAugment on collated batches.
+
+    Both paths include the host-to-device copy and uint8 to float conversion done in train.py.
+    """
+    device = select_device(device, batch_size=batch_size)
+    path = check_dataset(data)["train"]
+    hyp = yaml.safe_load(open(check_yaml(hyp), errors="ignore")) if isinstance(hyp, (str, Path)) else hyp
+    results = {}
+    for name, batch_augment in ("dataloader", False), ("batch", True):
+        loader, _ = create_dataloader(
+            path,
+            imgsz,
+            batch_size,
+            32,
+            hyp=hyp,
+            augment=True,
+            workers=workers,
+            shuffle=True,
+            batch_augment=batch_augment,
+        )
+        aug = BatchAugment(hyp) if batch_augment else None
+        n = 0
+        for i, (imgs, targets, *_) in enumerate(islice(chain.from_iterable(repeat(loader)), batches + 2)):  # epochs
+            if i == 2:  # exclude worker start-up and warmup
+                t = time_sync()
+            imgs = imgs.to(device, non_blocking=True).float() / 255
+            if aug:
+                imgs, targets = aug(imgs, targets)
+            n += len(imgs) if i >= 2 else 0
+        results[name] = n / (time_sync() - t)
+        LOGGER.info(f"{name:>12s}: {results[name]:.1f} imgs/s ({loader.num_workers} workers, {device})")
+    LOGGER.info(f"{'speedup':>12s}: {results['batch'] / results['dataloader']:.2f}x")
+    return results
+
+
+def build_targets(hyp, cfg="yolov5s.yaml", imgsz=640, batch_size=16, labels=200, batches=50, device=""):
+    """Compares ComputeLoss.build_targets against per-layer matching on dense batches of `labels` boxes per image.
+
+    Both implementations run on the same random batches and must return identical targets.
+    """
+    device = select_device(device, batch_size=batch_size)
+    hyp = yaml.safe_load(open(check_yaml(hyp), errors="ignore")) if isinstance(hyp, (str, Path)) else hyp
+    model = Model(check_yaml(cfg)).to(device)
+    model.hyp = hyp
+    compute_loss = ComputeLoss(model)
+    p = [x.detach() for x in model(torch.zeros(batch_size, 3, imgsz, imgsz, device=device))]  # train-mode outputs
+    n = batch_size * labels
+    targets = torch.cat(
+        (
+            torch.arange(batch_size, device=device).repeat_interleave(labels)[:, None],  # image
+            torch.randint(0, compute_loss.nc, (n, 1), device=device),  # class
+            torch.rand(n, 2, device=device),  # xy
+            torch.rand(n, 2, device=device) * 0.3 + 0.01,  # wh
+        ),
+        1,
+    ).float()
+
+    old, new = _build_targets_legacy(compute_loss, p, targets), compute_loss.build_targets(p, targets)
+    for x, y in zip(old, new):
+        for xi, yi in zip(x, y):
+            assert all(torch.equal(a, b) for a, b in zip(xi, yi)) if isinstance(xi, tuple) else torch.equal(xi, yi)
+    results = {}
+    for name, fn in ("per-layer", _build_targets_legacy), ("batched", ComputeLoss.build_targets):
+        for i in range(batches + 2):
+            if i == 2:  # exclude warmup
+                t = time_sync()
+            fn(compute_loss, p, targets)
+        results[name] = (time_sync() - t) / batches * 1e3
+        LOGGER.info(f"{name:>12s}: {results[name]:.2f} ms/batch ({n} targets, {device})")
+    LOGGER.info(f"{'speedup':>12s}: {results['per-layer'] / results['batched']:.2f}x")
+    return results
+
+
+def _build_targets_legacy(self, p, targets):
+    """Reference per-layer ComputeLoss.build_targets() implementation the batched version is benchmarked against."""
+    na, nt = self.na, targets.shape[0]  # number of anchors, targets
+    tcls, tbox, indices, anch = [], [], [], []
+    gain = torch.ones(7, device=self.device)  # normalized to gridspace gain
+    ai = torch.arange(na, device=self.device).float().view(na, 1).repeat(1, nt)  # same as .repeat_interleave(nt)
+    targets = torch.cat((targets.repeat(na, 1, 1), ai[..., None]), 2)  # append anchor indices
+
+    g = 0.5  # bias
+    off = torch.tensor([[0, 0], [1, 0], [0, 1], [-1, 0], [0, -1]], device=self.device).float() * g  # offsets
+
+    for i in range(self.nl):
+        anchors, shape = self.anchors[i], p[i].shape
+        gain[2:6] = torch.tensor(shape)[[3, 2, 3, 2]]  # xyxy gain
+
+        # Match targets to anchors
+        t = targets * gain  # shape(3,n,7)
+        if nt:
+            # Matches
+            r = t[..., 4:6] / anchors[:, None]  # wh ratio
+            j = torch.max(r, 1 / r).max(2)[0] < self.hyp["anchor_t"]  # compare
+            t = t[j]  # filter
+
+            # Offsets
+            gxy = t[:, 2:4]  # grid xy
+            gxi = gain[[2, 3]] - gxy  # inverse
+            j, k = ((gxy % 1 < g) & (gxy > 1)).T
+            l, m = ((gxi % 1 < g) & (gxi > 1)).T
+            j = torch.stack((torch.ones_like(j), j, k, l, m))
+            t = t.repeat((5, 1, 1))[j]
+            offsets = (torch.zeros_like(gxy)[None] + off[:, None])[j]
+        else:
+            t = targets[0]
+            offsets = 0
+
+        # Define
+        bc, gxy, gwh, a = t.chunk(4, 1)  # (image, class), grid xy, grid wh, anchors
+        a, (b, c) = a.long().view(-1), bc.long().T  # anchors, image, class
+        gij = (gxy - offsets).long()
+        gi, gj = gij.T  # grid indices
+
+        # Append
+        indices.append((b, a, gj.clamp_(0, shape[2] - 1), gi.clamp_(0, shape[3] - 1)))  # image, anchor, grid
+        tbox.append(torch.cat((gxy - gij, gwh), 1))  # box
+        anch.append(anchors[a])  # anchors
+        tcls.append(c)  # class
+
+    return tcls, tbox, indices, anch
+
+
+def run(task="augment", **kwargs):
+    """Runs the benchmark selected by `task` with the keyword arguments it accepts."""
+    fn = {"augment": augment, "build_targets": build_targets}[task]
+    return fn(**{k: v for k, v in kwargs.items() if k in inspect.signature(fn).parameters})
+
+
+def parse_opt():
+    """Parses command-line arguments for training pipeline benchmarks."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--task", default="augment", choices=["augment", "build_targets"], help="benchmark to run")
+    parser.add_argument("--data", type=str, default=ROOT / "data/coco128.yaml", help="dataset.yaml path")
+    parser.add_argument("--cfg", type=str, default="yolov5s.yaml", help="model.yaml for build_targets")
+    parser.add_argument("--hyp", type=str, default=ROOT / "data/hyps/hyp.scratch-low.yaml", help="hyperparameters path")
+    parser.add_argument("--imgsz", "--img", "--img-size", type=int, default=640, help="train size (pixels)")
+    parser.add_argument("--batch-size", type=int, default=16, help="batch size")
+    parser.add_argument("--workers", type=int, default=8, help="max dataloader workers")
+    parser.add_argument("--labels", type=int, default=200, help="labels per image for build_targets")
+    parser.add_argument("--batches", type=int, default=50, help="number of timed batches")
+    parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
+    opt = parser.parse_args()
+    print_args(vars(opt))
+    return opt
+
+
+def main(opt):
+    """Executes the selected benchmark with parsed command-line arguments."""
+    run(**vars(opt))
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
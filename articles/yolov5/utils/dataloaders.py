@@ -7,13 +7,15 @@ import hashlib
 import json
 import math
 import os
+import queue
 import random
 import shutil
 import time
+from collections import deque
 from itertools import repeat
 from multiprocessing.pool import Pool, ThreadPool
 from pathlib import Path
-from threading import Thread
+from threading import Condition, Thread
 from urllib.parse import urlparse
 
 import numpy as np
@@ -80,6 +82,57 @@ def get_hash(paths):
     return h.hexdigest()  # return hash
 
 
+def file_stat(path):
+    """Returns the (size, mtime_ns) fingerprint of a file, or (-1, -1) if it does not exist."""
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return -1, -1
+
+
+def save_npy_records(path, arrays):
+    """Saves a dict of arrays to one file as consecutive .npy records that can each be memory-mapped, without pickle."""
+    with open(path, "wb") as f:
+        np.lib.format.write_array(f, np.array(list(arrays), dtype=str), allow_pickle=False)  # record names
+        for x in arrays.values():
+            np.lib.format.write_array(f, np.asarray(x), allow_pickle=False)
+
+
+def pack_strings(strings):
+    """Packs strings into a UTF-8 byte array and (n + 1) int64 offsets, without fixed-width str array padding."""
+    data = [x.encode() for x in strings]
+    return np.frombuffer(b"".join(data), dtype=np.uint8), np.cumsum([0] + [len(x) for x in data], dtype=np.int64)
+
+
+def unpack_strings(data, offsets):
+    """Unpacks a list of strings from the byte array and offsets returned by pack_strings()."""
+    data, offsets = data.tobytes(), offsets.tolist()
+    return [data[a:b].decode() for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def load_npy_records(path, mmap_mode="c"):
+    """Loads a dict of arrays written by save_npy_records(), memory-mapping each record.
+
+    The default copy-on-write mode 'c' allows in-place edits of the returned arrays without modifying the file.
+    """
+    arrays = {}
+    with open(path, "rb") as f:
+        names = np.lib.format.read_array(f, allow_pickle=False).tolist()
+        for name in names:
+            version = np.lib.format.read_magic(f)
+            header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = header(f)
+            offset, count = f.tell(), math.prod(shape)
+            if mmap_mode and shape and count and not fortran_order:  # scalars and empty arrays are read directly
+                arrays[name] = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape)
+                f.seek(offset + count * dtype.itemsize)
+            else:
+                x = np.fromfile(f, dtype=dtype, count=count)
+                arrays[name] = x.reshape(shape, order="F" if fortran_order else "C")
+    return arrays
+
+
 def exif_size(img):
     """Returns corrected PIL image size (width, height) considering EXIF orientation."""
     s = img.size  # (width, height)
@@ -174,6 +227,7 @@ def create_dataloader(
     prefix="",
     shuffle=False,
     seed=0,
+    batch_augment=False,
 ):
     """Creates and returns a configured DataLoader instance for loading and processing image datasets."""
     if rect and shuffle:
@@ -194,6 +248,7 @@ def create_dataloader(
             image_weights=image_weights,
             prefix=prefix,
             rank=rank,
+            batch_augment=batch_augment,
         )
 
     batch_size = min(batch_size, len(dataset))
@@ -424,22 +479,156 @@ class LoadImages:
         return self.nf  # number of files
 
 
+class LoadBatches:
+    """Batched image/video loader for detect.py that reads and letterboxes ahead of inference on background threads.
+
+    A prefetch thread queues up to `prefetch` batches of `batch_size`, decoding images and letterboxing frames on a pool
+    of `workers` threads. Batches never mix images with video frames or frames of different videos. Each batch is
+    returned as (paths, im, im0s, vid_cap, s) like LoadStreams, with `mode` and per-image `frame` numbers set.
+    """
+
+    def __init__(self, path, img_size=640, stride=32, auto=True, vid_stride=1, batch_size=16, workers=8, prefetch=2):
+        """Initializes the loader over the images and videos found like LoadImages."""
+        files = LoadImages(path, img_size, stride, auto, vid_stride=vid_stride)  # file discovery
+        self.files, self.video_flag, self.nf = files.files, files.video_flag, files.nf
+        self.img_size = img_size
+        self.stride = stride
+        self.auto = auto
+        self.vid_stride = vid_stride
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.pool = ThreadPool(max(min(workers, batch_size), 1))
+        self.mode, self.frame = "image", []
+        self.cap = None  # video capture of the last returned batch
+        n = self.nf - sum(self.video_flag)  # images
+        self.batches = math.ceil(n / batch_size)
+        for path in self.files[n:]:
+            cap = cv2.VideoCapture(path)
+            self.batches += math.ceil(int(cap.get(cv2.CAP_PROP_FRAME_COUNT) / vid_stride) / batch_size)
+            cap.release()
+
+    def __iter__(self):
+        """Starts the prefetch thread and returns the iterator."""
+        self.count = 0
+        self.queue = queue.Queue(maxsize=self.prefetch)
+        self.error = None
+        Thread(target=self._prefetch, daemon=True).start()
+        return self
+
+    def __next__(self):
+        """Returns the next prefetched batch, raising `StopIteration` when all files are read."""
+        b = self.queue.get()
+        cap = b[5] if b else None
+        if self.cap is not None and self.cap is not cap:  # previous video fully read and its last batch consumed
+            self.cap.release()
+        self.cap = cap
+        if b is None:
+            if self.error:
+                raise self.error
+            raise StopIteration
+        self.count += 1
+        self.mode, paths, im, im0s, self.frame, cap, s = b
+        return paths, im, im0s, cap, s
+
+    def _prefetch(self):
+        """Reads all files into batches on the prefetch thread, images decoded in parallel and video frames in order."""
+        try:
+            bs = self.batch_size
+            images = [f for f, v in zip(self.files, self.video_flag) if not v]
+            for i in range(0, len(images), bs):
+                paths = images[i : i + bs]
+                im0s = self.pool.map(self._imread, paths)
+                s = f"image {i + 1}-{i + len(paths)}/{self.nf} {os.path.dirname(paths[0])}: "
+                self._put("image", paths, im0s, [0] * len(paths), None, s)
+            for k, path in enumerate(self.files[len(images) :], len(images) + 1):
+                cap = cv2.VideoCapture(path)
+                frames, n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.vid_stride), 0
+                while True:
+                    im0s = []
+                    while len(im0s) < bs:
+                        for _ in range(self.vid_stride):
+                            cap.grab()
+                        success, im0 = cap.retrieve()
+                        if not success:
+                            break
+                        im0s.append(im0)
+                    if not im0s:
+                        break
+                    s = f"video {k}/{self.nf} ({n + 1}-{n + len(im0s)}/{frames}) {path}: "
+                    self._put("video", [path] * len(im0s), im0s, list(range(n + 1, n + len(im0s) + 1)), cap, s)
+                    n += len(im0s)
+                if not n:  # no batch references it, else released by __next__ after its last batch
+                    cap.release()
+        except Exception as e:
+            self.error = e
+        self.queue.put(None)
+
+    def _put(self, mode, paths, im0s, frames, cap, s):
+        """Letterboxes a batch in parallel into one BCHW RGB array and queues it for inference."""
+        if self.auto and len({x.shape for x in im0s}) == 1:  # rect inference if all shapes equal
+            shape = letterbox(im0s[0], self.img_size, stride=self.stride)[0].shape[:2]
+        else:
+            shape = (self.img_size,) * 2 if isinstance(self.img_size, int) else self.img_size
+        batch = np.empty((len(im0s), *shape, 3), dtype=np.uint8)
+        self.pool.map(lambda i: letterbox(im0s[i], shape, auto=False, dst=batch[i]), range(len(im0s)))  # resize
+        im = np.ascontiguousarray(batch[..., ::-1].transpose((0, 3, 1, 2)))  # BGR to RGB, BHWC to BCHW
+        self.queue.put((mode, paths, im, im0s, frames, cap, s))
+
+    @staticmethod
+    def _imread(path):
+        """Reads a BGR image, asserting it exists."""
+        im = cv2.imread(path)  # BGR
+        assert im is not None, f"Image Not Found {path}"
+        return im
+
+    def __len__(self):
+        """Returns the number of batches, counting video frames from the container frame count."""
+        return self.batches
+
+
 class LoadStreams:
-    """Loads and processes video streams for YOLOv5, supporting various sources including YouTube and IP cameras."""
+    """Loads and processes video streams for YOLOv5, supporting various sources including YouTube and IP cameras.
+
+    Each source is read by its own thread into a bounded buffer of `buffer` frames under a drop `policy`:
+        'latest': keep the newest frames, dropping the oldest when the buffer is full
+        'fps':    like 'latest', but only decode frames sampled at `sample_fps` per stream
+        'all':    keep every frame, pausing the reader while its buffer is full
+    Every batch takes one new frame per stream (reusing a stream's last frame if none arrives in time) and letterboxes
+    them in parallel into a fixed-shape batch. Per-stream read, drop and lag counters are available from `stats()`.
+    """
 
-    def __init__(self, sources="file.streams", img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
+    def __init__(
+        self,
+        sources="file.streams",
+        img_size=640,
+        stride=32,
+        auto=True,
+        transforms=None,
+        vid_stride=1,
+        buffer=1,
+        policy="latest",
+        sample_fps=None,
+    ):
         """Initializes a stream loader for processing video streams with YOLOv5, supporting various sources including
         YouTube.
         """
+        assert policy in {"latest", "fps", "all"}, f"invalid stream policy '{policy}', valid: latest, fps, all"
+        assert policy != "fps" or sample_fps, "stream policy 'fps' requires sample_fps"
         torch.backends.cudnn.benchmark = True  # faster for fixed-size inference
         self.mode = "stream"
         self.img_size = img_size
         self.stride = stride
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.policy = policy
+        self.sample_fps = sample_fps
         sources = Path(sources).read_text().rsplit() if os.path.isfile(sources) else [sources]
         n = len(sources)
         self.sources = [clean_str(x) for x in sources]  # clean source names for later
         self.imgs, self.fps, self.frames, self.threads = [None] * n, [0] * n, [0] * n, [None] * n
+        self.buffers = [deque(maxlen=buffer) for _ in range(n)]  # (frame, capture time) per stream
+        self.times = [0.0] * n  # capture times of imgs
+        self.counters = [{"read": 0, "dropped": 0, "stale": 0, "lag": 0.0} for _ in range(n)]
+        self.lock = Condition()  # guards buffers and counters, notified on every frame put or taken
         for i, s in enumerate(sources):  # index, source
             # Start thread to read frames from video stream
             st = f"{i + 1}/{n}: {s}... "
@@ -462,6 +651,8 @@ class LoadStreams:
             self.fps[i] = max((fps if math.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
 
             _, self.imgs[i] = cap.read()  # guarantee first frame
+            self.times[i] = time.time()
+            self.buffers[i].append((self.imgs[i], self.times[i]))
             self.threads[i] = Thread(target=self.update, args=([i, cap, s]), daemon=True)
             LOGGER.info(f"{st} Success ({self.frames[i]} frames {w}x{h} at {self.fps[i]:.2f} FPS)")
             self.threads[i].start()
@@ -474,22 +665,38 @@ class LoadStreams:
         self.transforms = transforms  # optional
         if not self.rect:
             LOGGER.warning("WARNING ⚠️ Stream shapes differ. For optimal performance supply similarly-shaped streams.")
+        self.shape = s[0][:2] if self.auto else (img_size, img_size) if isinstance(img_size, int) else img_size
+        self.batch = np.empty((n, *self.shape, 3), dtype=np.uint8)  # letterboxed BHWC BGR frames, reused every batch
+        self.pool = ThreadPool(min(n, NUM_THREADS)) if n > 1 else None  # parallel letterbox workers
+        period = max((sample_fps and 1 / sample_fps) or 0, *(vid_stride / f for f in self.fps))  # slowest frame period
+        self.wait = 2 * period  # seconds to wait for new frames from every stream before reusing stale ones
 
     def update(self, i, cap, stream):
-        """Reads frames from stream `i`, updating imgs array; handles stream reopening on signal loss."""
+        """Reads frames from stream `i` into its buffer under the drop policy; handles stream reopening on signal loss.
+        """
         n, f = 0, self.frames[i]  # frame number, frame array
+        step = self.fps[i] / self.sample_fps if self.policy == "fps" else 1  # frames per sample
+        keep = step  # next frame number to sample
         while cap.isOpened() and n < f:
             n += 1
-            cap.grab()  # .read() = .grab() followed by .retrieve()
-            if n % self.vid_stride == 0:
-                success, im = cap.retrieve()
-                if success:
-                    self.imgs[i] = im
-                else:
-                    LOGGER.warning("WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.")
-                    self.imgs[i] = np.zeros_like(self.imgs[i])
-                    cap.open(stream)  # re-open stream if signal was lost
-            time.sleep(0.0)  # wait time
+            cap.grab()  # .read() = .grab() followed by .retrieve(), blocks until the next frame on live streams
+            if n % self.vid_stride or n < keep:
+                continue
+            keep += step
+            success, im = cap.retrieve()
+            if not success:
+                LOGGER.warning("WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.")
+                im = np.zeros_like(self.imgs[i])
+                cap.open(stream)  # re-open stream if signal was lost
+            with self.lock:
+                b = self.buffers[i]
+                if self.policy == "all":
+                    self.lock.wait_for(lambda: len(b) < b.maxlen)  # backpressure, never drop
+                elif len(b) == b.maxlen:
+                    self.counters[i]["dropped"] += 1  # oldest frame is overwritten
+                b.append((im, time.time()))
+                self.counters[i]["read"] += 1
+                self.lock.notify_all()
 
     def __iter__(self):
         """Resets and returns the iterator for iterating over video frames or images in a dataset."""
@@ -501,20 +708,49 @@ class LoadStreams:
         done.
         """
         self.count += 1
-        if not all(x.is_alive() for x in self.threads) or cv2.waitKey(1) == ord("q"):  # q to quit
+        if cv2.waitKey(1) == ord("q"):  # q to quit
             cv2.destroyAllWindows()
             raise StopIteration
 
+        with self.lock:
+            self.lock.wait_for(lambda: all(b or e for b, e in zip(self.buffers, self._ended())), self.wait)
+            if any(self._ended()):
+                cv2.destroyAllWindows()
+                raise StopIteration
+            t = time.time()
+            for i, b in enumerate(self.buffers):
+                if b:
+                    self.imgs[i], self.times[i] = b.popleft()
+                else:
+                    self.counters[i]["stale"] += 1  # no new frame in time, reuse the last one
+                self.counters[i]["lag"] = t - self.times[i]
+            self.lock.notify_all()  # wake readers waiting on full buffers
+
         im0 = self.imgs.copy()
         if self.transforms:
-            im = np.stack([self.transforms(x) for x in im0])  # transforms
+            im = np.stack(self._map(self.transforms, im0))  # transforms
         else:
-            im = np.stack([letterbox(x, self.img_size, stride=self.stride, auto=self.auto)[0] for x in im0])  # resize
-            im = im[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW
+            self._map(lambda i: letterbox(im0[i], self.shape, auto=False, dst=self.batch[i]), range(len(im0)))  # resize
+            im = self.batch[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW
             im = np.ascontiguousarray(im)  # contiguous
 
         return self.sources, im, im0, None, ""
 
+    def _ended(self):
+        """Returns for each stream whether its reader has stopped and its buffer is drained."""
+        return [not b and not t.is_alive() for b, t in zip(self.buffers, self.threads)]
+
+    def _map(self, fn, x):
+        """Applies `fn` to each item of `x` on the letterbox worker pool, returning a list of results."""
+        return self.pool.map(fn, x) if self.pool else list(map(fn, x))
+
+    def stats(self):
+        """Returns per-stream counters of frames read and dropped, batches that reused a stale frame, and lag in seconds
+        between a frame's capture and its last batch.
+        """
+        with self.lock:
+            return [{"source": s, **c} for s, c in zip(self.sources, self.counters)]
+
     def __len__(self):
         """Returns the number of sources in the dataset, supporting up to 32 streams at 30 FPS over 30 years."""
         return len(self.sources)  # 1E12 frames = 32 streams at 30 FPS for 30 years
@@ -528,10 +764,113 @@ def img2label_paths(img_paths):
     return [sb.join(x.rsplit(sa, 1)).rsplit(".", 1)[0] + ".txt" for x in img_paths]
 
 
+class ImageShardStore:
+    """Read-only store of pre-decoded, resized uint8 images packed into a few large memory-mapped shard files.
+
+    Images are written once as raw HWC bytes into `shard_*.bin` files with an offset index. Every dataloader worker and
+    DDP rank on a node maps the same files, so cached images are shared through the OS page cache with zero copies.
+    """
+
+    version = 0.1  # store layout version
+    shard_size = 4 << 30  # max bytes per shard file
+
+    def __init__(self, path, index):
+        """Initializes the store from a shard directory and an (n, 7) int64 index of shard, offset, h, w, c, h0, w0."""
+        self.path = Path(path)
+        self.index = index
+        self.shards = {}  # shard number: np.memmap, opened lazily in each process
+
+    def __len__(self):
+        """Returns the number of images in the store."""
+        return len(self.index)
+
+    def __getitem__(self, i):
+        """Returns (im, hw_original, hw_resized) for image `i`, with `im` a read-only view into the shard file."""
+        s, o, h, w, c, h0, w0 = self.index[i].tolist()
+        mm = self.shards.get(s)
+        if mm is None:
+            mm = self.shards[s] = np.memmap(self.path / f"shard_{s:03d}.bin", dtype=np.uint8, mode="r")
+        return mm[o : o + h * w * c].reshape(h, w, c), (h0, w0), (h, w)
+
+    def __getstate__(self):
+        """Drops open memory maps when pickled to dataloader workers so each process maps the files itself."""
+        state = self.__dict__.copy()
+        state["shards"] = {}
+        return state
+
+    @staticmethod
+    def get_key(files, img_size, augment):
+        """Returns the store key for a set of image files and the resize settings used to build it."""
+        return get_hash(sorted(files) + [f"{img_size}_{augment}"])
+
+    @classmethod
+    def load(cls, path, files, key):
+        """Loads an existing store if its version and key match, returning it indexed in `files` order, else None."""
+        try:
+            with np.load(Path(path) / "index.npz") as x:
+                assert float(x["version"]) == cls.version and str(x["key"]) == key
+                index, stored = x["index"], x["files"].tolist()
+            pos = {f: j for j, f in enumerate(stored)}
+            return cls(path, index[[pos[f] for f in files]])
+        except Exception:
+            return None
+
+    @classmethod
+    def build(cls, path, files, key, load_fn, prefix=""):
+        """Decodes every image with `load_fn(i) -> (im, hw0, hw)` and packs the results into shard files at `path`.
+
+        Shards are written to a temporary directory that is renamed to `path` once complete, so readers of a published
+        store never see its files rewritten. If another process published a valid store first, that one is returned.
+        """
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)  # left over from an interrupted build
+        tmp.mkdir(parents=True)
+        n, b, gb = len(files), 0, 1 << 30  # images, bytes of cached images, bytes per gigabytes
+        index = np.zeros((n, 7), dtype=np.int64)
+        s, o, fh = -1, cls.shard_size, None  # shard, offset, file handle
+        try:
+            with ThreadPool(NUM_THREADS) as pool:
+                results = pool.imap(lambda i: (i, load_fn(i)), range(n))
+                pbar = tqdm(results, total=n, bar_format=TQDM_BAR_FORMAT, disable=LOCAL_RANK > 0)
+                for i, (im, (h0, w0), _) in pbar:
+                    if o + im.nbytes > cls.shard_size and o:  # start a new shard
+                        if fh:
+                            fh.close()
+                        s, o = s + 1, 0
+                        fh = open(tmp / f"shard_{s:03d}.bin", "wb")
+                    np.ascontiguousarray(im).tofile(fh)
+                    index[i] = s, o, *im.shape, h0, w0
+                    o += im.nbytes
+                    b += im.nbytes
+                    pbar.desc = f"{prefix}Caching images ({b / gb:.1f}GB mmap)"
+                pbar.close()
+            if fh:
+                fh.close()
+                fh = None
+            with open(tmp / "index.npz", "wb") as f:  # file handle stops np.savez appending another .npz suffix
+                np.savez(f, index=index, files=np.array(files), key=np.array(key), version=np.array(cls.version))
+            try:
+                os.replace(tmp, path)  # publish the complete store in one step
+            except OSError:  # path exists, published by another process or an outdated store nobody can load
+                store = cls.load(path, files, key)
+                if store is not None:
+                    return store
+                old = path.with_name(f"{path.name}.{os.getpid()}.old")
+                os.replace(path, old)
+                os.replace(tmp, path)
+                shutil.rmtree(old, ignore_errors=True)
+        finally:
+            if fh:
+                fh.close()
+            shutil.rmtree(tmp, ignore_errors=True)
+        return cls(path, index)
+
+
 class LoadImagesAndLabels(Dataset):
     """Loads images and their corresponding labels for training and validation in YOLOv5."""
 
-    cache_version = 0.6  # dataset labels *.cache version
+    cache_version = 0.9  # dataset labels *.cache version
     rand_interp_methods = [cv2.INTER_NEAREST, cv2.INTER_LINEAR, cv2.INTER_CUBIC, cv2.INTER_AREA, cv2.INTER_LANCZOS4]
 
     def __init__(
@@ -551,6 +890,7 @@ class LoadImagesAndLabels(Dataset):
         prefix="",
         rank=-1,
         seed=0,
+        batch_augment=False,
     ):
         """Initializes the YOLOv5 dataset loader, handling images and their labels, caching, and preprocessing."""
         self.img_size = img_size
@@ -558,7 +898,8 @@ class LoadImagesAndLabels(Dataset):
         self.hyp = hyp
         self.image_weights = image_weights
         self.rect = False if image_weights else rect
-        self.mosaic = self.augment and not self.rect  # load 4 images at a time into a mosaic (only during training)
+        self.batch_augment = augment and batch_augment  # mosaic, perspective, HSV and flips applied by BatchAugment
+        self.mosaic = self.augment and not self.rect and not self.batch_augment  # load 4 images at a time into a mosaic
         self.mosaic_border = [-img_size // 2, -img_size // 2]
         self.stride = stride
         self.path = path
@@ -588,31 +929,25 @@ class LoadImagesAndLabels(Dataset):
         # Check cache
         self.label_files = img2label_paths(self.im_files)  # labels
         cache_path = (p if p.is_file() else Path(self.label_files[0]).parent).with_suffix(".cache")
-        try:
-            cache, exists = np.load(cache_path, allow_pickle=True).item(), True  # load dict
-            assert cache["version"] == self.cache_version  # matches current version
-            assert cache["hash"] == get_hash(self.label_files + self.im_files)  # identical hash
-        except Exception:
-            cache, exists = self.cache_labels(cache_path, prefix), False  # run cache ops
+        cache, exists = self.cache_labels(cache_path, prefix)  # verify added, removed and modified files only
 
         # Display cache
-        nf, nm, ne, nc, n = cache.pop("results")  # found, missing, empty, corrupt, total
+        nf, nm, ne, nc, n = cache["results"].tolist()  # found, missing, empty, corrupt, total
         if exists and LOCAL_RANK in {-1, 0}:
             d = f"Scanning {cache_path}... {nf} images, {nm + ne} backgrounds, {nc} corrupt"
             tqdm(None, desc=prefix + d, total=n, initial=n, bar_format=TQDM_BAR_FORMAT)  # display cache results
-            if cache["msgs"]:
-                LOGGER.info("\n".join(cache["msgs"]))  # display warnings
+            msgs = [x for k in ("msg", "error") for x in unpack_strings(cache[f"{k}s"], cache[f"{k}_index"]) if x]
+            if msgs:
+                LOGGER.info("\n".join(msgs))  # display warnings
         assert nf > 0 or not augment, f"{prefix}No labels found in {cache_path}, can not start training. {HELP_URL}"
 
         # Read cache
-        [cache.pop(k) for k in ("hash", "version", "msgs")]  # remove items
-        labels, shapes, self.segments = zip(*cache.values())
-        nl = len(np.concatenate(labels, 0))  # number of labels
+        nl = len(cache["labels"])  # number of labels
         assert nl > 0 or not augment, f"{prefix}All labels empty in {cache_path}, can not start training. {HELP_URL}"
-        self.labels = list(labels)
-        self.shapes = np.array(shapes)
-        self.im_files = list(cache.keys())  # update
-        self.label_files = img2label_paths(cache.keys())  # update
+        self.labels, self.segments = self.split_label_cache(cache)
+        self.shapes = np.array(cache["shapes"])
+        self.im_files = unpack_strings(cache["files"], cache["file_index"])  # update
+        self.label_files = img2label_paths(self.im_files)  # update
 
         # Filter images
         if min_items:
@@ -678,7 +1013,10 @@ class LoadImagesAndLabels(Dataset):
             cache_images = False
         self.ims = [None] * n
         self.npy_files = [Path(f).with_suffix(".npy") for f in self.im_files]
-        if cache_images:
+        self.im_store = None  # memory-mapped image shards
+        if cache_images == "mmap":
+            self.im_store = self.cache_images_to_mmap(cache_path.with_suffix(".imcache"), prefix)
+        elif cache_images:
             b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
             self.im_hw0, self.im_hw = [None] * n, [None] * n
             fcn = self.cache_images_to_disk if cache_images == "disk" else self.load_image
@@ -713,45 +1051,161 @@ class LoadImagesAndLabels(Dataset):
             )
         return cache
 
+    def cache_images_to_mmap(self, path, prefix=""):
+        """Loads or builds memory-mapped image shards for all dataset images, shared by every worker and DDP rank.
+
+        Unlike 'ram' caching, all images are cached regardless of DDP rank, since ranks on a node share the same files.
+        Each store key gets its own subdirectory of `path`, so e.g. train and val loaders on the same images coexist.
+        """
+        key = ImageShardStore.get_key(self.im_files, self.img_size, self.augment)
+        path = Path(path) / key[:16]
+        store = ImageShardStore.load(path, self.im_files, key)
+        if store is None:
+            try:
+                store = ImageShardStore.build(path, self.im_files, key, self.load_image, prefix)
+                LOGGER.info(f"{prefix}New image cache created: {path}")
+            except Exception as e:
+                LOGGER.warning(f"{prefix}WARNING ⚠️ Image cache directory {path} is not writeable: {e}")
+                return None
+        return store
+
     def cache_labels(self, path=Path("./labels.cache"), prefix=""):
-        """Caches dataset labels, verifies images, reads shapes, and tracks dataset integrity."""
-        x = {}  # dict
-        nm, nf, ne, nc, msgs = 0, 0, 0, 0, []  # number missing, found, empty, corrupt, messages
+        """Caches dataset labels, verifies images, reads shapes, and tracks dataset integrity.
+
+        Every image/label pair is fingerprinted by the (size, mtime_ns) of both files. If `path` holds a cache of the
+        current version, pairs with unchanged fingerprints reuse their cached result, including corrupt ones, and only
+        added or modified pairs are verified. Returns (cache, exists), where cache is the memory-mapped previous cache
+        and exists is True if no file was added, removed or modified.
+        """
+        previous = None
+        with contextlib.suppress(Exception):
+            x = load_npy_records(path)  # load columnar cache
+            if float(x["version"]) == self.cache_version:  # matches current version
+                previous = x
+            del x
+        fp = np.array([file_stat(f) + file_stat(lb) for f, lb in zip(self.im_files, self.label_files)], dtype=np.int64)
+        fp = fp.reshape(-1, 4)  # im size, im mtime_ns, label size, label mtime_ns
+        rows = [None] * len(self.im_files)  # per image: labels, shape, segments, (nm, nf, ne, nc), msg
+        n_removed = 0
+        if previous is not None:
+            labels, segments = self.split_label_cache(previous)
+            files = unpack_strings(previous["files"], previous["file_index"])
+            errors = unpack_strings(previous["error_files"], previous["error_file_index"])
+            prev_msgs = unpack_strings(previous["msgs"], previous["msg_index"])
+            prev_errors = unpack_strings(previous["errors"], previous["error_index"])
+            pos = {f: j for j, f in enumerate(files)}
+            pos_err = {f: j for j, f in enumerate(errors)}
+            current = set(self.im_files)
+            n_removed = sum(f not in current for f in files + errors)
+            for i, f in enumerate(self.im_files):
+                if (j := pos.get(f)) is not None and (previous["fingerprints"][j] == fp[i]).all():
+                    shape, flags, msg = tuple(previous["shapes"][j]), previous["flags"][j], prev_msgs[j]
+                    rows[i] = labels[j], shape, segments[j], flags, msg
+                elif (j := pos_err.get(f)) is not None and (previous["error_fingerprints"][j] == fp[i]).all():
+                    rows[i] = None, None, None, previous["error_flags"][j], prev_errors[j]
+        todo = [i for i, x in enumerate(rows) if x is None]
+        if previous is not None and not todo and not n_removed:
+            return previous, True  # nothing changed
+
+        if previous is not None and LOCAL_RANK in {-1, 0}:
+            n_added = sum(f not in pos and f not in pos_err for f in (self.im_files[i] for i in todo))
+            LOGGER.info(
+                f"{prefix}Label cache: {n_added} added, {len(todo) - n_added} modified, {n_removed} removed, "
+                f"{len(rows) - len(todo)} unchanged"
+            )
         desc = f"{prefix}Scanning {path.parent / path.stem}..."
+        nm, nf, ne, nc = np.array([x[3] for x in rows if x is not None], dtype=int).reshape(-1, 4).sum(0).tolist()
+        t = time.time()
         with Pool(NUM_THREADS) as pool:
             pbar = tqdm(
-                pool.imap(verify_image_label, zip(self.im_files, self.label_files, repeat(prefix))),
+                pool.imap(
+                    verify_image_label,
+                    zip([self.im_files[i] for i in todo], [self.label_files[i] for i in todo], repeat(prefix)),
+                    chunksize=max(1, min(64, len(todo) // (NUM_THREADS * 8))),
+                ),
                 desc=desc,
-                total=len(self.im_files),
+                total=len(todo),
                 bar_format=TQDM_BAR_FORMAT,
             )
-            for im_file, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg in pbar:
+            for (im_file, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg), i in zip(pbar, todo):
                 nm += nm_f
                 nf += nf_f
                 ne += ne_f
                 nc += nc_f
-                if im_file:
-                    x[im_file] = [lb, shape, segments]
-                if msg:
-                    msgs.append(msg)
+                rows[i] = lb, shape, segments, (nm_f, nf_f, ne_f, nc_f), msg
                 pbar.desc = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
 
         pbar.close()
-        if msgs:
-            LOGGER.info("\n".join(msgs))
+        if todo and LOCAL_RANK in {-1, 0}:
+            dt = max(time.time() - t, 1e-6)
+            LOGGER.info(
+                f"{prefix}Verified {len(todo)} images in {dt:.1f}s "
+                f"({len(todo) / dt:.0f} images/s, {NUM_THREADS} workers)"
+            )
+        keep = [i for i, x in enumerate(rows) if x[0] is not None]
+        bad = [i for i, x in enumerate(rows) if x[0] is None]
+        lbs = [rows[i][0] for i in keep]
+        segs = [rows[i][2] for i in keep]
+        msgs = [rows[i][4] for i in keep]
+        errors = [rows[i][4] for i in bad]
+        points = [s for ss in segs for s in ss]
+        if any(msgs) or any(errors):
+            LOGGER.info("\n".join(x for x in msgs + errors if x))
         if nf == 0:
             LOGGER.warning(f"{prefix}WARNING ⚠️ No labels found in {path}. {HELP_URL}")
-        x["hash"] = get_hash(self.label_files + self.im_files)
-        x["results"] = nf, nm, ne, nc, len(self.im_files)
-        x["msgs"] = msgs  # warnings
-        x["version"] = self.cache_version  # cache version
+        files, file_index = pack_strings(self.im_files[i] for i in keep)
+        error_files, error_file_index = pack_strings(self.im_files[i] for i in bad)  # corrupt images
+        (msgs, msg_index), (errors, error_index) = pack_strings(msgs), pack_strings(errors)  # warnings per image
+        x = {
+            "version": np.array(self.cache_version),  # cache version
+            "results": np.array([nf, nm, ne, nc, len(self.im_files)], dtype=np.int64),
+            "files": files,  # UTF-8 bytes
+            "file_index": file_index,  # byte offsets
+            "fingerprints": fp[keep].reshape(-1, 4),
+            "labels": np.concatenate(lbs, 0).astype(np.float32) if lbs else np.zeros((0, 5), dtype=np.float32),
+            "label_index": np.cumsum([0] + [len(lb) for lb in lbs], dtype=np.int64),
+            "shapes": np.array([rows[i][1] for i in keep], dtype=np.int64).reshape(-1, 2),  # wh
+            "segments": np.concatenate(points, 0).astype(np.float32) if points else np.zeros((0, 2), dtype=np.float32),
+            "segment_index": np.cumsum([0] + [len(s) for s in points], dtype=np.int64),  # points
+            "segment_image_index": np.cumsum([0] + [len(ss) for ss in segs], dtype=np.int64),  # segments
+            "flags": np.array([rows[i][3] for i in keep], dtype=np.int8).reshape(-1, 4),  # nm, nf, ne, nc
+            "msgs": msgs,
+            "msg_index": msg_index,
+            "error_files": error_files,
+            "error_file_index": error_file_index,
+            "error_fingerprints": fp[bad].reshape(-1, 4),
+            "error_flags": np.array([rows[i][3] for i in bad], dtype=np.int8).reshape(-1, 4),
+            "errors": errors,
+            "error_index": error_index,
+        }
+        # Release all views of the memory-mapped previous cache, Windows can not replace a file that is still mapped
+        previous = labels = segments = rows = flags = lbs = segs = points = None
         try:
-            np.save(path, x)  # save cache for next time
-            path.with_suffix(".cache.npy").rename(path)  # remove .npy suffix
+            tmp = path.with_suffix(".cache.tmp")
+            save_npy_records(tmp, x)  # save cache for next time
+            os.replace(tmp, path)  # atomic
             LOGGER.info(f"{prefix}New cache created: {path}")
         except Exception as e:
             LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")  # not writeable
-        return x
+            with contextlib.suppress(OSError):
+                tmp.unlink(missing_ok=True)
+        return x, False
+
+    @staticmethod
+    def split_label_cache(cache):
+        """Splits columnar cache arrays into per-image lists of label arrays and segment lists, as views without copies.
+
+        Labels of all images are concatenated into one (n, 5) array indexed by `label_index`; segment points are
+        concatenated into one (n, 2) array indexed by `segment_index`, grouped per image by `segment_image_index`.
+        String columns (files, messages) are UTF-8 byte arrays indexed by offsets, see pack_strings().
+        """
+        if len(cache["file_index"]) < 2:
+            return [], []
+        labels = np.split(cache["labels"], cache["label_index"][1:-1])
+        points = np.split(cache["segments"], cache["segment_index"][1:-1])
+        si = cache["segment_image_index"].tolist()
+        segments = [points[a:b] for a, b in zip(si[:-1], si[1:])]
+        return labels, segments
 
     def __len__(self):
         """Returns the number of images in the dataset."""
@@ -790,7 +1244,7 @@ class LoadImagesAndLabels(Dataset):
             if labels.size:  # normalized xywh to pixel xyxy format
                 labels[:, 1:] = xywhn2xyxy(labels[:, 1:], ratio[0] * w, ratio[1] * h, padw=pad[0], padh=pad[1])
 
-            if self.augment:
+            if self.augment and not self.batch_augment:
                 img, labels = random_perspective(
                     img,
                     labels,
@@ -810,6 +1264,7 @@ class LoadImagesAndLabels(Dataset):
             img, labels = self.albumentations(img, labels)
             nl = len(labels)  # update after albumentations
 
+        if self.augment and not self.batch_augment:
             # HSV color-space
             augment_hsv(img, hgain=hyp["hsv_h"], sgain=hyp["hsv_s"], vgain=hyp["hsv_v"])
 
@@ -844,6 +1299,8 @@ class LoadImagesAndLabels(Dataset):
 
         Returns (im, original hw, resized hw)
         """
+        if self.im_store is not None:  # memory-mapped shards
+            return self.im_store[i]
         im, f, fn = (
             self.ims[i],
             self.im_files[i],
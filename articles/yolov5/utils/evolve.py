@@ -0,0 +1,120 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Concurrent trial scheduling with successive halving for hyperparameter evolution."""
+
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+from pathlib import Path
+
+import torch
+
+from utils.callbacks import Callbacks
+from utils.general import LOGGER, FileLock, colorstr
+
+DEVICE = None  # device of this trial worker process
+
+
+class SuccessiveHalving:
+    """Asynchronous successive halving: a trial reaching a rung epoch continues only if its fitness is within the top
+    1/eta of all trials recorded at that rung so far.
+
+    Rungs are at epochs // eta, epochs // eta**2, ... down to `min_epochs`. Results are shared between processes in a
+    file-locked JSON-lines store, so trials are compared across workers and generations without waiting on each other.
+    """
+
+    def __init__(self, file, epochs, eta=3, min_epochs=1):
+        """Initializes rungs for trials of `epochs` epochs, recording results to `file`."""
+        self.file = Path(file)
+        self.eta = eta
+        self.rungs = sorted({epochs // eta**i for i in range(1, 32) if epochs // eta**i >= max(min_epochs, 1)})
+
+    def __call__(self, trial, epoch, fitness):
+        """Records `fitness` of `trial` after `epoch` epochs, returning False if the trial should be stopped."""
+        with FileLock(self.file.with_suffix(".lock")):
+            with open(self.file, "a") as f:
+                f.write(json.dumps({"trial": trial, "epoch": epoch, "fitness": fitness}) + "\n")
+            with open(self.file) as f:
+                scores = sorted((x["fitness"] for x in map(json.loads, f) if x["epoch"] == epoch), reverse=True)
+        k = len(scores) // self.eta  # number of trials to keep
+        return k == 0 or fitness >= scores[k - 1]
+
+
+class TrialScheduler:
+    """Runs training trials for hyperparameter evolution, concurrently in a process pool if `workers` > 1.
+
+    Workers are assigned CUDA devices round-robin, i.e. `--device 0,1,2,3 --evolve-workers 4` runs one trial per GPU,
+    or split CPU threads and dataloader workers evenly on CPU. Trials are pruned by `halving` if given.
+
+    Usage:
+        scheduler = TrialScheduler(train, opt, device, workers=4, halving=SuccessiveHalving(file, opt.epochs))
+        for i, results, pruned in scheduler.run(hyps):  # as trials finish
+            ...
+    """
+
+    def __init__(self, fn, opt, device, workers=1, halving=None):
+        """Initializes the scheduler running `fn(hyp, opt, device, callbacks)` per trial, starting worker processes."""
+        self.fn = fn
+        self.opt = opt
+        self.device = device
+        self.halving = halving
+        self.pool = None
+        if halving:
+            opt.evolve_rungs = halving.rungs  # validate at rung epochs
+        if workers > 1:
+            if device.type == "cuda":
+                devices = [torch.device("cuda", i % torch.cuda.device_count()) for i in range(workers)]
+            else:
+                devices = [device] * workers
+                opt.workers = max(opt.workers // workers, 1)  # dataloader workers per trial
+            queue = mp.get_context("spawn").Queue()
+            for d in devices:
+                queue.put(d)
+            threads = max(torch.get_num_threads() // workers, 1) if device.type == "cpu" else torch.get_num_threads()
+            self.pool = ProcessPoolExecutor(
+                workers, mp_context=mp.get_context("spawn"), initializer=_init_worker, initargs=(queue, threads)
+            )
+            LOGGER.info(f"{colorstr('evolve: ')}running {workers} concurrent trials on {', '.join(map(str, devices))}")
+
+    def run(self, hyps, name="trial"):
+        """Trains one trial per hyperparameter dict in `hyps`, yielding (index, results, pruned) as trials finish."""
+        if self.pool is None:
+            for i, hyp in enumerate(hyps):
+                yield i, *_run_trial(self.fn, hyp, self.opt, self.device, f"{name}{i}", self.halving)
+            return
+        futures = {}
+        for i, hyp in enumerate(hyps):
+            opt = deepcopy(self.opt)
+            opt.save_dir = str(Path(opt.save_dir) / "trials" / f"{name}{i}")  # trial results.csv
+            futures[self.pool.submit(_run_trial, self.fn, hyp, opt, None, f"{name}{i}", self.halving)] = i
+        for f in as_completed(futures):
+            yield futures[f], *f.result()
+
+    def close(self):
+        """Shuts down worker processes."""
+        if self.pool:
+            self.pool.shutdown()
+
+
+def _init_worker(queue, threads):
+    """Takes this worker process's device from `queue` and limits its CPU threads."""
+    global DEVICE
+    DEVICE = queue.get()
+    torch.set_num_threads(threads)
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+
+
+def _run_trial(fn, hyp, opt, device, trial, halving):
+    """Trains one trial, returning its results and whether it was stopped early by successive halving."""
+    callbacks = Callbacks()
+    if halving:
+
+        def prune(log_vals, epoch, best_fitness, fi):
+            """Stops training at a rung epoch if the trial's fitness is not within the top 1/eta."""
+            if epoch + 1 in halving.rungs and not halving(trial, epoch + 1, float(fi[0])):
+                callbacks.stop_training = True
+
+        callbacks.register_action("on_fit_epoch_end", callback=prune)
+    results = fn(hyp, opt, device or DEVICE, callbacks)
+    return results, callbacks.stop_training
@@ -3,15 +3,24 @@
 
 import argparse
 import io
+import sys
+from pathlib import Path
 
 import torch
-from flask import Flask, request
+from flask import Flask, jsonify, request
 from PIL import Image
 
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[2]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
 app = Flask(__name__)
 models = {}
+batchers = {}  # micro-batched models, see utils/serving.py
 
 DETECTION_URL = "/v1/object-detection/<model>"
+METRICS_URL = "/v1/metrics"
 
 
 @app.route(DETECTION_URL, methods=["POST"])
@@ -35,15 +44,33 @@ def predict(model):
         if model in models:
             results = models[model](im, size=640)  # reduce size=320 for faster inference
             return results.pandas().xyxy[0].to_json(orient="records")
+        if model in batchers:
+            results = batchers[model](im)  # batched with concurrent requests
+            return results.pandas().xyxy[0].to_json(orient="records")
+
+
+@app.route(METRICS_URL, methods=["GET"])
+def metrics():
+    """Return per-stage latency histograms and batch size counts of each micro-batched model in JSON format."""
+    return jsonify({m: b.stats() for m, b in batchers.items()})
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Flask API exposing YOLOv5 model")
     parser.add_argument("--port", default=5000, type=int, help="port number")
     parser.add_argument("--model", nargs="+", default=["yolov5s"], help="model(s) to run, i.e. --model yolov5n yolov5s")
+    parser.add_argument("--batch-size", type=int, default=0, help="max micro-batch size, 0 to run each request alone")
+    parser.add_argument("--max-wait", type=float, default=5.0, help="max ms a request waits for its micro-batch to fill")
+    parser.add_argument("--size", type=int, default=640, help="micro-batch inference size (pixels)")
     opt = parser.parse_args()
 
     for m in opt.model:
-        models[m] = torch.hub.load("ultralytics/yolov5", m, force_reload=True, skip_validation=True)
+        if opt.batch_size:
+            from utils.serving import MicroBatcher
+
+            model = torch.hub.load(str(ROOT), m, source="local")
+            batchers[m] = MicroBatcher(model, max_batch=opt.batch_size, max_wait=opt.max_wait / 1e3, size=opt.size)
+        else:
+            models[m] = torch.hub.load("ultralytics/yolov5", m, force_reload=True, skip_validation=True)
 
     app.run(host="0.0.0.0", port=opt.port)  # debug=True causes Restarting with stat
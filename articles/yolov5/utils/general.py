@@ -258,6 +258,41 @@ class WorkingDirectory(contextlib.ContextDecorator):
         os.chdir(self.cwd)
 
 
+class FileLock(contextlib.ContextDecorator):
+    """Context manager/decorator holding an exclusive lock on a file, shared across processes, within its context."""
+
+    def __init__(self, file):
+        """Initializes a lock on `file`, created if missing."""
+        self.file = Path(file)
+
+    def __enter__(self):
+        """Blocks until the lock is acquired."""
+        self.f = open(self.file, "a")
+        if platform.system() == "Windows":
+            import msvcrt
+
+            self.f.seek(0)
+            while True:  # LK_LOCK gives up with OSError after ~10 attempts (1 s apart), keep waiting
+                try:
+                    msvcrt.locking(self.f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Releases the lock."""
+        if platform.system() == "Windows":
+            import msvcrt
+
+            self.f.seek(0)
+            msvcrt.locking(self.f.fileno(), msvcrt.LK_UNLCK, 1)
+        self.f.close()  # closing releases flock
+
+
 def methods(instance):
     """Returns list of method names for a class/instance excluding dunder methods."""
     return [f for f in dir(instance) if callable(getattr(instance, f)) and not f.startswith("__")]
@@ -1016,6 +1051,9 @@ def non_max_suppression(
 ):
     """Non-Maximum Suppression (NMS) on inference results to reject overlapping detections.
 
+    Images are suppressed together, with consecutive images packed into torchvision.ops.nms() calls of at most
+    `max_pack` boxes each.
+
     Returns:
         list of detections, on (n,6) tensor per image [xyxy, conf, cls]
     """
@@ -1036,83 +1074,98 @@ def non_max_suppression(
     # Settings
     # min_wh = 2  # (pixels) minimum box width and height
     max_wh = 7680  # (pixels) maximum box width and height
-    max_nms = 30000  # maximum number of boxes into torchvision.ops.nms()
-    time_limit = 0.5 + 0.05 * bs  # seconds to quit after
+    max_nms = 30000  # maximum number of boxes per image into torchvision.ops.nms()
     redundant = True  # require redundant detections
     multi_label &= nc > 1  # multiple labels per box (adds 0.5ms/img)
     merge = False  # use merge-NMS
 
-    t = time.time()
     mi = 5 + nc  # mask start index
-    output = [torch.zeros((0, 6 + nm), device=prediction.device)] * bs
-    for xi, x in enumerate(prediction):  # image index, image inference
-        # Apply constraints
-        # x[((x[..., 2:4] < min_wh) | (x[..., 2:4] > max_wh)).any(1), 4] = 0  # width-height
-        x = x[xc[xi]]  # confidence
-
-        # Cat apriori labels if autolabelling
-        if labels and len(labels[xi]):
-            lb = labels[xi]
-            v = torch.zeros((len(lb), nc + nm + 5), device=x.device)
-            v[:, :4] = lb[:, 1:5]  # box
-            v[:, 4] = 1.0  # conf
-            v[range(len(lb)), lb[:, 0].long() + 5] = 1.0  # cls
-            x = torch.cat((x, v), 0)
-
-        # If none remain process next image
-        if not x.shape[0]:
-            continue
-
-        # Compute conf
-        x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
-
-        # Box/Mask
-        box = xywh2xyxy(x[:, :4])  # center_x, center_y, width, height) to (x1, y1, x2, y2)
-        mask = x[:, mi:]  # zero columns if no masks
-
-        # Detections matrix nx6 (xyxy, conf, cls)
-        if multi_label:
-            i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=False).T
-            x = torch.cat((box[i], x[i, 5 + j, None], j[:, None].float(), mask[i]), 1)
-        else:  # best class only
-            conf, j = x[:, 5:mi].max(1, keepdim=True)
-            x = torch.cat((box, conf, j.float(), mask), 1)[conf.view(-1) > conf_thres]
-
-        # Filter by class
-        if classes is not None:
-            x = x[(x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)]
-
-        # Apply finite constraint
-        # if not torch.isfinite(x).all():
-        #     x = x[torch.isfinite(x).all(1)]
-
-        # Check shape
-        n = x.shape[0]  # number of boxes
-        if not n:  # no boxes
-            continue
-        x = x[x[:, 4].argsort(descending=True)[:max_nms]]  # sort by confidence and remove excess boxes
-
-        # Batched NMS
-        c = x[:, 5:6] * (0 if agnostic else max_wh)  # classes
-        boxes, scores = x[:, :4] + c, x[:, 4]  # boxes (offset by class), scores
-        i = torchvision.ops.nms(boxes, scores, iou_thres)  # NMS
-        i = i[:max_det]  # limit detections
-        if merge and (1 < n < 3e3):  # Merge NMS (boxes merged using weighted mean)
-            # update boxes as boxes(i,4) = weights(i,n) * boxes(n,4)
-            iou = box_iou(boxes[i], boxes) > iou_thres  # iou matrix
-            weights = iou * scores[None]  # box weights
-            x[i, :4] = torch.mm(weights, x[:, :4]).float() / weights.sum(1, keepdim=True)  # merged boxes
-            if redundant:
-                i = i[iou.sum(1) > 1]  # require redundancy
-
-        output[xi] = x[i]
-        if mps:
-            output[xi] = output[xi].to(device)
-        if (time.time() - t) > time_limit:
-            LOGGER.warning(f"WARNING ⚠️ NMS time limit {time_limit:.3f}s exceeded")
-            break  # time limit exceeded
-
-    return output
+    bi = xc.nonzero()[:, 0]  # image index of each candidate
+    x = prediction[xc]  # confidence
+
+    # Cat apriori labels if autolabelling
+    if labels and sum(len(lb) for lb in labels):
+        n = torch.tensor([len(lb) for lb in labels], device=x.device)  # labels per image
+        lb = torch.cat(list(labels)).to(x.device)
+        v = torch.zeros((len(lb), nc + nm + 5), device=x.device)
+        v[:, :4] = lb[:, 1:5]  # box
+        v[:, 4] = 1.0  # conf
+        v[range(len(lb)), lb[:, 0].long() + 5] = 1.0  # cls
+        x = torch.cat((x, v), 0)
+        bi = torch.cat((bi, torch.arange(bs, device=x.device).repeat_interleave(n)))
+
+    # Compute conf
+    x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
+
+    # Box/Mask
+    box = xywh2xyxy(x[:, :4])  # center_x, center_y, width, height) to (x1, y1, x2, y2)
+    mask = x[:, mi:]  # zero columns if no masks
+
+    # Detections matrix nx6 (xyxy, conf, cls)
+    if multi_label:
+        i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=False).T
+        x, bi = torch.cat((box[i], x[i, 5 + j, None], j[:, None].float(), mask[i]), 1), bi[i]
+    else:  # best class only
+        conf, j = x[:, 5:mi].max(1, keepdim=True)
+        i = conf.view(-1) > conf_thres
+        x, bi = torch.cat((box, conf, j.float(), mask), 1)[i], bi[i]
+
+    # Filter by class
+    if classes is not None:
+        i = (x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)
+        x, bi = x[i], bi[i]
+
+    # Apply finite constraint
+    # if not torch.isfinite(x).all():
+    #     x = x[torch.isfinite(x).all(1)]
+
+    # Group by image (candidates already are, apriori labels are appended) and remove excess boxes per image
+    if len(x) > max_nms:
+        i = x[:, 4].argsort(descending=True)  # sort by confidence
+        i = i[_group_order(bi[i])]
+        i = i[_rank_in_group(bi[i], bs) < max_nms]
+        x, bi = x[i], bi[i]
+    elif labels:
+        i = _group_order(bi)
+        x, bi = x[i], bi[i]
+
+    # Batched NMS, boxes offset by class and image so different groups never overlap. NMS cost grows with the square
+    # of its input, so consecutive images are packed into as few calls of at most max_pack boxes as possible
+    max_pack = 5000 if x.is_cuda else 1000  # torchvision.ops.batched_nms() crossover
+    c = x[:, 5] * (0 if agnostic else max_wh)  # classes
+    boxes, scores = x[:, :4].float() + torch.stack((c, bi * max_wh - c), 1).float().repeat(1, 2), x[:, 4]
+    i, start, end = [], 0, 0
+    for n in torch.bincount(bi, minlength=bs).tolist() + [max_pack + 1]:  # boxes per image, sentinel flushes last call
+        if end - start + n > max_pack and end > start:
+            i.append(torchvision.ops.nms(boxes[start:end], scores[start:end], iou_thres) + start)  # NMS
+            start = end
+        end += n
+    i = torch.cat(i) if i else bi.new_zeros(0)  # by decreasing score within each call
+    if bs > 1:
+        i = i[_group_order(bi[i])]  # group by image
+    if len(i) > max_det:
+        i = i[_rank_in_group(bi[i], bs) < max_det]  # limit detections
+    if merge and (1 < len(x) < 3e3):  # Merge NMS (boxes merged using weighted mean)
+        # update boxes as boxes(i,4) = weights(i,n) * boxes(n,4)
+        iou = box_iou(boxes[i], boxes) > iou_thres  # iou matrix
+        weights = iou * scores[None]  # box weights
+        x[i, :4] = torch.mm(weights, x[:, :4]).float() / weights.sum(1, keepdim=True)  # merged boxes
+        if redundant:
+            i = i[iou.sum(1) > 1]  # require redundancy
+
+    x = x[i].to(device)
+    return list(x.split(torch.bincount(bi[i], minlength=bs).tolist()))
+
+
+def _group_order(g):
+    """Returns indices sorting group indices g, keeping the original order within each group (stable argsort)."""
+    return (g * len(g) + torch.arange(len(g), device=g.device)).argsort()
+
+
+def _rank_in_group(g, n):
+    """Returns the position of each element within its group for sorted group indices g in [0, n)."""
+    counts = torch.bincount(g, minlength=n)
+    return torch.arange(len(g), device=g.device) - (counts.cumsum(0) - counts)[g]
 
 
 def strip_optimizer(f="best.pt", s=""):
@@ -1130,7 +1183,9 @@ def strip_optimizer(f="best.pt", s=""):
     x["model"].half()  # to FP16
     for p in x["model"].parameters():
         p.requires_grad = False
-    torch.save(x, s or f)
+    tmp = Path(s or f).with_suffix(".tmp")
+    torch.save(x, tmp)
+    os.replace(tmp, s or f)  # new file, leaving checkpoints hard-linked to f unchanged
     mb = os.path.getsize(s or f) / 1e6  # filesize
     LOGGER.info(f"Optimizer stripped from {f},{f' saved as {s},' if s else ''} {mb:.1f}MB")
 
@@ -1150,14 +1205,15 @@ def print_mutation(keys, results, hyp, save_dir, bucket, prefix=colorstr("evolve
         if gsutil_getsize(url) > (evolve_csv.stat().st_size if evolve_csv.exists() else 0):
             subprocess.run(["gsutil", "cp", f"{url}", f"{save_dir}"])  # download evolve.csv if larger than local
 
-    # Log to evolve.csv
-    s = "" if evolve_csv.exists() else (("%20s," * n % keys).rstrip(",") + "\n")  # add header
-    with open(evolve_csv, "a") as f:
-        f.write(s + ("%20.5g," * n % vals).rstrip(",") + "\n")
+    # Log to evolve.csv, locked against concurrent evolve processes sharing save_dir
+    with FileLock(save_dir / "evolve.lock"):
+        s = "" if evolve_csv.exists() else (("%20s," * n % keys).rstrip(",") + "\n")  # add header
+        with open(evolve_csv, "a") as f:
+            f.write(s + ("%20.5g," * n % vals).rstrip(",") + "\n")
+        data = pd.read_csv(evolve_csv, skipinitialspace=True)
 
     # Save yaml
     with open(evolve_yaml, "w") as f:
-        data = pd.read_csv(evolve_csv, skipinitialspace=True)
         data = data.rename(columns=lambda x: x.strip())  # strip keys
         i = np.argmax(fitness(data.values[:, :4]))  #
         generations = len(data)
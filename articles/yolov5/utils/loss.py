@@ -137,6 +137,8 @@ class ComputeLoss:
         self.nl = m.nl  # number of layers
         self.anchors = m.anchors
         self.device = device
+        self.off = torch.tensor([[0, 0], [1, 0], [0, 1], [-1, 0], [0, -1]], device=device).float() * 0.5  # offsets
+        self.gains = {}  # normalized to gridspace gains (nl, 6) by prediction grid shapes
 
     def __call__(self, p, targets):  # predictions, targets
         """Performs forward pass, calculating class, box, and object loss for given predictions and targets."""
@@ -173,7 +175,7 @@ class ComputeLoss:
                 # Classification
                 if self.nc > 1:  # cls loss (only if multiple classes)
                     t = torch.full_like(pcls, self.cn, device=self.device)  # targets
-                    t[range(n), tcls[i]] = self.cp
+                    t.scatter_(1, tcls[i][:, None], self.cp)
                     lcls += self.BCEcls(pcls, t)  # BCE
 
             obji = self.BCEobj(pi[..., 4], tobj)
@@ -193,64 +195,42 @@ class ComputeLoss:
     def build_targets(self, p, targets):
         """Prepares model targets from input targets (image,class,x,y,w,h) for loss computation, returning class, box,
         indices, and anchors.
-        """
-        na, nt = self.na, targets.shape[0]  # number of anchors, targets
-        tcls, tbox, indices, anch = [], [], [], []
-        gain = torch.ones(7, device=self.device)  # normalized to gridspace gain
-        ai = torch.arange(na, device=self.device).float().view(na, 1).repeat(1, nt)  # same as .repeat_interleave(nt)
-        targets = torch.cat((targets.repeat(na, 1, 1), ai[..., None]), 2)  # append anchor indices
 
+        All layers, anchors and neighbour-cell offsets are matched in one batched pass over (nl, 5, na, nt) candidates,
+        compacted with a single device sync. Outputs are identical to matching each layer in turn.
+        """
+        shape = tuple(x.shape[2:4] for x in p)  # grid (ny, nx) per layer
+        if shape not in self.gains:
+            self.gains[shape] = torch.tensor([[1, 1, nx, ny, nx, ny] for ny, nx in shape], device=self.device).float()
+        gain = self.gains[shape]  # xyxy gain (nl, 6)
         g = 0.5  # bias
-        off = (
-            torch.tensor(
-                [
-                    [0, 0],
-                    [1, 0],
-                    [0, 1],
-                    [-1, 0],
-                    [0, -1],  # j,k,l,m
-                    # [1, 1], [1, -1], [-1, 1], [-1, -1],  # jk,jm,lk,lm
-                ],
-                device=self.device,
-            ).float()
-            * g
-        )  # offsets
-
-        for i in range(self.nl):
-            anchors, shape = self.anchors[i], p[i].shape
-            gain[2:6] = torch.tensor(shape)[[3, 2, 3, 2]]  # xyxy gain
-
-            # Match targets to anchors
-            t = targets * gain  # shape(3,n,7)
-            if nt:
-                # Matches
-                r = t[..., 4:6] / anchors[:, None]  # wh ratio
-                j = torch.max(r, 1 / r).max(2)[0] < self.hyp["anchor_t"]  # compare
-                # j = wh_iou(anchors, t[:, 4:6]) > model.hyp['iou_t']  # iou(3,n)=wh_iou(anchors(3,2), gwh(n,2))
-                t = t[j]  # filter
-
-                # Offsets
-                gxy = t[:, 2:4]  # grid xy
-                gxi = gain[[2, 3]] - gxy  # inverse
-                j, k = ((gxy % 1 < g) & (gxy > 1)).T
-                l, m = ((gxi % 1 < g) & (gxi > 1)).T
-                j = torch.stack((torch.ones_like(j), j, k, l, m))
-                t = t.repeat((5, 1, 1))[j]
-                offsets = (torch.zeros_like(gxy)[None] + off[:, None])[j]
-            else:
-                t = targets[0]
-                offsets = 0
-
-            # Define
-            bc, gxy, gwh, a = t.chunk(4, 1)  # (image, class), grid xy, grid wh, anchors
-            a, (b, c) = a.long().view(-1), bc.long().T  # anchors, image, class
-            gij = (gxy - offsets).long()
-            gi, gj = gij.T  # grid indices
-
-            # Append
-            indices.append((b, a, gj.clamp_(0, shape[2] - 1), gi.clamp_(0, shape[3] - 1)))  # image, anchor, grid
-            tbox.append(torch.cat((gxy - gij, gwh), 1))  # box
-            anch.append(anchors[a])  # anchors
-            tcls.append(c)  # class
 
+        # Match targets to anchors
+        t = targets[None] * gain[:, None]  # shape(nl,nt,6)
+        r = t[:, None, :, 4:6] / self.anchors[:, :, None]  # wh ratio (nl,na,nt,2)
+        j = torch.max(r, 1 / r).amax(3) < self.hyp["anchor_t"]  # compare (nl,na,nt)
+        # j = wh_iou(anchors, t[:, 4:6]) > model.hyp['iou_t']  # iou(3,n)=wh_iou(anchors(3,2), gwh(n,2))
+
+        # Offsets
+        gxy = t[..., 2:4]  # grid xy
+        gxi = gain[:, None, 2:4] - gxy  # inverse
+        jk = (gxy % 1 < g) & (gxy > 1)
+        lm = (gxi % 1 < g) & (gxi > 1)
+        o = torch.cat((torch.ones_like(jk[..., :1]), jk, lm), 2).permute(0, 2, 1)  # j,k,l,m (nl,5,nt)
+        li, oi, a, ti = (o[:, :, None] & j[:, None]).nonzero().T  # layer, offset, anchor, target
+        n = torch.bincount(li, minlength=self.nl).tolist()  # targets per layer, already synced by nonzero()
+
+        # Define
+        t = t.flatten(0, 1).index_select(0, li * t.shape[1] + ti)  # index_select() is faster than t[li, ti]
+        b, c = t[:, :2].long().T  # image, class
+        gxy, gwh = t[:, 2:4], t[:, 4:6]  # grid xy, grid wh
+        lim = gain[:, 2:4].long().index_select(0, li) - 1  # max grid xy
+        gij = torch.minimum((gxy - self.off.index_select(0, oi)).long().clamp_(0), lim)  # grid indices
+        gi, gj = gij.T
+
+        # Split per layer
+        tcls = c.split(n)  # class
+        tbox = torch.cat((gxy - gij, gwh), 1).split(n)  # box
+        indices = list(zip(*(x.split(n) for x in (b, a, gj, gi))))  # image, anchor, grid
+        anch = self.anchors.flatten(0, 1).index_select(0, li * self.na + a).split(n)  # anchors
         return tcls, tbox, indices, anch
@@ -51,32 +51,40 @@ def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names
 
     # Find unique classes
     unique_classes, nt = np.unique(target_cls, return_counts=True)
-    nc = unique_classes.shape[0]  # number of classes, number of detections
 
+    # Accumulate FPs and TPs per class
+    curves = []
+    for c in unique_classes:
+        i = pred_cls == c
+        curves.append((tp[i].cumsum(0), (1 - tp[i]).cumsum(0), conf[i]) if i.any() else None)
+    return pr_metrics(curves, nt, unique_classes, plot, save_dir, names, eps, prefix)
+
+
+def pr_metrics(curves, nt, unique_classes, plot=False, save_dir=".", names=(), eps=1e-16, prefix=""):
+    """Computes ap_per_class() outputs from per-class cumulative (tp, fp, conf) curves sorted by decreasing conf, None
+    for classes without predictions.
+    """
     # Create Precision-Recall curve and compute AP for each class
+    nc = unique_classes.shape[0]  # number of classes
+    niou = next((x[0].shape[1] for x in curves if x is not None), 1)
     px, py = np.linspace(0, 1, 1000), []  # for plotting
-    ap, p, r = np.zeros((nc, tp.shape[1])), np.zeros((nc, 1000)), np.zeros((nc, 1000))
-    for ci, c in enumerate(unique_classes):
-        i = pred_cls == c
+    ap, p, r = np.zeros((nc, niou)), np.zeros((nc, 1000)), np.zeros((nc, 1000))
+    for ci, curve in enumerate(curves):
         n_l = nt[ci]  # number of labels
-        n_p = i.sum()  # number of predictions
-        if n_p == 0 or n_l == 0:
+        if curve is None or n_l == 0:
             continue
-
-        # Accumulate FPs and TPs
-        fpc = (1 - tp[i]).cumsum(0)
-        tpc = tp[i].cumsum(0)
+        tpc, fpc, conf = curve
 
         # Recall
         recall = tpc / (n_l + eps)  # recall curve
-        r[ci] = np.interp(-px, -conf[i], recall[:, 0], left=0)  # negative x, xp because xp decreases
+        r[ci] = np.interp(-px, -conf, recall[:, 0], left=0)  # negative x, xp because xp decreases
 
         # Precision
         precision = tpc / (tpc + fpc)  # precision curve
-        p[ci] = np.interp(-px, -conf[i], precision[:, 0], left=1)  # p at pr_score
+        p[ci] = np.interp(-px, -conf, precision[:, 0], left=1)  # p at pr_score
 
         # AP from recall-precision curve
-        for j in range(tp.shape[1]):
+        for j in range(niou):
             ap[ci, j], mpre, mrec = compute_ap(recall[:, j], precision[:, j])
             if plot and j == 0:
                 py.append(np.interp(px, mrec, mpre))  # precision at mAP@0.5
@@ -98,6 +106,59 @@ def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names
     return tp, fp, p, r, f1, ap, unique_classes.astype(int)
 
 
+class APAccumulator:
+    """Streaming, mergeable replacement for collecting val.py stats and calling ap_per_class() at the end.
+
+    Keeps per-class, confidence-binned TP and prediction counts, so memory is fixed by (nc, bins, niou) regardless of
+    dataset size and accumulators from separate processes or DDP ranks reduce by addition. Predictions within one
+    confidence bin are treated as tied.
+    """
+
+    def __init__(self, nc, niou=10, bins=1000):
+        """Initializes empty histograms for `nc` classes, `niou` IoU thresholds and `bins` confidence bins."""
+        self.nc = nc  # number of classes
+        self.niou = niou
+        self.bins = bins
+        self.tp = np.zeros((nc, bins, niou), dtype=np.int64)  # true positives per class, confidence bin and IoU
+        self.n = np.zeros((nc, bins), dtype=np.int64)  # predictions per class and confidence bin
+        self.nt = np.zeros(nc, dtype=np.int64)  # targets per class
+
+    def update(self, tp, conf, pred_cls, target_cls):
+        """Adds (correct, conf, pcls, tcls) statistics of one image or batch, given as tensors or arrays."""
+        tp, conf, pred_cls, target_cls = (
+            x.cpu().numpy() if isinstance(x, torch.Tensor) else np.asarray(x) for x in (tp, conf, pred_cls, target_cls)
+        )
+        i = pred_cls.astype(int) * self.bins + np.clip((conf * self.bins).astype(int), 0, self.bins - 1)
+        self.n += np.bincount(i, minlength=self.n.size).reshape(self.n.shape)
+        k, j = np.nonzero(tp)
+        self.tp += np.bincount(i[k] * self.niou + j, minlength=self.tp.size).reshape(self.tp.shape)
+        self.nt += np.bincount(target_cls.astype(int), minlength=self.nc)
+        return self
+
+    def merge(self, *others):
+        """Adds the counts of other accumulators, i.e. from dataset shards or DDP ranks."""
+        for x in others:
+            self.tp += x.tp
+            self.n += x.n
+            self.nt += x.nt
+        return self
+
+    def compute(self, plot=False, save_dir=".", names=(), eps=1e-16, prefix=""):
+        """Returns ap_per_class() outputs tp, fp, p, r, f1, ap, ap_class from the accumulated histograms."""
+        unique_classes = np.nonzero(self.nt)[0]
+        conf = np.arange(self.bins)[::-1] / self.bins  # lower bin edges, decreasing
+        curves = []
+        for c in unique_classes:
+            i = self.n[c, ::-1] > 0  # non-empty bins
+            if not i.any():
+                curves.append(None)
+                continue
+            tpc = self.tp[c, ::-1].cumsum(0)
+            fpc = self.n[c, ::-1].cumsum(0)[:, None] - tpc
+            curves.append((tpc[i], fpc[i], conf[i]))
+        return pr_metrics(curves, self.nt[unique_classes], unique_classes, plot, save_dir, names, eps, prefix)
+
+
 def compute_ap(recall, precision):
     """Compute the average precision, given the recall and precision curves.
 
@@ -152,16 +213,33 @@ class ConfusionMatrix:
             None, updates confusion matrix accordingly
         """
         if detections is None:
-            gt_classes = labels.int()
-            for gc in gt_classes:
-                self.matrix[self.nc, gc] += 1  # background FN
+            gt_classes = labels.int().cpu().numpy()
+            self.matrix[self.nc] += np.bincount(gt_classes, minlength=self.nc + 1)  # background FN
             return
 
         detections = detections[detections[:, 4] > self.conf]
-        gt_classes = labels[:, 0].int()
-        detection_classes = detections[:, 5].int()
         iou = box_iou(labels[:, 1:], detections[:, :4])
+        self.accumulate(iou, labels[:, 0], detections[:, 5])
 
+    def process_batches(self, detections, labels):
+        """Updates the confusion matrix for all images of a batch at once.
+
+        Args:
+            detections (Array[N, 7]): image, x1, y1, x2, y2, conf, class
+            labels (Array[M, 6]): image, class, x1, y1, x2, y2
+
+        Returns:
+            None, updates confusion matrix accordingly
+        """
+        detections = detections[detections[:, 5] > self.conf]
+        iou = box_iou(labels[:, 2:], detections[:, 1:5]) * (labels[:, :1] == detections[:, 0])  # same image only
+        self.accumulate(iou, labels[:, 1], detections[:, 6], labels[:, 0], detections[:, 0])
+
+    def accumulate(self, iou, gt_classes, detection_classes, gt_images=None, detection_images=None):
+        """Matches labels to detections by IoU and adds the (predicted, true) class pairs to the matrix in one bincount.
+
+        Unmatched labels count as background FN, unmatched detections as background FP in images with any match.
+        """
         x = torch.where(iou > self.iou_thres)
         if x[0].shape[0]:
             matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()
@@ -173,19 +251,21 @@ class ConfusionMatrix:
         else:
             matches = np.zeros((0, 3))
 
-        n = matches.shape[0] > 0
         m0, m1, _ = matches.transpose().astype(int)
-        for i, gc in enumerate(gt_classes):
-            j = m0 == i
-            if n and sum(j) == 1:
-                self.matrix[detection_classes[m1[j]], gc] += 1  # correct
-            else:
-                self.matrix[self.nc, gc] += 1  # true background
-
-        if n:
-            for i, dc in enumerate(detection_classes):
-                if not any(m1 == i):
-                    self.matrix[dc, self.nc] += 1  # predicted background
+        gt_classes = gt_classes.int().cpu().numpy()
+        detection_classes = detection_classes.int().cpu().numpy()
+        predicted = np.full(len(gt_classes), self.nc)  # background
+        predicted[m0] = detection_classes[m1]  # correct
+        background = np.ones(len(detection_classes), dtype=bool)
+        background[m1] = False  # predicted background
+        if gt_images is None:
+            background &= len(m0) > 0
+        else:
+            background &= np.isin(detection_images.cpu().numpy(), gt_images.cpu().numpy()[m0])
+
+        n = self.nc + 1
+        i = np.concatenate((predicted * n + gt_classes, detection_classes[background] * n + self.nc))
+        self.matrix += np.bincount(i, minlength=n * n).reshape(n, n)
 
     def tp_fp(self):
         """Calculates true positives (tp) and false positives (fp) excluding the background class from the confusion
@@ -0,0 +1,210 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Dynamic micro-batching for serving AutoShape models to many concurrent callers."""
+
+import contextlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+import requests
+import torch
+from PIL import Image
+
+from models.common import Detections
+from utils.dataloaders import exif_transpose
+from utils.general import LOGGER, Profile
+
+STAGES = "queue", "preprocess", "inference", "postprocess", "total"
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed log-spaced millisecond buckets, safe to read while being updated."""
+
+    bounds = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))  # bucket upper bounds (ms)
+
+    def __init__(self):
+        """Initializes empty bucket counts."""
+        self.counts = np.zeros(len(self.bounds), dtype=np.int64)
+        self.sum = 0.0  # ms
+
+    def observe(self, dt, n=1):
+        """Records `n` samples of latency `dt` seconds."""
+        ms = dt * 1e3
+        self.counts[np.searchsorted(self.bounds, ms)] += n
+        self.sum += ms * n
+
+    def percentile(self, q):
+        """Returns the upper bound (ms) of the bucket holding the q-th percentile, or 0 with no samples."""
+        c = self.counts.cumsum()
+        return float(self.bounds[np.searchsorted(c, c[-1] * q / 100)]) if c[-1] else 0.0
+
+    def as_dict(self):
+        """Returns counts per bucket, sample count, mean and p50/p90/p99 in ms as a JSON-serializable dict."""
+        n = int(self.counts.sum())
+        return {
+            "buckets": {f"<={b:g}ms": int(c) for b, c in zip(self.bounds, self.counts)},
+            "count": n,
+            "mean_ms": self.sum / n if n else 0.0,
+            **{f"p{q}_ms": self.percentile(q) for q in (50, 90, 99)},
+        }
+
+
+class MicroBatcher:
+    """Serves an AutoShape model by queuing single-image requests into micro-batches run through a pipeline.
+
+    A batch is dispatched once `max_batch` requests are queued or the oldest has waited `max_wait` seconds. Batches then
+    flow through preprocess, inference and postprocess threads connected by bounded queues of `depth` batches, so the
+    stages of consecutive batches overlap. On CUDA each stage issues work on its own stream.
+
+    Usage:
+        batcher = MicroBatcher(torch.hub.load('.', 'yolov5s', source='local'), max_batch=16, max_wait=0.005)
+        results = batcher('data/images/zidane.jpg')  # Detections for this image, blocks until done
+        future = batcher.submit(im)  # or concurrent.futures.Future resolving to Detections
+    """
+
+    def __init__(self, model, max_batch=16, max_wait=0.005, size=640, augment=False, depth=2):
+        """Initializes the batcher around an AutoShape `model` and starts its pipeline threads."""
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait  # seconds
+        self.size = size
+        self.augment = augment
+        self.metrics = {k: LatencyHistogram() for k in STAGES}
+        self.batch_sizes = np.zeros(max_batch + 1, dtype=np.int64)  # number of batches dispatched per size
+        self.requests = queue.Queue()
+        q = [self.requests] + [queue.Queue(maxsize=depth) for _ in range(2)] + [None]  # stage inputs and outputs
+        fns = self._preprocess, self._inference, self._postprocess
+        self.threads = [
+            threading.Thread(target=self._stage, args=(STAGES[i + 1], fn, q[i], q[i + 1]), daemon=True)
+            for i, fn in enumerate(fns)
+        ]
+        for t in self.threads:
+            t.start()
+
+    def __call__(self, im, timeout=None):
+        """Runs inference on a single image and returns its Detections, blocking until the batch completes."""
+        return self.submit(im).result(timeout)
+
+    def submit(self, im):
+        """Queues a single image in any AutoShape input format and returns a Future resolving to its Detections."""
+        future = Future()
+        self.requests.put((im, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        """Stops the pipeline after all queued requests are served."""
+        self.requests.put(None)
+        for t in self.threads:
+            t.join()
+
+    def stats(self):
+        """Returns per-stage latency histograms and the batch size distribution as a JSON-serializable dict."""
+        return {
+            "latency": {k: v.as_dict() for k, v in self.metrics.items()},
+            "batch_sizes": {str(i): int(n) for i, n in enumerate(self.batch_sizes) if n},
+        }
+
+    def _collect(self, first):
+        """Gathers requests after `first` until the batch is full or the oldest request's deadline has passed."""
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                r = self.requests.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            if r is None:  # close() sentinel, re-queue so the pipeline stops after this batch
+                self.requests.put(None)
+                break
+            batch.append(r)
+        return batch
+
+    def _stage(self, name, fn, qi, qo):
+        """Runs stage `fn` on each batch from `qi` on this thread's CUDA stream and passes it on to `qo`."""
+        device = self.model._param().device
+        stream = torch.cuda.Stream(device) if device.type == "cuda" else None
+        while True:
+            b = qi.get()
+            if b is None:  # stop
+                if qo is not None:
+                    qo.put(None)
+                return
+            if qi is self.requests:
+                b = {"requests": self._collect(b), "dt": {}}
+            try:
+                with torch.cuda.stream(stream) if stream else contextlib.nullcontext(), Profile() as dt:
+                    fn(b)
+                    if stream:
+                        stream.synchronize()  # outputs ready before the next stage reads them on another stream
+                b["dt"][name] = dt.t
+                self.metrics[name].observe(dt.t, len(b["requests"]))
+                if not b["requests"]:  # every request failed in preprocess
+                    continue
+                if qo is not None:
+                    qo.put(b)
+                else:
+                    self._resolve(b)
+            except Exception as e:
+                LOGGER.warning(f"WARNING ⚠️ micro-batch {name} failed: {e}")
+                for _, future, _ in b["requests"]:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _preprocess(self, b):
+        """Loads each request's image on its own, failing only requests whose image is unreadable or invalid, and
+        letterboxes the rest into one input tensor.
+        """
+        t = time.perf_counter()
+        valid, ims, files = [], [], []
+        for r in b["requests"]:
+            self.metrics["queue"].observe(t - r[2])
+            try:
+                im, f = self._load(r[0])
+            except Exception as e:
+                LOGGER.warning(f"WARNING ⚠️ micro-batch request skipped: {e}")
+                r[1].set_exception(e)
+                continue
+            valid.append(r)
+            ims.append(im)
+            files.append(f)
+        b["requests"] = valid
+        if not valid:
+            return
+        self.batch_sizes[len(valid)] += 1
+        b["ims"], b["x"], b["shape0"], b["shape1"], b["files"] = self.model.preprocess(ims, self.size)
+        b["files"] = [Path(f).with_suffix(".jpg").name if f else x for f, x in zip(files, b["files"])]
+
+    @staticmethod
+    def _load(im):
+        """Reads one image in any AutoShape input format into a numpy array, returning (im, filename or None)."""
+        f = None
+        if isinstance(im, (str, Path)):  # filename or uri
+            im, f = Image.open(requests.get(im, stream=True).raw if str(im).startswith("http") else im), im
+        if isinstance(im, Image.Image):  # PIL Image, decoded here so corrupt files fail this request only
+            im, f = np.asarray(exif_transpose(im)), f or getattr(im, "filename", None)
+        im = np.asarray(im)
+        if im.ndim not in {2, 3} or not im.size:
+            raise ValueError(f"invalid image shape {im.shape}")
+        return im, f
+
+    def _inference(self, b):
+        """Runs the model forward pass on the batch tensor."""
+        b["shape"] = b["x"].shape
+        b["y"] = self.model.inference(b.pop("x"), self.augment)
+
+    def _postprocess(self, b):
+        """Applies NMS and rescales boxes to the original image shapes."""
+        b["y"] = self.model.postprocess(b["y"], b["shape0"], b["shape1"])
+
+    def _resolve(self, b):
+        """Resolves each request's Future with Detections for its own image, timed per image over the batch."""
+        n = len(b["requests"])
+        times = [Profile(t=b["dt"][k] / n) for k in ("preprocess", "inference", "postprocess")]
+        shape = (1, *b["shape"][1:])
+        t = time.perf_counter()
+        for i, (_, future, t0) in enumerate(b["requests"]):
+            future.set_result(Detections([b["ims"][i]], [b["y"][i]], [b["files"][i]], times, self.model.names, shape))
+            self.metrics["total"].observe(t - t0)
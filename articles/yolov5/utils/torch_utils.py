@@ -4,12 +4,14 @@
 import math
 import os
 import platform
+import shutil
 import subprocess
 import time
 import warnings
 from contextlib import contextmanager
 from copy import deepcopy
 from pathlib import Path
+from threading import Thread
 
 import torch
 import torch.distributed as dist
@@ -447,26 +449,39 @@ class ModelEMA:
     see https://www.tensorflow.org/api_docs/python/tf/train/ExponentialMovingAverage.
     """
 
-    def __init__(self, model, decay=0.9999, tau=2000, updates=0):
-        """Initializes EMA with model parameters, decay rate, tau for decay adjustment, and update count; sets model to
-        evaluation mode.
+    def __init__(self, model, decay=0.9999, tau=2000, updates=0, every=1):
+        """Initializes EMA with model parameters, decay rate, tau for decay adjustment, update count and update interval
+        `every` in optimizer steps; sets model to evaluation mode.
         """
         self.ema = deepcopy(de_parallel(model)).eval()  # FP32 EMA
         self.updates = updates  # number of EMA updates
         self.decay = lambda x: decay * (1 - math.exp(-x / tau))  # decay exponential ramp (to help early epochs)
+        self.every = max(every, 1)
+        self.storage, self.tensors = None, ()  # storage of cached (EMA, model) floating point tensor lists
         for p in self.ema.parameters():
             p.requires_grad_(False)
 
     def update(self, model):
-        """Updates the Exponential Moving Average (EMA) parameters based on the current model's parameters."""
+        """Updates the Exponential Moving Average (EMA) parameters based on the current model's parameters, applying the
+        decay of `every` steps at once every `every` calls.
+        """
         self.updates += 1
-        d = self.decay(self.updates)
-
-        msd = de_parallel(model).state_dict()  # model state_dict
-        for k, v in self.ema.state_dict().items():
-            if v.dtype.is_floating_point:  # true for FP16 and FP32
-                v *= d
-                v += (1 - d) * msd[k].detach()
+        if self.updates % self.every:
+            return
+        d = self.decay(self.updates) ** self.every
+
+        model = de_parallel(model)
+        # .half(), .float() and .to() replace every tensor of a module, i.e. ema.half() in val.py, so checking the first
+        # parameter's storage finds a new model or replaced tensors and re-caches
+        storage = [(p.data_ptr(), p.dtype) for p in (next(self.ema.parameters()), next(model.parameters()))]
+        if storage != self.storage:
+            msd = model.state_dict()  # model state_dict
+            esd = self.ema.state_dict()
+            keys = [k for k, v in esd.items() if v.dtype.is_floating_point]  # true for FP16 and FP32
+            self.storage, self.tensors = storage, ([esd[k] for k in keys], [msd[k].detach() for k in keys])
+        e, m = self.tensors
+        torch._foreach_mul_(e, d)
+        torch._foreach_add_(e, m, alpha=1 - d)
         # assert v.dtype == msd[k].dtype == torch.float32, f'{k}: EMA {v.dtype} and model {msd[k].dtype} must be FP32'
 
     def update_attr(self, model, include=(), exclude=("process_group", "reducer")):
@@ -474,3 +489,95 @@ class ModelEMA:
         default.
         """
         copy_attr(self.ema, model, include, exclude)
+
+
+class AsyncCheckpoint:
+    """Saves training checkpoints in the background so the training loop does not wait on serialization.
+
+    Tensors are copied into pinned CPU buffers reused across saves (modules into FP16 CPU copies) and serialized by a
+    writer thread. `last` is replaced atomically, `best` and periodic checkpoints are hard links to it (copies where
+    links are unsupported) and only the newest `keep` periodic checkpoints are retained, or all if `keep` is 0.
+    """
+
+    def __init__(self, keep=0):
+        """Initializes the checkpoint writer with a retention policy for periodic checkpoints."""
+        self.keep = keep
+        self.cache = {}  # snapshot buffers and module copies by ckpt key path
+        self.periodic = []  # periodic checkpoints saved by this writer, oldest first
+        self.thread, self.done, self.error = None, None, None
+
+    def save(self, ckpt, last, best=None, periodic=None, done=None):
+        """Snapshots `ckpt` and starts saving it to `last`, linking `best` and `periodic` to it if given.
+
+        `done` is called on the caller's thread by the next `save()` or `wait()`, once the checkpoint is written.
+        """
+        self.wait()  # previous save must release the snapshot buffers
+        ckpt = self._snapshot(ckpt)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()  # non_blocking device to host copies complete
+        self.done = done
+        self.thread = Thread(target=self._write, args=(ckpt, Path(last), best, periodic))
+        self.thread.start()
+
+    def wait(self):
+        """Blocks until the in-flight save is written, runs its `done` callback and raises any error it hit."""
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        error, self.error = self.error, None
+        if error:
+            raise error
+        done, self.done = self.done, None
+        if done:
+            done()
+
+    def _snapshot(self, x, key=""):
+        """Returns a copy of ckpt item `x` with tensors and modules copied into this writer's CPU buffers."""
+        if isinstance(x, nn.Module):
+            if key not in self.cache:
+                m = deepcopy(x).half().cpu()  # FP16 CPU copy, reused as snapshot buffer
+                if torch.cuda.is_available():
+                    for t in (*m.parameters(), *m.buffers()):
+                        t.data = t.data.pin_memory()
+                self.cache[key] = m
+            m = self.cache[key]
+            for s, t in zip(m.state_dict().values(), x.state_dict().values()):
+                s.copy_(t, non_blocking=True)
+            return m
+        if isinstance(x, torch.Tensor):
+            b = self.cache.get(key)
+            if b is None or b.shape != x.shape or b.dtype != x.dtype:
+                b = self.cache[key] = torch.empty(x.shape, dtype=x.dtype, pin_memory=x.is_cuda)
+            return b.copy_(x.detach(), non_blocking=True)
+        if isinstance(x, dict):
+            return {k: self._snapshot(v, f"{key}/{k}") for k, v in x.items()}
+        if isinstance(x, (list, tuple)):
+            return type(x)(self._snapshot(v, f"{key}/{i}") for i, v in enumerate(x))
+        return x
+
+    def _write(self, ckpt, last, best, periodic):
+        """Writes `last` then links `best` and `periodic` to it, evicting periodic checkpoints beyond `keep`."""
+        try:
+            tmp = last.with_suffix(".tmp")
+            torch.save(ckpt, tmp)
+            os.replace(tmp, last)  # new file, so existing links to the previous last.pt are untouched
+            for f in best, periodic:
+                if f:
+                    self._link(last, Path(f))
+            if periodic:
+                self.periodic.append(Path(periodic))
+                while self.keep and len(self.periodic) > self.keep:
+                    self.periodic.pop(0).unlink(missing_ok=True)
+        except Exception as e:
+            self.error = e
+
+    @staticmethod
+    def _link(src, dst):
+        """Atomically replaces `dst` with a hard link to `src`, or a copy if hard links are unsupported."""
+        tmp = dst.with_suffix(".tmp")
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
@@ -0,0 +1,95 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Background writer for inference results."""
+
+import csv
+import os
+import queue
+from pathlib import Path
+from threading import Thread
+
+import cv2
+
+from utils.general import LOGGER
+
+
+class AsyncWriter:
+    """Writes inference results (CSV rows, label files, images, crops and video frames) in order on a background thread.
+
+    CSV files and video writers stay open until `close()`, label files are written with one append per image, and a
+    bounded job queue applies backpressure when storage falls behind inference.
+
+    Usage:
+        writer = AsyncWriter()
+        writer.csv('predictions.csv', [{'Image Name': 'im.jpg', 'Prediction': 'person', 'Confidence': '0.90'}])
+        writer.append('labels/im.txt', '0 0.5 0.5 0.2 0.2\\n')
+        writer.submit(cv2.imwrite, 'im.jpg', im)
+        writer.close()  # flush
+    """
+
+    def __init__(self, maxsize=64):
+        """Initializes the writer with a job queue of `maxsize` pending jobs and starts its thread."""
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.csvs = {}  # path: (file, csv.DictWriter)
+        self.videos = {}  # slot: (path, cv2.VideoWriter)
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues the call fn(*args, **kwargs); arrays passed must not be modified by the caller afterwards."""
+        self.queue.put((fn, args, kwargs))
+
+    def append(self, path, text):
+        """Appends `text` to the file at `path`."""
+        self.submit(self._append, path, text)
+
+    def csv(self, path, rows):
+        """Appends dict `rows` to the CSV file at `path`, writing a header from the first row's keys if it is new."""
+        self.submit(self._csv, path, rows)
+
+    def video(self, slot, path, im, fps, size):
+        """Writes frame `im` to the video for `slot`, starting a new (w, h) `size` video when `path` changes."""
+        self.submit(self._video, slot, path, im, fps, size)
+
+    def close(self):
+        """Waits for all queued jobs, then closes CSV files and releases video writers."""
+        self.queue.put(None)
+        self.thread.join()
+        for f, _ in self.csvs.values():
+            f.close()
+        for _, w in self.videos.values():
+            w.release()
+        self.csvs, self.videos = {}, {}
+
+    def _run(self):
+        """Runs queued jobs until the `close()` sentinel, logging failures without stopping."""
+        while (job := self.queue.get()) is not None:
+            fn, args, kwargs = job
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                LOGGER.warning(f"WARNING ⚠️ result writer failed: {e}")
+
+    @staticmethod
+    def _append(path, text):
+        """Appends text to a file."""
+        with open(path, "a") as f:
+            f.write(text)
+
+    def _csv(self, path, rows):
+        """Appends rows to a CSV file opened on first use."""
+        if path not in self.csvs:
+            new = not os.path.isfile(path)
+            f = open(path, mode="a", newline="")
+            self.csvs[path] = f, csv.DictWriter(f, fieldnames=rows[0].keys())
+            if new:
+                self.csvs[path][1].writeheader()
+        self.csvs[path][1].writerows(rows)
+
+    def _video(self, slot, path, im, fps, size):
+        """Writes a frame, replacing the slot's video writer when the output path changes."""
+        if slot not in self.videos or self.videos[slot][0] != path:
+            if slot in self.videos:
+                self.videos[slot][1].release()  # release previous video writer
+            f = str(Path(path).with_suffix(".mp4"))  # force *.mp4 suffix on results videos
+            self.videos[slot] = path, cv2.VideoWriter(f, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+        self.videos[slot][1].write(im)
@@ -56,7 +56,7 @@ from utils.general import (
     xywh2xyxy,
     xyxy2xywh,
 )
-from utils.metrics import ConfusionMatrix, ap_per_class, box_iou
+from utils.metrics import APAccumulator, ConfusionMatrix, box_iou
 from utils.plots import output_to_target, plot_images, plot_val_study
 from utils.torch_utils import select_device, smart_inference_mode
 
@@ -320,7 +320,8 @@ def run(
     tp, fp, p, r, f1, mp, mr, map50, ap50, map = 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
     dt = Profile(device=device), Profile(device=device), Profile(device=device)  # profiling times
     loss = torch.zeros(3, device=device)
-    jdict, stats, ap, ap_class = [], [], [], []
+    jdict, ap, ap_class = [], [], []
+    metrics = APAccumulator(nc, niou)  # confidence-binned TP histograms, bounded memory
     callbacks.run("on_val_start")
     pbar = tqdm(dataloader, desc=s, bar_format=TQDM_BAR_FORMAT)  # progress bar
     for batch_i, (im, targets, paths, shapes) in enumerate(pbar):
@@ -350,6 +351,8 @@ def run(
             )
 
         # Metrics
+        stats = []  # (correct, conf, pcls, tcls) per image of this batch
+        cm_detections, cm_labels = [], []  # image-indexed inputs of confusion_matrix.process_batches()
         for si, pred in enumerate(preds):
             labels = targets[targets[:, 0] == si, 1:]
             nl, npr = labels.shape[0], pred.shape[0]  # number of labels, predictions
@@ -361,7 +364,7 @@ def run(
                 if nl:
                     stats.append((correct, *torch.zeros((2, 0), device=device), labels[:, 0]))
                     if plots:
-                        confusion_matrix.process_batch(detections=None, labels=labels[:, 0])
+                        cm_labels.append(torch.cat((torch.full_like(labels[:, :1], si), labels), 1))  # boxes unused
                 continue
 
             # Predictions
@@ -377,7 +380,8 @@ def run(
                 labelsn = torch.cat((labels[:, 0:1], tbox), 1)  # native-space labels
                 correct = process_batch(predn, labelsn, iouv)
                 if plots:
-                    confusion_matrix.process_batch(predn, labelsn)
+                    cm_detections.append(torch.cat((torch.full_like(predn[:, :1], si), predn[:, :6]), 1))
+                    cm_labels.append(torch.cat((torch.full_like(labelsn[:, :1], si), labelsn), 1))
             stats.append((correct, pred[:, 4], pred[:, 5], labels[:, 0]))  # (correct, conf, pcls, tcls)
 
             # Save/log
@@ -388,6 +392,12 @@ def run(
                 save_one_json(predn, jdict, path, class_map)  # append to COCO-JSON dictionary
             callbacks.run("on_val_image_end", pred, predn, path, names, im[si])
 
+        if stats:
+            metrics.update(*(torch.cat(x, 0) for x in zip(*stats)))
+        if cm_labels:
+            detections = torch.cat(cm_detections) if cm_detections else torch.zeros((0, 7), device=device)
+            confusion_matrix.process_batches(detections, torch.cat(cm_labels))
+
         # Plot images
         if plots and batch_i < 3:
             plot_images(im, targets, paths, save_dir / f"val_batch{batch_i}_labels.jpg", names)  # labels
@@ -396,12 +406,11 @@ def run(
         callbacks.run("on_val_batch_end", batch_i, im, targets, paths, shapes, preds)
 
     # Compute metrics
-    stats = [torch.cat(x, 0).cpu().numpy() for x in zip(*stats)]  # to numpy
-    if len(stats) and stats[0].any():
-        tp, fp, p, r, f1, ap, ap_class = ap_per_class(*stats, plot=plots, save_dir=save_dir, names=names)
+    if metrics.tp.any():
+        tp, fp, p, r, f1, ap, ap_class = metrics.compute(plot=plots, save_dir=save_dir, names=names)
         ap50, ap = ap[:, 0], ap.mean(1)  # AP@0.5, AP@0.5:0.95
         mp, mr, map50, map = p.mean(), r.mean(), ap50.mean(), ap.mean()
-    nt = np.bincount(stats[3].astype(int), minlength=nc)  # number of targets per class
+    nt = metrics.nt  # number of targets per class
 
     # Print results
     pf = "%22s" + "%11i" * 2 + "%11.3g" * 4  # print format
@@ -410,7 +419,7 @@ def run(
         LOGGER.warning(f"WARNING ⚠️ no labels found in {task} set, can not compute metrics without labels")
 
     # Print results per class
-    if (verbose or (nc < 50 and not training)) and nc > 1 and len(stats):
+    if (verbose or (nc < 50 and not training)) and nc > 1 and nt.any():
         for i, c in enumerate(ap_class):
             LOGGER.info(pf % (names[c], seen, nt[c], p[i], r[i], ap50[i], ap[i]))
 